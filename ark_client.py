@@ -0,0 +1,174 @@
+"""
+火山引擎 ARK Runtime 客户端公共部分：按 api_host 和 API key 共享的 Ark 客户端
+
+- get_ark_client 首次调用时才创建客户端，之后同一组参数（api_host、API key、超时、重试次数、连接池大小）
+  返回同一个实例，保留 httpx 连接池，避免每次请求都重新建立TCP+TLS连接
+- 创建过程加锁，多线程并发调用时只会创建一次；使用 API key 鉴权时，同一客户端可在多个线程中并发发送请求
+- run_mock_ark_server 提供本地模拟的 chat completions 接口，api_host 传入 "http://127.0.0.1:端口" 即可离线测试
+"""
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import httpx
+# 通过 pip install volcengine-python-sdk[ark] 安装方舟SDK
+from volcenginesdkarkruntime import Ark
+
+DEFAULT_API_HOST = "ark.cn-beijing.volces.com"      # 华北 2 (北京) 服务器
+
+_clients: Dict[Tuple, Ark] = {}
+_clients_lock = threading.Lock()
+
+
+def ark_base_url(api_host: str) -> str:
+    """api_host 为主机名时按 https 访问；带协议的完整地址（如本地模拟服务）原样使用"""
+    if api_host.startswith(("http://", "https://")):
+        return f"{api_host.rstrip('/')}/api/v3"
+    return f"https://{api_host}/api/v3"
+
+
+def create_ark_client(api_host: str = DEFAULT_API_HOST, api_key: Optional[str] = None, timeout: float = 120,
+                      max_retries: int = 3, pool_size: int = 32) -> Ark:
+    """
+    创建一个带独立连接池的 Ark 客户端
+
+    Args:
+        api_host: API主机名，或带协议的完整地址
+        api_key: API key，默认从环境变量 ARK_API_KEY 获取
+        timeout: 请求超时时间（秒）
+        max_retries: 连接失败、429和5xx响应的重试次数
+        pool_size: 连接池的最大连接数
+    """
+    http_client = httpx.Client(
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+    return Ark(
+        api_key=api_key or os.environ.get("ARK_API_KEY"),
+        base_url=ark_base_url(api_host),
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=http_client,
+    )
+
+
+def get_ark_client(api_host: str = DEFAULT_API_HOST, api_key: Optional[str] = None, timeout: float = 120,
+                   max_retries: int = 3, pool_size: int = 32) -> Ark:
+    """获取按参数共享的 Ark 客户端，首次调用时创建，参数说明见 create_ark_client"""
+    api_key = api_key or os.environ.get("ARK_API_KEY")
+    key = (api_host, api_key, timeout, max_retries, pool_size)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = create_ark_client(api_host, api_key, timeout, max_retries, pool_size)
+    return client
+
+
+class _MockArkHandler(BaseHTTPRequestHandler):
+    """
+    模拟 Ark chat completions 接口：延迟 latency 秒后返回 responder(请求体) 的结果，默认原样返回<note>中的文本；
+    每 fail_every 个请求返回一次500。usage 中的token数按字符数近似
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        time.sleep(server.latency)
+
+        if server.fail_every and count % server.fail_every == 0:
+            self._send_json(500, {"error": {"message": "mock server error", "type": "InternalServiceError"}})
+            return
+
+        if server.responder:
+            content = server.responder(body)
+        else:
+            match = re.search(r"<note>(.*)</note>", body["messages"][-1]["content"], re.S)
+            content = f"<note>{match.group(1) if match else ''}</note>"
+        prompt_tokens = sum(len(str(message["content"])) for message in body["messages"])
+        self._send_json(200, {
+            "id": f"mock-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                      "total_tokens": prompt_tokens + len(content)},
+        })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_mock_ark_server(port: int = 0, latency: float = 1.0, fail_every: int = 0, responder=None):
+    """
+    在后台线程启动本地模拟的 Ark chat completions 服务
+
+    Args:
+        responder: 可选，接收请求体（dict）返回回复文本的函数，用于模拟特定任务的模型输出
+
+    Returns:
+        (server, api_host)，api_host 可直接传给 get_ark_client 等函数，用完调用 server.shutdown()
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _MockArkHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_every = fail_every
+    server.responder = responder
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def benchmark_client_reuse(count: int = 200, latency: float = 0.0):
+    """
+    基准测试：在本地模拟服务上对比每次请求新建 Ark 客户端与使用共享客户端的单次请求耗时
+
+    本地服务没有TLS握手，真实API上连接复用的收益会更明显
+    """
+    server, api_host = run_mock_ark_server(latency=latency)
+    messages = [{"role": "user", "content": "<note>benchmark</note>"}]
+    print(f"基准测试: {count} 次请求, 模拟服务延迟 {latency * 1000:.0f} 毫秒")
+
+    def measure(get_client):
+        durations = []
+        for _ in range(count):
+            start = time.perf_counter()
+            get_client().chat.completions.create(model="mock-endpoint", messages=messages)
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+        return sum(durations) / count, durations[count // 2], durations[min(count - 1, int(count * 0.95))]
+
+    try:
+        results = {
+            "每次新建客户端": measure(lambda: create_ark_client(api_host, api_key="mock-key")),
+            "共享客户端": measure(lambda: get_ark_client(api_host, api_key="mock-key")),
+        }
+        for name, (mean, p50, p95) in results.items():
+            print(f"  {name}: 平均 {mean * 1000:.2f} 毫秒, p50 {p50 * 1000:.2f} 毫秒, p95 {p95 * 1000:.2f} 毫秒")
+        print(f"  加速比: {results['每次新建客户端'][0] / results['共享客户端'][0]:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    benchmark_client_reuse()
@@ -115,46 +115,529 @@ files = generator.generate_and_download(
 )
 ```
 
+### 并发批量生成
+超过4张图片时，所有批次会在并发上限内同时提交，由一个调度循环统一轮询各任务状态，
+任务完成后立即下载，不再逐批等待：
+```python
+generator = FreepikImageGenerator()
+files = generator.generate_and_download_batch(
+    prompt="城市建筑摄影",
+    total_images=100,
+    max_concurrency=8  # 同时进行的任务数
+)
+```
+
+### 结果缓存
+传入 `cache_dir` 时按规范化的请求参数（提示词、长宽比、风格与效果、人像设置等）缓存下载的图片，
+再次请求相同参数时先复用缓存中的图片，只为不足的数量提交新任务；缓存按保留天数和总大小淘汰，并输出命中率。
+
+### 日志模式
+默认打印请求参数、响应内容等详细信息。批量运行时可使用 `FreepikImageGenerator(verbose=False)`：
+不再打印完整的JSON，只向 `freepik` 日志输出单行JSON事件（任务创建、完成、下载、失败等），
+`freepik_client.configure_json_logging(level)` 配置输出级别；运行结束时的 `run_summary` 事件包含
+提交、排队、生成、下载各阶段的耗时统计，`generator.metrics.histogram(阶段)` 可得到耗时直方图。
+
+### 任务清单
+`generator.run_manifest("prompts.csv")` 按清单批量生成，CSV示例：
+```
+id,prompt,num_images,style,color,lightning
+city,城市建筑摄影,2,photo,b&w|pastel,studio|warm
+```
+color、lightning 等字段用 `|` 分隔多个取值（JSONL中用列表），按笛卡尔积展开为多个组合（上例为4个）。
+所有组合共用一条并发流水线，完成后在输出目录写入 `results.jsonl`，记录每个组合对应的图片文件。
+
+### 任务日志与恢复
+传入 `journal_path` 时，每个批次的task_id、状态变化和已下载的文件都会追加记录到JSONL日志中。
+进程中断后调用 `generator.resume(journal_path)` 即可继续：已提交的任务只重新轮询并下载缺失的图片，不会重复提交。
+
+### 自适应轮询
+任务状态默认自适应轮询：先用较短的间隔，之后间隔随等待时长指数增长并加入随机抖动；
+按 (aspect_ratio, style) 记录历史耗时，已有记录时直接等到预期完成时间附近再查询；
+服务端返回 Retry-After 时按其要求等待。`generator.poller.summary()` 返回首个结果耗时、轮询次数等统计，
+传入 `latency_file` 可在多次运行之间保留历史耗时。
+
 生成的图片默认保存在 `output/` 目录下。
 
+### 本地测试
+`run_mock_server()` 在本地启动一个模拟 imagen3 接口的HTTP服务，配合 `base_url` 参数即可离线测试，
+`benchmark_batch_generation()` 对比逐批处理与并发处理的耗时。
+
 """
 
+import asyncio
+import csv
+import hashlib
+import itertools
+import random
 import requests
+import threading
 import time
 import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import os
+import shutil
 from dotenv import load_dotenv
 
+from freepik_client import (PhaseMetrics, RateLimiter, download_file, get_shared_rate_limiter, get_shared_session,
+                             log_event, parse_retry_after, send_request)
+
 # 加载环境变量
 load_dotenv()
 
+class AdaptivePoller:
+    """
+    自适应轮询间隔
+
+    - 没有历史记录时，从 initial_interval 开始，间隔随已等待时长按 growth 比例增长（即按轮询次数指数退避），
+      不超过 max_interval，并乘以 ±jitter 的随机抖动，避免大量任务同时查询
+    - 按参数组合（如 aspect_ratio/style）记录任务耗时的滑动平均，有记录时首次查询安排在预期耗时的 80% 处，
+      之后再按上述方式退避
+    - 服务端返回 Retry-After 时优先按其等待
+    """
+
+    def __init__(self, initial_interval: float = 0.5, max_interval: float = 10.0, growth: float = 0.5,
+                 jitter: float = 0.2, smoothing: float = 0.3, history_file: Optional[str] = None):
+        """
+        Args:
+            initial_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            growth: 间隔与已等待时长的比例
+            jitter: 随机抖动幅度（比例）
+            smoothing: 历史耗时滑动平均中新样本的权重
+            history_file: 历史耗时的JSON文件，为None时只在内存中记录
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.jitter = jitter
+        self.smoothing = smoothing
+        self.history_file = Path(history_file) if history_file else None
+        self.lock = threading.Lock()
+        self.expected: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.polls = 0
+        self.retry_after_hits = 0
+
+        if self.history_file and self.history_file.exists():
+            try:
+                self.expected = json.loads(self.history_file.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self.expected = {}
+
+    @staticmethod
+    def make_key(aspect_ratio: str = "square_1_1", style: str = "photo", **_) -> str:
+        """参数组合的键，其余参数对耗时影响较小，不参与区分"""
+        return f"{aspect_ratio}|{style}"
+
+    def next_interval(self, key: str, elapsed: float, retry_after: Optional[float] = None) -> float:
+        """
+        计算下一次查询前的等待时间
+
+        Args:
+            key: 参数组合的键
+            elapsed: 任务已等待的时间（秒）
+            retry_after: 服务端要求的等待时间（秒）
+        """
+        if retry_after is not None:
+            with self.lock:
+                self.retry_after_hits += 1
+            return max(retry_after, 0.0)
+
+        base = 0.8 * self.expected.get(key, 0.0)
+        if elapsed < base:
+            return base - elapsed
+        interval = min(max(self.initial_interval, self.growth * (elapsed - base)), self.max_interval)
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def record(self, key: str, latency: float, polls: int):
+        """记录一个已完成任务的耗时和轮询次数，更新该参数组合的预期耗时"""
+        with self.lock:
+            self.latencies.append(latency)
+            self.polls += polls
+            previous = self.expected.get(key)
+            self.expected[key] = latency if previous is None else previous + self.smoothing * (latency - previous)
+            if self.history_file:
+                self.history_file.parent.mkdir(parents=True, exist_ok=True)
+                self.history_file.write_text(json.dumps(self.expected, indent=2), encoding='utf-8')
+
+    def summary(self) -> Dict[str, Any]:
+        """轮询统计：任务数、轮询次数、首个结果耗时（任务提交到检测到完成）的平均值和分位数"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            tasks = len(latencies)
+            stats = {
+                'tasks': tasks,
+                'polls': self.polls,
+                'polls_per_task': self.polls / tasks if tasks else 0.0,
+                'retry_after_hits': self.retry_after_hits,
+                'expected_latency': dict(self.expected),
+            }
+        if latencies:
+            stats['time_to_first_result'] = {
+                'mean': sum(latencies) / tasks,
+                'p50': latencies[tasks // 2],
+                'p95': latencies[min(tasks - 1, int(tasks * 0.95))],
+                'max': latencies[-1],
+            }
+        return stats
+
+
+# 清单中可以使用的创建图片参数，其中 GRID_FIELDS 可以取多个值，按笛卡尔积展开
+MANIFEST_PARAMS = ('aspect_ratio', 'style', 'color', 'lightning', 'framing', 'person_generation', 'safety_settings')
+GRID_FIELDS = ('aspect_ratio', 'style', 'color', 'lightning', 'framing')
+
+
+def load_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+    """
+    读取任务清单，支持CSV（首行为列名，多个取值用 | 分隔）和JSONL（每行一个对象，多个取值用列表）
+
+    每行需包含 prompt，可选 id、num_images 及 MANIFEST_PARAMS 中的参数，空值表示使用默认值；
+    未指定 id 的行使用 row{行号}，id 重复时报错（各行的输出目录和任务日志按 id 区分）
+    """
+    path = Path(manifest_path)
+    rows = []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.suffix.lower() == '.csv':
+            for row in csv.DictReader(f):
+                rows.append({k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip()})
+        else:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+
+    seen_ids = {}
+    for row_number, row in enumerate(rows, 1):
+        if not row.get('prompt'):
+            raise ValueError(f"清单中的行缺少 prompt: {row}")
+        row['id'] = str(row.get('id') or f"row{row_number:04d}")
+        if row['id'] in seen_ids:
+            raise ValueError(f"清单第 {seen_ids[row['id']]} 行和第 {row_number} 行的 id 重复: {row['id']}")
+        seen_ids[row['id']] = row_number
+        for field in GRID_FIELDS:
+            if isinstance(row.get(field), str) and '|' in row[field]:
+                row[field] = [value.strip() for value in row[field].split('|')]
+    return rows
+
+
+def expand_manifest_row(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """将一行展开为所有参数组合：GRID_FIELDS 中取值为列表的字段按笛卡尔积组合"""
+    params = {k: row[k] for k in MANIFEST_PARAMS if row.get(k) not in (None, '', [])}
+    grid_fields = [k for k in GRID_FIELDS if isinstance(params.get(k), list)]
+    variants = []
+    for values in itertools.product(*(params[k] for k in grid_fields)):
+        variant = dict(params)
+        variant.update(zip(grid_fields, values))
+        variants.append(variant)
+    return variants
+
+
+def _write_results(index_path: Path, records: List[Dict[str, Any]]):
+    """写入清单的结果索引（JSONL），先写临时文件再替换，中断时不会留下不完整的索引"""
+    temp_path = index_path.with_name(index_path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            record = {k: v for k, v in record.items() if k != 'cache_key'}
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(temp_path, index_path)
+
+
+class PromptCache:
+    """
+    生成结果的磁盘缓存，键为规范化后的请求参数（提示词、长宽比、风格与效果、人像设置等，不含生成数量），
+    同一组参数可积累多张图片。超过 max_age_days 的图片过期删除，超出容量时按最近使用时间(LRU)淘汰
+    """
+
+    INDEX_NAME = 'index.json'
+    VERSION = 1
+
+    def __init__(self, cache_dir, max_size_mb=2048, max_age_days=30):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB）
+            max_age_days: 图片的最长保留天数
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / self.INDEX_NAME
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        # 键 -> {'files': [{'name': 文件名, 'size': 字节数, 'created': 时间戳}], 'last_used': 时间戳}
+        self.entries = self._load_index()
+        self.total_bytes = sum(f['size'] for entry in self.entries.values() for f in entry['files'])
+        self.images_requested = 0
+        self.images_hit = 0
+        self._evict()
+
+    def _load_index(self):
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    @classmethod
+    def make_key(cls, payload: Dict[str, Any]) -> str:
+        """根据请求参数生成缓存键：去掉生成数量，提示词合并多余空白，其余字段按键排序"""
+        params = {k: v for k, v in payload.items() if k != 'num_images'}
+        params['prompt'] = ' '.join(str(params.get('prompt', '')).split())
+        text = json.dumps({'version': cls.VERSION, 'params': params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def fetch(self, key: str, count: int, output_dir: Path) -> List[Path]:
+        """将最多 count 张缓存图片复制到 output_dir，返回复制后的路径"""
+        self.images_requested += count
+        entry = self.entries.get(key)
+        if entry is None:
+            return []
+
+        files = []
+        for item in list(entry['files']):
+            if len(files) >= count:
+                break
+            cached_file = self.cache_dir / item['name']
+            if not cached_file.exists():
+                entry['files'].remove(item)
+                self.total_bytes -= item['size']
+                continue
+            target = Path(output_dir) / f"freepik_imagen3_cached_{item['name']}"
+            shutil.copyfile(cached_file, target)
+            files.append(target)
+
+        entry['last_used'] = time.time()
+        self.images_hit += len(files)
+        return files
+
+    def store(self, key: str, file_path: Path):
+        """将一张新生成的图片加入缓存"""
+        entry = self.entries.setdefault(key, {'files': [], 'last_used': time.time()})
+        name = f"{key[:16]}_{len(entry['files']) + 1:03d}_{uuid.uuid4().hex[:6]}{Path(file_path).suffix}"
+        try:
+            shutil.copyfile(file_path, self.cache_dir / name)
+        except OSError as e:
+            log_event(logging.WARNING, 'cache_store_failed', path=str(file_path), error=str(e))
+            return
+        size = (self.cache_dir / name).stat().st_size
+        entry['files'].append({'name': name, 'size': size, 'created': time.time()})
+        entry['last_used'] = time.time()
+        self.total_bytes += size
+        self._evict()
+
+    def _remove_file(self, item):
+        self.total_bytes -= item['size']
+        (self.cache_dir / item['name']).unlink(missing_ok=True)
+
+    def _evict(self):
+        # 先删除过期图片
+        expire_before = time.time() - self.max_age
+        for key in list(self.entries):
+            entry = self.entries[key]
+            for item in [item for item in entry['files'] if item['created'] < expire_before]:
+                entry['files'].remove(item)
+                self._remove_file(item)
+            if not entry['files']:
+                del self.entries[key]
+
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if self.total_bytes <= self.max_bytes:
+                break
+            for item in self.entries.pop(key)['files']:
+                self._remove_file(item)
+
+    def save(self):
+        """写入索引文件（先写临时文件再替换）"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'version': self.VERSION, 'entries': self.entries}), encoding='utf-8')
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：请求的图片数、命中的图片数、命中率、条目数和总大小"""
+        return {
+            'images_requested': self.images_requested,
+            'images_hit': self.images_hit,
+            'hit_rate': self.images_hit / self.images_requested if self.images_requested else 0.0,
+            'entries': len(self.entries),
+            'size_mb': self.total_bytes / 1024 / 1024,
+        }
+
+
+class JobJournal:
+    """
+    批量生成任务的日志（追加写入的JSONL），每行一个事件：
+    - job_started: 任务参数（prompt、输出目录、总数、其他参数）
+    - task_submitted: 某个批次已提交，记录task_id
+    - task_completed / task_failed: 批次任务的最终状态
+    - image_downloaded: 某张图片已下载到本地
+    - job_completed: 所有图片都已下载
+
+    进程中断后可通过 FreepikImageGenerator.resume 按日志继续：已提交的任务只重新轮询和下载缺失的图片，不会重复提交
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def record(self, event: str, job_id: str, **fields):
+        """追加一个事件并立即落盘"""
+        line = json.dumps({'event': event, 'job_id': job_id, 'time': time.time(), **fields}, ensure_ascii=False)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start_job(self, prompt: str, output_dir: str, total_images: int, params: Dict[str, Any],
+                  manifest: Optional[Dict[str, Any]] = None) -> str:
+        """
+        记录一个新的批量任务，返回 job_id
+
+        manifest 为清单任务的结果索引信息（index：results.jsonl 路径，cached_files：缓存命中的文件），
+        resume 完成后据此重新生成结果索引
+        """
+        job_id = uuid.uuid4().hex[:12]
+        fields = {'manifest': manifest} if manifest else {}
+        self.record('job_started', job_id, prompt=prompt, output_dir=str(output_dir),
+                    total_images=total_images, params=params, **fields)
+        return job_id
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        回放日志，返回 {job_id: 任务状态}，任务状态中 batches 为 {批次起始序号: 批次状态}，
+        批次状态包含 task_id、status、submitted_at 和 files（{全局序号: 文件路径}）
+        """
+        jobs: Dict[str, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return jobs
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # 中断时可能留下不完整的最后一行
+                job_id = event['job_id']
+                if event['event'] == 'job_started':
+                    jobs[job_id] = {
+                        'prompt': event['prompt'],
+                        'output_dir': event['output_dir'],
+                        'total_images': event['total_images'],
+                        'params': event['params'],
+                        'manifest': event.get('manifest'),
+                        'batches': {},
+                        'completed': False,
+                    }
+                    continue
+                job = jobs.get(job_id)
+                if job is None:
+                    continue
+                if event['event'] == 'job_completed':
+                    job['completed'] = True
+                    continue
+                batch = job['batches'].setdefault(event['start'], {'files': {}})
+                if event['event'] == 'task_submitted':
+                    batch.update(task_id=event['task_id'], status='SUBMITTED', submitted_at=event['time'])
+                elif event['event'] == 'task_completed':
+                    batch['status'] = 'COMPLETED'
+                elif event['event'] == 'task_failed':
+                    batch['status'] = 'FAILED'
+                elif event['event'] == 'image_downloaded':
+                    batch['files'][event['index']] = event['path']
+        return jobs
+
+    def pending_jobs(self) -> Dict[str, Dict[str, Any]]:
+        """尚未全部下载完成的任务"""
+        return {job_id: job for job_id, job in self.load().items() if not job['completed']}
+
+
 class FreepikImageGenerator:
     """使用 Freepik Imagen3 API 生成图片的类"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 latency_file: Optional[str] = None, pool_size: int = 32, max_retries: int = 3,
+                 session: Optional[requests.Session] = None, rate_limiter: Optional[RateLimiter] = None,
+                 cache_dir: Optional[str] = None, cache_max_size_mb: int = 2048, cache_max_age_days: int = 30,
+                 verbose: bool = True):
         """
         初始化 FreepikImageGenerator
 
         Args:
             api_key: Freepik API key，如果不提供则从环境变量 FREEPIK_API_KEY 获取
+            base_url: imagen3 接口地址，默认为官方地址，本地测试时可指向模拟服务
+            latency_file: 保存各参数组合历史耗时的JSON文件，用于自适应轮询，为None时只在本次运行中学习
+            pool_size: 连接池大小，并发生成时应不小于 max_concurrency * 4
+            max_retries: 连接失败和GET请求5xx响应的重试次数
+            session: 自定义的 requests.Session，默认使用 freepik_client 中按参数共享的 Session
+            rate_limiter: API请求的限速器，默认与 FreepikBackgroundRemover 共用 freepik_client 中的 'freepik' 限速器
+            cache_dir: 生成结果缓存目录，提供时相同参数的请求优先复用已下载的图片，只为不足的数量提交任务
+            cache_max_size_mb: 缓存总大小上限（MB）
+            cache_max_age_days: 缓存图片的最长保留天数
+            verbose: True时打印请求参数、响应内容等详细信息；False时只输出 'freepik' 日志中的单行JSON事件，
+                适合高并发批量运行（可用 freepik_client.configure_json_logging 配置输出级别）
         """
+        self.verbose = verbose
+        self.metrics = PhaseMetrics()
         self.api_key = api_key or os.getenv('FREEPIK_API_KEY')
         if not self.api_key:
             raise ValueError("需要提供 Freepik API key，请设置环境变量 FREEPIK_API_KEY 或直接传入")
 
-        # 检查API key格式（简单验证）
+        # 检查API key格式（简单验证），不输出key的任何部分
         if len(self.api_key) < 10:
-            print(f"警告: API key 长度较短，请确认是否正确: {self.api_key[:5]}...")
-        else:
-            print(f"✓ API key已加载: {self.api_key[:8]}...{self.api_key[-4:]}")
+            self._log(logging.WARNING, 'api_key_short', "警告: API key 长度较短（%d 个字符），请确认是否正确", len(self.api_key),
+                      length=len(self.api_key))
+        elif self.verbose:
+            print(f"✓ API key已加载（{len(self.api_key)} 个字符）")
 
-        self.base_url = "https://api.freepik.com/v1/ai/text-to-image/imagen3"
+        self.base_url = (base_url or "https://api.freepik.com/v1/ai/text-to-image/imagen3").rstrip('/')
         self.headers = {
             'Content-Type': 'application/json',
             'x-freepik-api-key': self.api_key
         }
+        self.poller = AdaptivePoller(history_file=latency_file)
+        self.session = session or get_shared_session(pool_size, max_retries)
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.cache = PromptCache(cache_dir, cache_max_size_mb, cache_max_age_days) if cache_dir else None
+
+    @staticmethod
+    def build_payload(
+        prompt: str,
+        num_images: int = 1,
+        aspect_ratio: str = "square_1_1",
+        style: str = "photo",
+        color: str = None,
+        lightning: str = None,
+        framing: str = None,
+        person_generation: str = "allow_adult",
+        safety_settings: str = "block_low_and_above"
+    ) -> Dict[str, Any]:
+        """构建创建图片的请求参数，参数含义同 create_image"""
+        payload = {
+            "prompt": prompt,
+            "num_images": num_images,
+            "aspect_ratio": aspect_ratio,
+            "styling": {
+                "style": style,
+                "effects": {}
+            },
+            "person_generation": person_generation,
+            "safety_settings": safety_settings
+        }
+
+        # 只添加非空的效果参数
+        if color:
+            payload["styling"]["effects"]["color"] = color
+        if lightning:
+            payload["styling"]["effects"]["lightning"] = lightning
+        if framing:
+            payload["styling"]["effects"]["framing"] = framing
+        return payload
 
     def create_image(
         self,
@@ -205,48 +688,41 @@ class FreepikImageGenerator:
         Returns:
             API 响应数据
         """
-        payload = {
-            "prompt": prompt,
-            "num_images": num_images,
-            "aspect_ratio": aspect_ratio,
-            "styling": {
-                "style": style,
-                "effects": {}
-            },
-            "person_generation": person_generation,
-            "safety_settings": safety_settings
-        }
+        payload = self.build_payload(prompt, num_images, aspect_ratio, style, color, lightning, framing,
+                                     person_generation, safety_settings)
 
-        # 只添加非空的效果参数
-        if color:
-            payload["styling"]["effects"]["color"] = color
-        if lightning:
-            payload["styling"]["effects"]["lightning"] = lightning
-        if framing:
-            payload["styling"]["effects"]["framing"] = framing
-
-        print(f"正在发送图片生成请求...")
-        print(f"提示词: {prompt}")
-        print(f"请求URL: {self.base_url}")
-        print(f"请求参数: {json.dumps(payload, ensure_ascii=False, indent=2)}")
+        if self.verbose:
+            print(f"正在发送图片生成请求...")
+            print(f"提示词: {prompt}")
+            print(f"请求URL: {self.base_url}")
+            print(f"请求参数: {json.dumps(payload, ensure_ascii=False, indent=2)}")
 
+        start_time = time.perf_counter()
         try:
-            response = requests.post(
+            response = send_request(
+                self.session,
+                'POST',
                 self.base_url,
+                rate_limiter=self.rate_limiter,
                 headers=self.headers,
                 json=payload,
                 timeout=30
             )
 
-            print(f"HTTP状态码: {response.status_code}")
-            print(f"响应头: {dict(response.headers)}")
+            elapsed = time.perf_counter() - start_time
+            self.metrics.record('submit', elapsed)
+            if self.verbose:
+                print(f"HTTP状态码: {response.status_code}")
+                print(f"响应头: {dict(response.headers)}")
 
-            # 无论成功失败都打印响应内容
+            # 详细模式下无论成功失败都打印响应内容
             try:
                 response_data = response.json()
-                print(f"API响应: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
+                if self.verbose:
+                    print(f"API响应: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
             except json.JSONDecodeError:
-                print(f"响应内容（非JSON）: {response.text}")
+                if self.verbose:
+                    print(f"响应内容（非JSON）: {response.text}")
                 response_data = {}
 
             # 检查HTTP状态码
@@ -258,28 +734,42 @@ class FreepikImageGenerator:
                 # 新格式：{"data": {"task_id": "...", "status": "..."}}
                 task_id = response_data['data']['task_id']
                 task_status = response_data['data'].get('status', 'UNKNOWN')
-                print(f"任务已创建，任务ID: {task_id}, 状态: {task_status}")
             elif 'task_id' in response_data:
                 # 旧格式：{"task_id": "...", "task_status": "..."}
                 task_id = response_data.get('task_id')
                 task_status = response_data.get('task_status', 'UNKNOWN')
-                print(f"任务已创建，任务ID: {task_id}, 状态: {task_status}")
+            if task_id:
+                self._log(logging.INFO, 'task_created', "任务已创建，任务ID: %s, 状态: %s", task_id, task_status,
+                          task_id=task_id, status=task_status, num_images=num_images, seconds=round(elapsed, 3))
             else:
-                print(f"警告: 响应中没有找到task_id字段")
+                self._log(logging.WARNING, 'task_id_missing', "警告: 响应中没有找到task_id字段",
+                          http_status=response.status_code)
 
             return response_data
 
         except requests.exceptions.RequestException as e:
-            print(f"请求失败: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"错误状态码: {e.response.status_code}")
-                try:
-                    error_data = e.response.json()
-                    print(f"错误详情: {json.dumps(error_data, ensure_ascii=False, indent=2)}")
-                except:
-                    print(f"错误详情: {e.response.text}")
+            status_code = e.response.status_code if getattr(e, 'response', None) is not None else None
+            if self.verbose:
+                print(f"请求失败: {e}")
+                if status_code is not None:
+                    print(f"错误状态码: {status_code}")
+                    try:
+                        error_data = e.response.json()
+                        print(f"错误详情: {json.dumps(error_data, ensure_ascii=False, indent=2)}")
+                    except ValueError:
+                        print(f"错误详情: {e.response.text}")
+            else:
+                log_event(logging.ERROR, 'create_failed', error=str(e), http_status=status_code)
             raise
 
+    def _log(self, level: int, event: str, message: Optional[str] = None, *args, **fields):
+        """详细模式下打印 message（有 args 时按 % 惰性格式化），否则只输出单行JSON事件，不格式化 message"""
+        if self.verbose:
+            if message:
+                print(message % args if args else message)
+        else:
+            log_event(level, event, **fields)
+
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """
         获取任务状态
@@ -291,66 +781,95 @@ class FreepikImageGenerator:
             任务状态数据
         """
         # 根据API文档构建状态查询URL
-        status_url = f"https://api.freepik.com/v1/ai/text-to-image/imagen3/{task_id}"
+        status_url = f"{self.base_url}/{task_id}"
 
         try:
-            response = requests.get(status_url, headers=self.headers, timeout=10)
+            response = send_request(self.session, 'GET', status_url, rate_limiter=self.rate_limiter,
+                                    headers=self.headers, timeout=10)
             response.raise_for_status()
 
             result = response.json()
-            print(f"状态查询响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
+            if self.verbose:
+                print(f"状态查询响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
+            else:
+                log_event(logging.DEBUG, 'task_status', task_id=task_id, status=self._extract_status(result)[0])
             return result
 
         except requests.exceptions.RequestException as e:
-            print(f"获取任务状态失败: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"错误响应: {e.response.text}")
+            if self.verbose:
+                print(f"获取任务状态失败: {e}")
+                if hasattr(e, 'response') and e.response is not None:
+                    print(f"错误响应: {e.response.text}")
+            else:
+                log_event(logging.ERROR, 'status_failed', task_id=task_id, error=str(e))
             raise
 
-    def wait_for_completion(self, task_id: str, max_wait_time: int = 300, poll_interval: int = 5) -> Dict[str, Any]:
+    def _fetch_task_status(self, task_id: str):
+        """
+        查询任务状态但不打印响应内容，供轮询使用
+
+        Returns:
+            (任务状态数据, Retry-After秒数)；被限流（429/503）时任务状态数据为None
+        """
+        # 轮询本身会按 Retry-After 重新安排，429时不在这里重试
+        response = send_request(self.session, 'GET', f"{self.base_url}/{task_id}", rate_limiter=self.rate_limiter,
+                                max_throttle_retries=0, headers=self.headers, timeout=10)
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if response.status_code in (429, 503):
+            return None, retry_after if retry_after is not None else self.poller.initial_interval
+        response.raise_for_status()
+        return response.json(), retry_after
+
+    def wait_for_completion(self, task_id: str, max_wait_time: int = 300, poll_interval: Optional[float] = None,
+                            params_key: Optional[str] = None, started_at: Optional[float] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
         Args:
             task_id: 任务ID
             max_wait_time: 最大等待时间（秒）
-            poll_interval: 轮询间隔（秒）
+            poll_interval: 固定轮询间隔（秒），为None时使用自适应轮询
+            params_key: 参数组合的键（AdaptivePoller.make_key），用于学习和使用历史耗时
+            started_at: 任务提交时间，默认为调用时刻
 
         Returns:
             完成的任务数据
         """
-        start_time = time.time()
+        start_time = started_at or time.time()
+        key = params_key or AdaptivePoller.make_key()
+        polls = 0
+        if poll_interval is None:
+            # 任务刚提交时不会立即完成，先等待一个间隔（有历史记录时直接等到预期完成时间附近）
+            time.sleep(min(self.poller.next_interval(key, time.time() - start_time), max_wait_time))
 
         while time.time() - start_time < max_wait_time:
-            print(f"正在检查任务状态...")
-
-            result = self.get_task_status(task_id)
+            result, retry_after = self._fetch_task_status(task_id)
+            polls += 1
 
-            # 根据实际响应格式提取状态
-            status = None
-            if 'data' in result:
-                # 新格式：{"data": {"status": "...", "generated": [...]}}
-                status = result['data'].get('status')
-                generated = result['data'].get('generated', [])
+            if result is None:
+                status = '限流'
             else:
-                # 旧格式：{"task_status": "...", "generated": [...]}
-                status = result.get('task_status')
-                generated = result.get('generated', [])
-
-            print(f"当前状态: {status}")
-
-            if status == 'COMPLETED':
-                print("任务完成！")
-                return result
-            elif status == 'FAILED' or status == 'ERROR':
-                print("任务失败")
-                raise Exception(f"图片生成失败: {result}")
-            elif status in ['IN_PROGRESS', 'PENDING', 'CREATED', 'PROCESSING']:
-                print(f"任务进行中，{poll_interval}秒后重新检查...")
-                time.sleep(poll_interval)
+                status, _ = self._extract_status(result)
+                if status == 'COMPLETED':
+                    latency = time.time() - start_time
+                    self.poller.record(key, latency, polls)
+                    self.metrics.record('generation', latency)
+                    self._log(logging.INFO, 'task_completed', "任务完成！耗时 %.1f 秒，轮询 %d 次", latency, polls,
+                              task_id=task_id, seconds=round(latency, 3), polls=polls)
+                    return result
+                elif status == 'FAILED' or status == 'ERROR':
+                    self._log(logging.ERROR, 'task_failed', "任务失败", task_id=task_id, status=status)
+                    raise Exception(f"图片生成失败: {result}")
+
+            elapsed = time.time() - start_time
+            if poll_interval is not None:
+                interval = retry_after if retry_after is not None else poll_interval
             else:
-                print(f"未知状态: {status}")
-                time.sleep(poll_interval)
+                interval = self.poller.next_interval(key, elapsed, retry_after)
+            interval = min(interval, max(max_wait_time - elapsed, 0))
+            self._log(logging.DEBUG, 'task_pending', "当前状态: %s，%.1f秒后重新检查...", status, interval,
+                      task_id=task_id, status=status, next_poll=round(interval, 3))
+            time.sleep(interval)
 
         raise TimeoutError(f"任务在 {max_wait_time} 秒内未完成")
 
@@ -365,9 +884,10 @@ class FreepikImageGenerator:
         Returns:
             下载的图片文件路径列表
         """
-        print(f"开始处理下载任务...")
-        print(f"任务结果类型: {type(task_result)}")
-        print(f"任务结果内容: {json.dumps(task_result, ensure_ascii=False, indent=2)}")
+        if self.verbose:
+            print(f"开始处理下载任务...")
+            print(f"任务结果类型: {type(task_result)}")
+            print(f"任务结果内容: {json.dumps(task_result, ensure_ascii=False, indent=2)}")
 
         output_path = Path(output_dir)
         output_path.mkdir(exist_ok=True)
@@ -375,87 +895,328 @@ class FreepikImageGenerator:
         downloaded_files = []
 
         # 根据响应格式提取生成的图片
-        generated_images = []
-        if isinstance(task_result, dict):
-            if 'data' in task_result and 'generated' in task_result['data']:
-                # 新格式：{"data": {"generated": [...]}}
-                generated_images = task_result['data']['generated']
-                print(f"使用新格式，找到 {len(generated_images)} 张图片")
-            elif 'generated' in task_result:
-                # 旧格式：{"generated": [...]}
-                generated_images = task_result.get('generated', [])
-                print(f"使用旧格式，找到 {len(generated_images)} 张图片")
-            else:
-                print(f"警告: 在任务结果中找不到 'generated' 字段")
-                print(f"可用字段: {list(task_result.keys())}")
-        else:
-            print(f"错误: 任务结果不是字典类型: {type(task_result)}")
+        if not isinstance(task_result, dict):
+            self._log(logging.ERROR, 'invalid_task_result', "错误: 任务结果不是字典类型: %s", type(task_result),
+                      type=type(task_result).__name__)
             return downloaded_files
+        if 'generated' not in task_result.get('data', task_result):
+            self._log(logging.WARNING, 'generated_missing', "警告: 在任务结果中找不到 'generated' 字段，可用字段: %s",
+                      list(task_result.keys()), keys=list(task_result.keys()))
+        _, generated_images = self._extract_status(task_result)
 
         if not generated_images:
-            print("没有找到生成的图片")
+            self._log(logging.WARNING, 'no_images', "没有找到生成的图片")
             return downloaded_files
 
-        print(f"准备下载 {len(generated_images)} 张图片...")
+        if self.verbose:
+            print(f"准备下载 {len(generated_images)} 张图片...")
 
         for i, image_data in enumerate(generated_images):
-            print(f"\n处理图片 {i+1}:")
-            print(f"  图片数据类型: {type(image_data)}")
-            print(f"  图片数据内容: {image_data}")
-
-            if isinstance(image_data, str):
-                # 如果图片数据直接是URL字符串
-                image_url = image_data
-                print(f"  直接使用URL: {image_url}")
-            elif isinstance(image_data, dict):
-                # 如果图片数据是字典，尝试提取URL
-                image_url = image_data.get('url') or image_data.get('image_url') or image_data.get('link')
-                print(f"  从字典提取URL: {image_url}")
-            else:
-                print(f"  错误: 无法处理的图片数据类型: {type(image_data)}")
-                continue
-
+            image_url = self._image_url(image_data)
             if not image_url:
-                print(f"  图片 {i+1} 没有有效的URL")
+                self._log(logging.WARNING, 'image_url_missing', "  图片 %d 没有有效的URL: %s", i + 1, image_data, index=i + 1)
                 continue
 
             try:
-                print(f"  正在下载图片 {i+1}/{len(generated_images)}...")
-
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-
-                # 从URL或响应头中提取文件扩展名
-                content_type = response.headers.get('content-type', '')
-                if 'jpeg' in content_type or 'jpg' in content_type:
-                    ext = '.jpg'
-                elif 'png' in content_type:
-                    ext = '.png'
-                elif 'webp' in content_type:
-                    ext = '.webp'
-                else:
-                    ext = '.jpg'  # 默认
+                if self.verbose:
+                    print(f"  正在下载图片 {i+1}/{len(generated_images)}...")
 
-                filename = f"freepik_imagen3_{int(time.time())}_{i+1}{ext}"
-                file_path = output_path / filename
-
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+                # 扩展名根据响应头的content-type确定
+                file_path = self._download_to(image_url, output_path, f"freepik_imagen3_{int(time.time())}_{i+1}")
 
                 downloaded_files.append(file_path)
-                print(f"  ✓ 图片已保存到: {file_path}")
+                self._log(logging.INFO, 'image_downloaded', "  ✓ 图片已保存到: %s", file_path,
+                          index=i + 1, path=str(file_path))
 
-            except requests.exceptions.RequestException as e:
-                print(f"  ❌ 下载图片 {i+1} 失败: {e}")
+            except (requests.exceptions.RequestException, OSError) as e:
+                self._log(logging.ERROR, 'download_failed', "  ❌ 下载图片 %d 失败: %s", i + 1, e,
+                          index=i + 1, error=str(e))
                 continue
 
         return downloaded_files
 
+    @staticmethod
+    def _extract_task_id(result: Dict[str, Any]) -> Optional[str]:
+        """从创建任务的响应中提取task_id，兼容新旧两种格式"""
+        if 'data' in result and 'task_id' in result['data']:
+            return result['data']['task_id']
+        return result.get('task_id')
+
+    @staticmethod
+    def _extract_status(result: Dict[str, Any]):
+        """从任务状态响应中提取 (状态, 生成的图片列表)，兼容新旧两种格式"""
+        if 'data' in result:
+            return result['data'].get('status'), result['data'].get('generated', [])
+        return result.get('task_status'), result.get('generated', [])
+
+    @staticmethod
+    def _image_url(image_data) -> Optional[str]:
+        """图片数据可能是URL字符串，也可能是包含URL的字典"""
+        if isinstance(image_data, str):
+            return image_data
+        if isinstance(image_data, dict):
+            return image_data.get('url') or image_data.get('image_url') or image_data.get('link')
+        return None
+
+    def _download_to(self, image_url: str, output_path: Path, stem: str) -> Path:
+        """流式下载单张图片，根据响应的content-type确定扩展名"""
+        start_time = time.perf_counter()
+        file_path = download_file(self.session, image_url, output_path / stem)
+        self.metrics.record('download', time.perf_counter() - start_time)
+        return file_path
+
+    async def generate_batch_async(
+        self,
+        prompt: str,
+        output_dir: str = "output",
+        total_images: int = 1,
+        max_concurrency: int = 8,
+        poll_interval: Optional[float] = None,
+        max_wait_time: int = 300,
+        journal: Optional[JobJournal] = None,
+        job_id: Optional[str] = None,
+        **kwargs
+    ) -> List[Path]:
+        """
+        并发批量生成图片：在并发上限内同时提交各批次任务，由一个调度循环统一轮询所有任务状态，
+        任务完成后立即下载其图片，不等待其他批次
+
+        Args:
+            prompt: 图片描述文本
+            output_dir: 输出目录
+            total_images: 总图片数量
+            max_concurrency: 同时进行（已提交但未下载完成）的任务数上限
+            poll_interval: 固定轮询间隔（秒），为None时每个任务使用自适应轮询
+            max_wait_time: 单个任务的最大等待时间（秒）
+            journal: 任务日志，记录提交的task_id、状态变化和下载的文件
+            job_id: 日志中已有的任务ID，传入时按日志继续该任务：跳过已下载的图片，已提交的批次只重新轮询
+            **kwargs: 其他创建图片的参数
+
+        Returns:
+            下载的图片文件路径列表，按全局序号排序
+        """
+        job = {'prompt': prompt, 'output_dir': output_dir, 'total_images': total_images, 'params': kwargs}
+        if journal is not None:
+            if job_id is None:
+                job_id = journal.start_job(prompt, output_dir, total_images, kwargs)
+                self._log(logging.INFO, 'job_started', "任务日志: %s，任务ID: %s", journal.path, job_id,
+                          job_id=job_id, journal=str(journal.path))
+            else:
+                job['batches'] = journal.load()[job_id]['batches']
+        job['job_id'] = job_id
+
+        results = await self.run_jobs_async([job], max_concurrency, poll_interval, max_wait_time, journal)
+        return results[0]
+
+    async def run_jobs_async(
+        self,
+        jobs: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+        poll_interval: Optional[float] = None,
+        max_wait_time: int = 300,
+        journal: Optional[JobJournal] = None
+    ) -> List[List[Path]]:
+        """
+        多个生成任务共用一条流水线：所有任务的批次共享同一个并发上限、线程池和轮询循环，
+        总吞吐量只受并发数和API限速约束
+
+        Args:
+            jobs: 任务列表，每项包含 prompt、output_dir、total_images、params（其他创建图片的参数），
+                可选 job_id（日志中的任务ID）和 batches（日志回放得到的批次状态，用于恢复）
+            max_concurrency: 同时进行（已提交但未下载完成）的批次任务数上限
+            poll_interval: 固定轮询间隔（秒），为None时每个任务使用自适应轮询
+            max_wait_time: 单个批次任务的最大等待时间（秒）
+            journal: 任务日志，job_id 不为空的任务会记录事件
+
+        Returns:
+            与 jobs 一一对应的下载文件路径列表
+        """
+        max_per_batch = 4
+        job_batches = [[(start, min(max_per_batch, job['total_images'] - start))
+                        for start in range(0, job['total_images'], max_per_batch)] for job in jobs]
+        total_batches = sum(len(batches) for batches in job_batches)
+        total_images = sum(job['total_images'] for job in jobs)
+        self._log(logging.INFO, 'run_started',
+                  "=== 并发批量图片生成流程 ===\n共 %d 个任务，%d 张图片，分 %d 个批次，最多同时进行 %d 个批次",
+                  len(jobs), total_images, total_batches, max_concurrency,
+                  jobs=len(jobs), images=total_images, batches=total_batches, max_concurrency=max_concurrency)
+
+        loop = asyncio.get_running_loop()
+        # requests是阻塞调用，放到线程池中执行；每个任务最多同时下载4张图片
+        executor = ThreadPoolExecutor(max_workers=max_concurrency * max_per_batch)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # task_id -> [结果future, 提交时间, 轮询次数, 下次查询时间, 是否为恢复的任务, 轮询耗时的键]
+        waiting: Dict[str, list] = {}
+        remaining = total_batches
+        run_start = time.time()
+        first_result_at = None
+
+        def call(func, *args, **kw):
+            return loop.run_in_executor(executor, lambda: func(*args, **kw))
+
+        def schedule(entry: list, now: float, retry_after: Optional[float] = None):
+            if poll_interval is not None:
+                interval = retry_after if retry_after is not None else poll_interval
+            else:
+                interval = self.poller.next_interval(entry[5], now - entry[1], retry_after)
+            entry[3] = now + interval
+
+        async def poll_loop():
+            """统一轮询所有等待中的任务：每轮只查询已到查询时间的任务，完成或失败时通知对应的批次"""
+            while remaining:
+                now = time.time()
+                next_at = min((entry[3] for entry in waiting.values()), default=now + 0.1)
+                if next_at > now:
+                    # 最多睡眠0.1秒，新提交的任务可以及时纳入调度
+                    await asyncio.sleep(min(next_at - now, 0.1))
+                    continue
+                task_ids = [task_id for task_id, entry in waiting.items() if entry[3] <= now]
+                results = await asyncio.gather(*(call(self._fetch_task_status, task_id) for task_id in task_ids),
+                                               return_exceptions=True)
+                now = time.time()
+                for task_id, response in zip(task_ids, results):
+                    entry = waiting[task_id]
+                    future, submitted = entry[0], entry[1]
+                    entry[2] += 1
+                    if isinstance(response, Exception):
+                        schedule(entry, now)  # 查询失败，稍后重试
+                        continue
+                    result, retry_after = response
+                    status, generated = self._extract_status(result) if result is not None else (None, [])
+                    if status == 'COMPLETED':
+                        if not entry[4]:
+                            self.poller.record(entry[5], now - submitted, entry[2])
+                            self.metrics.record('generation', now - submitted)
+                        future.set_result(generated)
+                    elif status in ('FAILED', 'ERROR'):
+                        future.set_exception(Exception(f"图片生成失败: {result}"))
+                    elif now - submitted > max_wait_time:
+                        future.set_exception(TimeoutError(f"任务在 {max_wait_time} 秒内未完成"))
+                    else:
+                        schedule(entry, now, retry_after)
+                        continue
+                    del waiting[task_id]
+
+        async def run_batch(job: Dict[str, Any], batch_num: int, start: int, size: int) -> List[Path]:
+            nonlocal remaining, first_result_at
+            job_id = job.get('job_id')
+            params = job['params']
+            output_path = Path(job['output_dir'])
+            state = job.get('batches', {}).get(start, {})
+
+            def record(event: str, **fields):
+                if journal is not None and job_id is not None:
+                    journal.record(event, job_id, **fields)
+
+            # 日志中已下载且文件仍存在的图片不再下载
+            done = {index: Path(path) for index, path in state.get('files', {}).items() if Path(path).exists()}
+            task_id = state.get('task_id') if state.get('status') in ('SUBMITTED', 'COMPLETED') else None
+            try:
+                if len(done) >= size:
+                    return [done[index] for index in sorted(done)]
+                queued_at = time.perf_counter()
+                async with semaphore:
+                    self.metrics.record('queue_wait', time.perf_counter() - queued_at)
+                    if task_id is None:
+                        result = await call(self.create_image, job['prompt'], num_images=size, **params)
+                        task_id = self._extract_task_id(result or {})
+                        if not task_id:
+                            raise Exception(f"未获取到任务ID。API响应: {result}")
+                        record('task_submitted', start=start, size=size, task_id=task_id)
+                        entry = [loop.create_future(), time.time(), 0, 0.0, False]
+                    else:
+                        self._log(logging.INFO, 'batch_resumed',
+                                  "批次 %d 已提交（任务ID: %s），继续等待并下载缺失的图片", batch_num, task_id,
+                                  job_id=job_id, start=start, task_id=task_id)
+                        entry = [loop.create_future(), state.get('submitted_at', time.time()), 0, 0.0, True]
+                    entry.append(AdaptivePoller.make_key(**params))
+
+                    schedule(entry, time.time())
+                    waiting[task_id] = entry
+                    try:
+                        generated = await entry[0]
+                    except Exception as e:
+                        record('task_failed', start=start, task_id=task_id, error=str(e))
+                        raise
+                    if state.get('status') != 'COMPLETED':
+                        record('task_completed', start=start, task_id=task_id)
+
+                    timestamp = int(time.time())
+                    indices, downloads = [], []
+                    for i, image_data in enumerate(generated[:size]):
+                        index = start + i + 1
+                        image_url = self._image_url(image_data)
+                        if image_url and index not in done:
+                            stem = f"freepik_imagen3_{timestamp}_{index:03d}"
+                            indices.append(index)
+                            downloads.append(call(self._download_to, image_url, output_path, stem))
+                    for index, item in zip(indices, await asyncio.gather(*downloads, return_exceptions=True)):
+                        if isinstance(item, Exception):
+                            self._log(logging.ERROR, 'download_failed', "  ❌ 批次 %d 下载图片失败: %s", batch_num, item,
+                                      job_id=job_id, task_id=task_id, index=index, error=str(item))
+                        else:
+                            done[index] = item
+                            record('image_downloaded', start=start, task_id=task_id, index=index, path=str(item))
+                    if done and first_result_at is None:
+                        first_result_at = time.time()
+                    self._log(logging.INFO, 'batch_completed', "✓ 批次 %d 完成，已下载 %d 张图片", batch_num, len(done),
+                              job_id=job_id, start=start, task_id=task_id, downloaded=len(done))
+                    return [done[index] for index in sorted(done)]
+            except Exception as e:
+                self._log(logging.ERROR, 'batch_failed', "❌ 批次 %d 失败: %s", batch_num, e,
+                          job_id=job_id, start=start, task_id=task_id, error=str(e))
+                return [done[index] for index in sorted(done)]
+            finally:
+                remaining -= 1
+
+        async def run_job(job: Dict[str, Any], batches: List[tuple]) -> List[Path]:
+            Path(job['output_dir']).mkdir(parents=True, exist_ok=True)
+            batch_files = await asyncio.gather(*(run_batch(job, n + 1, start, size)
+                                                 for n, (start, size) in enumerate(batches)))
+            files = [path for paths in batch_files for path in paths]
+            if journal is not None and job.get('job_id') is not None and len(files) == job['total_images']:
+                journal.record('job_completed', job['job_id'])
+            return files
+
+        try:
+            poller = asyncio.ensure_future(poll_loop())
+            job_files = await asyncio.gather(*(run_job(job, batches) for job, batches in zip(jobs, job_batches)))
+            await poller
+        finally:
+            executor.shutdown(wait=False)
+
+        downloaded = sum(len(files) for files in job_files)
+        stats = self.poller.summary()
+        limits = self.rate_limiter.stats()
+        if self.verbose:
+            print(f"\n=== 批量生成完成 ===")
+            print(f"总共成功生成 {downloaded} 张图片，总耗时 {time.time() - run_start:.1f} 秒")
+            if first_result_at is not None:
+                print(f"首张图片耗时: {first_result_at - run_start:.1f} 秒")
+            if stats['tasks']:
+                ttfr = stats['time_to_first_result']
+                print(f"轮询统计: {stats['tasks']} 个任务，平均轮询 {stats['polls_per_task']:.1f} 次，"
+                      f"任务耗时 p50 {ttfr['p50']:.1f} 秒 / p95 {ttfr['p95']:.1f} 秒，"
+                      f"Retry-After {stats['retry_after_hits']} 次")
+            print(f"限速统计: 请求 {limits['acquired']} 次，429 {limits['throttled']} 次，"
+                  f"配额暂停 {limits['quota_pauses']} 次，累计等待 {limits['waited_seconds']:.1f} 秒，"
+                  f"当前速率 {limits['rate']:.1f}/{limits['max_rate']:.1f} 次/秒")
+            print(f"各阶段耗时:\n{self.metrics.format_report()}")
+        else:
+            log_event(logging.INFO, 'run_summary', downloaded=downloaded,
+                      seconds=round(time.time() - run_start, 3),
+                      first_result=round(first_result_at - run_start, 3) if first_result_at else None,
+                      phases=self.metrics.summary(), polling=stats, rate_limit=limits)
+        return job_files
+
     def generate_and_download_batch(
         self,
         prompt: str,
         output_dir: str = "output",
         total_images: int = 1,
+        max_concurrency: int = 8,
+        poll_interval: Optional[float] = None,
+        journal_path: Optional[str] = None,
         **kwargs
     ) -> List[Path]:
         """
@@ -465,13 +1226,21 @@ class FreepikImageGenerator:
             prompt: 图片描述文本
             output_dir: 输出目录
             total_images: 总图片数量（不限制数量）
+            max_concurrency: 同时进行的任务数，大于1时使用并发流程 generate_batch_async，为1时逐批处理
+            poll_interval: 固定轮询间隔（秒），为None时使用自适应轮询
+            journal_path: 任务日志文件（JSONL），提供时使用并发流程并记录每个批次，中断后可用 resume 继续
             **kwargs: 其他创建图片的参数
 
         Returns:
             下载的图片文件路径列表
         """
-        print(f"=== 批量图片生成流程 ===")
-        print(f"总共需要生成 {total_images} 张图片")
+        if max_concurrency > 1 or journal_path:
+            journal = JobJournal(journal_path) if journal_path else None
+            return asyncio.run(self.generate_batch_async(
+                prompt, output_dir, total_images, max_concurrency, poll_interval, journal=journal, **kwargs))
+
+        self._log(logging.INFO, 'batch_started', "=== 批量图片生成流程 ===\n总共需要生成 %d 张图片", total_images,
+                  total_images=total_images)
 
         # API单次最多支持4张图片
         max_per_batch = 4
@@ -486,9 +1255,10 @@ class FreepikImageGenerator:
                 'batch_size': batch_size
             })
 
-        print(f"将分 {len(batches)} 个批次处理:")
-        for batch in batches:
-            print(f"  批次 {batch['batch_num']}: 生成 {batch['batch_size']} 张图片 (第{batch['start_index']}-{batch['start_index'] + batch['batch_size'] - 1}张)")
+        if self.verbose:
+            print(f"将分 {len(batches)} 个批次处理:")
+            for batch in batches:
+                print(f"  批次 {batch['batch_num']}: 生成 {batch['batch_size']} 张图片 (第{batch['start_index']}-{batch['start_index'] + batch['batch_size'] - 1}张)")
 
         all_downloaded_files = []
 
@@ -497,12 +1267,14 @@ class FreepikImageGenerator:
             batch_size = batch_info['batch_size']
             start_index = batch_info['start_index']
 
-            print(f"\n=== 处理批次 {batch_num}/{len(batches)} ===")
-            print(f"正在生成第 {start_index}-{start_index + batch_size - 1} 张图片...")
+            self._log(logging.DEBUG, 'batch_submitted',
+                      "\n=== 处理批次 %d/%d ===\n正在生成第 %d-%d 张图片...",
+                      batch_num, len(batches), start_index, start_index + batch_size - 1,
+                      batch=batch_num, batches=len(batches), start=start_index, size=batch_size)
 
             try:
                 # 生成当前批次的图片
-                batch_files = self.generate_and_download(
+                batch_files = self._generate_and_download(
                     prompt=prompt,
                     output_dir=output_dir,
                     num_images=batch_size,
@@ -533,34 +1305,175 @@ class FreepikImageGenerator:
                     try:
                         file_path.rename(new_path)
                         renamed_files.append(new_path)
-                        print(f"  ✓ 重命名: {file_path.name} -> {new_name}")
+                        self._log(logging.DEBUG, 'file_renamed', "  ✓ 重命名: %s -> %s", file_path.name, new_name,
+                                  source=str(file_path), target=str(new_path))
                     except Exception as e:
-                        print(f"  ⚠️ 重命名失败，保持原名: {e}")
+                        self._log(logging.WARNING, 'rename_failed', "  ⚠️ 重命名失败，保持原名: %s", e,
+                                  path=str(file_path), error=str(e))
                         renamed_files.append(file_path)
 
                 all_downloaded_files.extend(renamed_files)
-                print(f"✓ 批次 {batch_num} 完成，已生成 {len(batch_files)} 张图片")
-
-                # 如果不是最后一个批次，稍等一下避免API限流
-                if batch_num < len(batches):
-                    print(f"等待 3 秒后处理下一批次...")
-                    time.sleep(3)
+                self._log(logging.INFO, 'batch_completed', "✓ 批次 %d 完成，已生成 %d 张图片", batch_num, len(batch_files),
+                          batch=batch_num, images=len(batch_files))
 
             except Exception as e:
-                print(f"❌ 批次 {batch_num} 失败: {e}")
-                print("继续处理下一批次...")
+                self._log(logging.ERROR, 'batch_failed', "❌ 批次 %d 失败: %s\n继续处理下一批次...", batch_num, e,
+                          batch=batch_num, error=str(e))
                 continue
 
-        print(f"\n=== 批量生成完成 ===")
-        print(f"总共成功生成 {len(all_downloaded_files)} 张图片")
+        self._log(logging.INFO, 'run_summary',
+                  "\n=== 批量生成完成 ===\n总共成功生成 %d 张图片", len(all_downloaded_files),
+                  downloaded=len(all_downloaded_files), phases=self.metrics.summary())
 
         return all_downloaded_files
 
+    def run_manifest(
+        self,
+        manifest_path: str,
+        output_dir: str = "output",
+        max_concurrency: int = 8,
+        poll_interval: Optional[float] = None,
+        journal_path: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按任务清单批量生成：每行展开为所有参数组合，所有组合共用一条并发流水线（run_jobs_async），
+        完成后在输出目录写入 results.jsonl，记录每行每个组合对应的图片文件
+
+        Args:
+            manifest_path: 任务清单（CSV或JSONL），格式见 load_manifest
+            output_dir: 输出目录，每个组合的图片保存在 {行id}_{组合序号} 子目录中
+            max_concurrency: 同时进行的批次任务数
+            poll_interval: 固定轮询间隔（秒），为None时使用自适应轮询
+            journal_path: 任务日志文件，中断后可用 resume 继续
+
+        Returns:
+            结果索引记录列表，与 results.jsonl 的内容相同
+        """
+        rows = load_manifest(manifest_path)
+        journal = JobJournal(journal_path) if journal_path else None
+        output_path = Path(output_dir)
+        index_path = output_path / 'results.jsonl'
+        records, jobs, job_records = [], [], []
+
+        for row_number, row in enumerate(rows, 1):
+            row_id = row['id']
+            num_images = int(row.get('num_images') or 1)
+            for variant_number, params in enumerate(expand_manifest_row(row), 1):
+                variant_dir = output_path / f"{row_id}_{variant_number:03d}"
+                variant_dir.mkdir(parents=True, exist_ok=True)
+                record = {'row': row_number, 'id': row_id, 'variant': variant_number, 'prompt': row['prompt'],
+                          'params': params, 'num_images': num_images, 'output_dir': str(variant_dir), 'files': []}
+                records.append(record)
+
+                shortfall = num_images
+                if self.cache is not None:
+                    key = PromptCache.make_key(self.build_payload(row['prompt'], **params))
+                    record['files'] = [str(path) for path in self.cache.fetch(key, num_images, variant_dir)]
+                    record['cache_key'] = key
+                    shortfall -= len(record['files'])
+                if shortfall <= 0:
+                    continue
+
+                job = {'prompt': row['prompt'], 'output_dir': str(variant_dir), 'total_images': shortfall,
+                       'params': params}
+                if journal is not None:
+                    manifest = {'index': str(index_path), 'cached_files': list(record['files'])}
+                    job['job_id'] = journal.start_job(row['prompt'], str(variant_dir), shortfall, params,
+                                                      manifest=manifest)
+                jobs.append(job)
+                job_records.append(record)
+
+        self._log(logging.INFO, 'manifest_loaded',
+                  "清单共 %d 行，展开为 %d 个参数组合，其中 %d 个需要提交任务", len(rows), len(records), len(jobs),
+                  rows=len(rows), combinations=len(records), jobs=len(jobs))
+        # 先写入一次结果索引，中断后 resume 在此基础上按日志补全
+        _write_results(index_path, records)
+        if jobs:
+            job_files = asyncio.run(self.run_jobs_async(jobs, max_concurrency, poll_interval, journal=journal))
+            for record, files in zip(job_records, job_files):
+                record['files'].extend(str(path) for path in files)
+                if self.cache is not None:
+                    for path in files:
+                        self.cache.store(record['cache_key'], path)
+        if self.cache is not None:
+            self.cache.save()
+
+        for record in records:
+            record.pop('cache_key', None)
+        _write_results(index_path, records)
+
+        downloaded = sum(len(record['files']) for record in records)
+        requested = sum(record['num_images'] for record in records)
+        self._log(logging.INFO, 'manifest_completed', "清单完成: %d/%d 张图片，结果索引: %s", downloaded, requested, index_path,
+                  downloaded=downloaded, requested=requested, index=str(index_path))
+        return records
+
+    def resume(self, journal_path: str, max_concurrency: int = 8, poll_interval: Optional[float] = None) -> List[Path]:
+        """
+        按任务日志继续未完成的批量任务：已提交的批次重新轮询并只下载缺失的图片，
+        未提交或已失败的批次重新提交；清单任务（run_manifest）完成后按日志重新生成对应的 results.jsonl
+
+        Args:
+            journal_path: 任务日志文件
+            max_concurrency: 同时进行的任务数
+            poll_interval: 固定轮询间隔（秒），为None时使用自适应轮询
+
+        Returns:
+            所有未完成任务最终的图片文件路径列表
+        """
+        journal = JobJournal(journal_path)
+        pending = journal.pending_jobs()
+        self._log(logging.INFO, 'resume_started', "=== 恢复任务 ===\n日志中有 %d 个未完成的任务", len(pending),
+                  pending=len(pending), journal=str(journal.path))
+
+        jobs = []
+        for job_id, job in pending.items():
+            self._log(logging.INFO, 'job_resumed', "继续任务 %s: %s（共 %d 张）",
+                      job_id, job['prompt'], job['total_images'],
+                      job_id=job_id, total_images=job['total_images'])
+            jobs.append({**job, 'job_id': job_id})
+        if not jobs:
+            return []
+
+        # 所有未完成的任务共用一条流水线
+        job_files = asyncio.run(self.run_jobs_async(jobs, max_concurrency, poll_interval, journal=journal))
+        index_paths = {job['manifest']['index'] for job in jobs if job.get('manifest')}
+        for index_path in sorted(index_paths):
+            self._rebuild_manifest_results(journal, index_path)
+        return [path for files in job_files for path in files]
+
+    def _rebuild_manifest_results(self, journal: JobJournal, index_path: str):
+        """按日志中各任务已下载的图片（加上缓存命中的文件）更新清单的结果索引"""
+        index_path = Path(index_path)
+        if not index_path.exists():
+            self._log(logging.WARNING, 'results_missing', "未找到结果索引 %s，跳过重新生成", index_path,
+                      index=str(index_path))
+            return
+        journal_jobs = {job['output_dir']: job for job in journal.load().values()
+                        if (job.get('manifest') or {}).get('index') == str(index_path)}
+        with open(index_path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        for record in records:
+            job = journal_jobs.get(record['output_dir'])
+            if job is None:
+                continue
+            files = {index: path for batch in job['batches'].values() for index, path in batch['files'].items()}
+            record['files'] = job['manifest']['cached_files'] + [
+                files[index] for index in sorted(files) if Path(files[index]).exists()]
+        _write_results(index_path, records)
+
+        downloaded = sum(len(record['files']) for record in records)
+        requested = sum(record['num_images'] for record in records)
+        self._log(logging.INFO, 'manifest_completed', "清单完成: %d/%d 张图片，结果索引: %s", downloaded, requested, index_path,
+                  downloaded=downloaded, requested=requested, index=str(index_path))
+
     def generate_and_download(
         self,
         prompt: str,
         output_dir: str = "output",
         num_images: int = 1,
+        max_concurrency: int = 8,
+        journal_path: Optional[str] = None,
         **kwargs
     ) -> List[Path]:
         """
@@ -569,23 +1482,66 @@ class FreepikImageGenerator:
         Args:
             prompt: 图片描述文本
             output_dir: 输出目录
-            num_images: 生成图片数量（如果超过4张，会自动调用批量生成）
+            num_images: 生成图片数量（如果超过4张，会自动调用批量生成；启用缓存时先复用缓存中的图片）
+            max_concurrency: 批量生成时同时进行的任务数
+            journal_path: 批量生成时的任务日志文件
             **kwargs: 其他创建图片的参数
 
         Returns:
             下载的图片文件路径列表
         """
+        if self.cache is None:
+            return self._generate_and_download(prompt, output_dir, num_images, max_concurrency, journal_path, **kwargs)
+
+        # 相同参数已有缓存图片时优先复用，只为不足的数量提交任务
+        key = PromptCache.make_key(self.build_payload(prompt, **kwargs))
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        cached_files = self.cache.fetch(key, num_images, output_path)
+        new_files = []
+        if cached_files:
+            self._log(logging.INFO, 'cache_hit',
+                      "缓存命中 %d 张图片，需要新生成 %d 张", len(cached_files), num_images - len(cached_files),
+                      hit=len(cached_files), requested=num_images)
+        if len(cached_files) < num_images:
+            new_files = self._generate_and_download(prompt, output_dir, num_images - len(cached_files),
+                                                    max_concurrency, journal_path, **kwargs)
+            for file_path in new_files:
+                self.cache.store(key, file_path)
+        self.cache.save()
+
+        stats = self.cache.stats()
+        self._log(logging.INFO, 'cache_stats',
+                  "缓存统计: 命中率 %.0f%%（%d/%d 张），%d 组参数，%.1f MB",
+                  stats['hit_rate'] * 100, stats['images_hit'], stats['images_requested'], stats['entries'],
+                  stats['size_mb'], **stats)
+        return cached_files + new_files
+
+    def _generate_and_download(
+        self,
+        prompt: str,
+        output_dir: str = "output",
+        num_images: int = 1,
+        max_concurrency: int = 8,
+        journal_path: Optional[str] = None,
+        **kwargs
+    ) -> List[Path]:
+        """生成图片并下载到本地，不经过缓存，参数同 generate_and_download"""
         # 如果请求超过4张图片，自动使用批量生成
         if num_images > 4:
-            print(f"请求生成 {num_images} 张图片，超过单次限制（4张），自动启用批量生成模式")
+            self._log(logging.INFO, 'batch_mode', "请求生成 %d 张图片，超过单次限制（4张），自动启用批量生成模式", num_images,
+                      num_images=num_images)
             return self.generate_and_download_batch(
                 prompt=prompt,
                 output_dir=output_dir,
                 total_images=num_images,
+                max_concurrency=max_concurrency,
+                journal_path=journal_path,
                 **kwargs
             )
 
-        print(f"=== 开始图片生成流程 ===")
+        if self.verbose:
+            print(f"=== 开始图片生成流程 ===")
 
         # 创建图片生成任务
         result = self.create_image(prompt, num_images=num_images, **kwargs)
@@ -603,24 +1559,153 @@ class FreepikImageGenerator:
             task_id = result.get('task_id')
 
         if not task_id:
-            print(f"完整API响应: {result}")
+            self._log(logging.ERROR, 'task_id_missing', "完整API响应: %s", result, response=result)
             raise Exception(f"未获取到任务ID。API响应: {result}")
 
-        print(f"✓ 任务创建成功，ID: {task_id}")
+        if self.verbose:
+            print(f"✓ 任务创建成功，ID: {task_id}")
 
         # 等待任务完成
-        print(f"=== 等待任务完成 ===")
-        completed_result = self.wait_for_completion(task_id)
+        if self.verbose:
+            print(f"=== 等待任务完成 ===")
+        completed_result = self.wait_for_completion(task_id, params_key=AdaptivePoller.make_key(**kwargs))
 
         # 下载图片
-        print(f"=== 开始下载图片 ===")
+        if self.verbose:
+            print(f"=== 开始下载图片 ===")
         downloaded_files = self.download_images(completed_result, output_dir)
 
-        print(f"=== 流程完成 ===")
+        if self.verbose:
+            print(f"=== 流程完成 ===")
         return downloaded_files
 
 
-def main(prompt, num_images, aspect_ratio, style, color, lightning, framing, output_dir):
+class _MockImagen3Handler(BaseHTTPRequestHandler):
+    """模拟 imagen3 接口：POST 创建任务，GET /{task_id} 查询状态，GET /images/... 返回图片"""
+
+    protocol_version = 'HTTP/1.1'
+
+    latency = 1.0  # 任务从创建到完成的耗时（秒）
+    rate_limit = None  # 每秒允许的API请求数，超过时返回429
+    tasks: Dict[str, tuple] = {}
+    requests_log: List[float] = []
+    lock = threading.Lock()
+    image_bytes = b'\x89PNG\r\n\x1a\n' + b'\x00' * 1024
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self) -> bool:
+        """按滑动的一秒窗口限流，超过 rate_limit 时返回429并附带 Retry-After"""
+        if self.rate_limit is None:
+            return False
+        now = time.time()
+        with self.lock:
+            self.requests_log[:] = [t for t in self.requests_log if now - t < 1.0]
+            if len(self.requests_log) < self.rate_limit:
+                self.requests_log.append(now)
+                return False
+            retry_after = 1.0 - (now - self.requests_log[0])
+        self.send_response(429)
+        self.send_header('Retry-After', f"{max(retry_after, 0.01):.2f}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def do_POST(self):
+        if self._throttled():
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        task_id = uuid.uuid4().hex
+        self.tasks[task_id] = (time.time() + self.latency, payload.get('num_images', 1))
+        self._send_json({'data': {'task_id': task_id, 'status': 'CREATED', 'generated': []}})
+
+    def do_GET(self):
+        name = self.path.rstrip('/').rsplit('/', 1)[-1]
+        if '/images/' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(self.image_bytes)))
+            self.end_headers()
+            self.wfile.write(self.image_bytes)
+            return
+        if self._throttled():
+            return
+        if name not in self.tasks:
+            self._send_json({'message': 'not found'}, 404)
+            return
+        done_at, count = self.tasks[name]
+        if time.time() < done_at:
+            self._send_json({'data': {'task_id': name, 'status': 'IN_PROGRESS', 'generated': []}})
+            return
+        host = f"http://{self.headers['Host']}"
+        generated = [f"{host}/images/{name}_{i}.png" for i in range(count)]
+        self._send_json({'data': {'task_id': name, 'status': 'COMPLETED', 'generated': generated}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_mock_server(port: int = 0, latency: float = 1.0, rate_limit: Optional[int] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动模拟 imagen3 接口的本地服务
+
+    Args:
+        port: 端口，0表示自动分配
+        latency: 每个任务的生成耗时（秒）
+        rate_limit: 每秒允许的API请求数（图片下载不计），为None时不限流
+
+    Returns:
+        服务对象，接口地址为 f"http://127.0.0.1:{server.server_port}/v1/ai/text-to-image/imagen3"，用完后调用 shutdown()
+    """
+    handler = type('MockImagen3Handler', (_MockImagen3Handler,),
+                   {'latency': latency, 'rate_limit': rate_limit, 'tasks': {}, 'requests_log': [],
+                    'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark_batch_generation(total_images: int = 100, latency: float = 1.0, max_concurrency: int = 16,
+                               poll_interval: Optional[float] = None, output_dir: str = "benchmark_output"):
+    """
+    基准测试：在本地模拟服务上对比逐批处理与并发处理生成 total_images 张图片的耗时
+    """
+    import contextlib
+    import io
+    import shutil
+
+    server = run_mock_server(latency=latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1/ai/text-to-image/imagen3"
+    print(f"基准测试: {total_images} 张图片, 任务耗时 {latency} 秒, 并发数 {max_concurrency}")
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = FreepikImageGenerator(api_key="mock-api-key-0000", base_url=base_url)
+        timings = {}
+        for name, concurrency in (('逐批', 1), ('并发', max_concurrency)):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                files = generator.generate_and_download_batch(
+                    "benchmark", output_dir, total_images, max_concurrency=concurrency, poll_interval=poll_interval)
+            timings[name] = time.perf_counter() - start
+            print(f"  {name}: {timings[name]:.1f} 秒, 下载 {len(files)} 张")
+        print(f"  加速比: {timings['逐批'] / timings['并发']:.1f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main(prompt, num_images, aspect_ratio, style, color, lightning, framing, output_dir, max_concurrency=8,
+         journal_path=None, resume=False, manifest_path=None):
     """主函数示例"""
     try:
         print("=== Freepik Imagen3 图片生成器 ===")
@@ -628,12 +1713,23 @@ def main(prompt, num_images, aspect_ratio, style, color, lightning, framing, out
         # 初始化生成器
         generator = FreepikImageGenerator()
 
+        if resume:
+            downloaded_files = generator.resume(journal_path, max_concurrency=max_concurrency)
+            print(f"\n🎉 恢复完成，共有 {len(downloaded_files)} 张图片")
+            return
+
+        if manifest_path:
+            generator.run_manifest(manifest_path, output_dir or "output", max_concurrency, journal_path=journal_path)
+            return
+
         print("开始生成图片...")
         # 修复参数传递方式 - 除了prompt和output_dir，其他参数通过关键字参数传递
         downloaded_files = generator.generate_and_download(
             prompt=prompt,
             output_dir=output_dir or "output",
             num_images=num_images,
+            max_concurrency=max_concurrency,
+            journal_path=journal_path,
             aspect_ratio=aspect_ratio,
             style=style,
             color=color,
@@ -672,4 +1768,10 @@ if __name__ == "__main__":
     framing = "portrait"  # 可选，构图：portrait, macro, panoramic, aerial-view, close-up等
     output_dir = "output"  # 可选，输出目录，默认output
 
-    main(prompt, num_images, aspect_ratio, style, color, lightning, framing, output_dir)
+    max_concurrency = 8  # 可选，批量生成时同时进行的任务数，1表示逐批处理
+    journal_path = "output/freepik_jobs.jsonl"  # 可选，批量任务日志，中断后可据此恢复，None表示不记录
+    resume = False  # True时不提交新任务，按任务日志继续未完成的批量任务
+    manifest_path = None  # 可选，任务清单（CSV/JSONL），提供时忽略上面的单个提示词参数，按清单批量生成
+
+    main(prompt, num_images, aspect_ratio, style, color, lightning, framing, output_dir, max_concurrency,
+         journal_path, resume, manifest_path)
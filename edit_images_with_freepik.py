@@ -1,14 +1,26 @@
 """
 使用Freepik的API将指定目录下的图片批量去除背景
+
+接口文档中的参数为 image_url：默认通过 image_base_url 按URL提交已托管的图片。
+本地图片直接上传（upload_mode='multipart' 或 'base64'）不在接口文档中，需显式开启，使用前请确认接口接受该格式；
+上传前可按 max_upload_side 等比缩小以减少上传数据量。多张图片在共享限速器下并发提交，已存在的输出默认跳过
 """
+import base64
+import io
+import mimetypes
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import requests
 import logging
-from typing import List
-import time
-from urllib.parse import urlparse
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+from freepik_client import (PhaseMetrics, RateLimiter, download_file, get_shared_rate_limiter, get_shared_session,
+                             log_event, send_request)
 
 # 加载.env文件
 load_dotenv()
@@ -21,7 +33,30 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class FreepikBackgroundRemover:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, pool_size: int = 10, max_retries: int = 3,
+                 session: requests.Session = None, rate_limiter: RateLimiter = None, verbose: bool = True,
+                 upload_mode: Optional[str] = None, max_upload_side: Optional[int] = 2048):
+        """
+        Args:
+            api_key: Freepik API key，默认从环境变量 FREEPIK_API_KEY 获取
+            pool_size: 连接池大小
+            max_retries: 连接失败和GET请求5xx响应的重试次数
+            session: 自定义的 requests.Session，默认使用 freepik_client 中按参数共享的 Session
+            rate_limiter: API请求的限速器，默认与 FreepikImageGenerator 共用 freepik_client 中的 'freepik' 限速器
+            verbose: True时输出可读的日志文本；False时输出 'freepik' 日志中的单行JSON事件
+            upload_mode: 本地图片直接上传的方式（实验性，接口文档只有 image_url 参数）：None 表示不直接上传，
+                只按URL提交；'multipart' 以文件字段 image 上传，'base64' 以JSON字段 image 上传
+            max_upload_side: 直接上传前图片长边的上限（像素），更大的图片等比缩小后再上传，None表示按原图上传
+        """
+        if upload_mode not in (None, 'multipart', 'base64'):
+            raise ValueError(f"不支持的上传方式: {upload_mode}")
+        self.upload_mode = upload_mode
+        self.max_upload_side = max_upload_side
+        self.bytes_original = 0
+        self.bytes_uploaded = 0
+        self._bytes_lock = threading.Lock()
+        self.verbose = verbose
+        self.metrics = PhaseMetrics()
         self.api_key = api_key or os.getenv('FREEPIK_API_KEY')
         if not self.api_key:
             raise ValueError("未找到FREEPIK_API_KEY，请在.env文件中设置或直接传入api_key参数")
@@ -31,6 +66,8 @@ class FreepikBackgroundRemover:
             'Content-Type': 'application/x-www-form-urlencoded',
             'x-freepik-api-key': self.api_key
         }
+        self.session = session or get_shared_session(pool_size, max_retries)
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
 
     def remove_background(self, image_url: str) -> dict:
         """
@@ -42,19 +79,88 @@ class FreepikBackgroundRemover:
         Returns:
             dict: API响应结果
         """
+        return self._post(self.headers, data={'image_url': image_url})
+
+    def remove_background_file(self, image_file: Path) -> dict:
+        """
+        上传本地图片并去除背景（实验性：接口文档只有 image_url 参数，需在构造时指定 upload_mode）
+
+        Args:
+            image_file: 本地图片路径
+
+        Returns:
+            dict: API响应结果
+        """
+        if self.upload_mode is None:
+            raise ValueError("未开启本地图片直接上传，请指定 upload_mode，或通过 image_base_url 按URL提交")
+        name, data, mime = self._prepare_upload(Path(image_file))
+        # multipart 的 Content-Type（含boundary）由requests生成
+        headers = {k: v for k, v in self.headers.items() if k != 'Content-Type'}
+        if self.upload_mode == 'base64':
+            return self._post(headers, json={'image': base64.b64encode(data).decode('ascii')})
+        return self._post(headers, files={'image': (name, data, mime)})
+
+    def _post(self, headers: dict, **kwargs) -> dict:
+        """经共享限速器提交去背景请求，记录提交耗时"""
+        start_time = time.perf_counter()
         try:
-            response = requests.post(
+            response = send_request(
+                self.session,
+                'POST',
                 self.base_url,
-                headers=self.headers,
-                data={'image_url': image_url}
+                rate_limiter=self.rate_limiter,
+                headers=headers,
+                timeout=60,
+                **kwargs
             )
             response.raise_for_status()
+            self.metrics.record('submit', time.perf_counter() - start_time)
             return response.json()
         except requests.exceptions.RequestException as e:
-            logger.error(f"API调用失败: {str(e)}")
+            self._log(logging.ERROR, 'remove_failed', "API调用失败: %s", e)
             raise
 
-    def process_directory(self, input_dir: str, output_dir: str, supported_extensions: List[str] = None):
+    def _prepare_upload(self, image_file: Path) -> Tuple[str, bytes, str]:
+        """
+        读取待上传的图片，长边超过 max_upload_side 时按EXIF方向校正后等比缩小并重新编码
+
+        Returns:
+            (文件名, 图片数据, MIME类型)
+        """
+        data = image_file.read_bytes()
+        mime = mimetypes.guess_type(image_file.name)[0] or 'application/octet-stream'
+        upload = (image_file.name, data, mime)
+
+        if self.max_upload_side:
+            with Image.open(io.BytesIO(data)) as img:
+                if max(img.size) > self.max_upload_side:
+                    img = ImageOps.exif_transpose(img)
+                    img.thumbnail((self.max_upload_side, self.max_upload_side), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    # 有透明通道或原图为PNG时保存为PNG，否则保存为高质量JPEG
+                    if img.mode in ('RGBA', 'LA', 'P') or image_file.suffix.lower() == '.png':
+                        img.save(buffer, format='PNG')
+                        upload = (f"{image_file.stem}.png", buffer.getvalue(), 'image/png')
+                    else:
+                        img.convert('RGB').save(buffer, format='JPEG', quality=95)
+                        upload = (f"{image_file.stem}.jpg", buffer.getvalue(), 'image/jpeg')
+
+        with self._bytes_lock:
+            self.bytes_original += len(data)
+            self.bytes_uploaded += len(upload[1])
+        return upload
+
+    def _log(self, level: int, event: str, message: str, *args, **fields):
+        """可读模式下按 message 惰性格式化输出，否则输出单行JSON事件（args 按顺序记入 args 字段）"""
+        if self.verbose:
+            logger.log(level, message, *args)
+        else:
+            if args:
+                fields['args'] = [str(arg) for arg in args]
+            log_event(level, event, **fields)
+
+    def process_directory(self, input_dir: str, output_dir: str, supported_extensions: List[str] = None,
+                          workers: int = 4, overwrite: bool = False, image_base_url: Optional[str] = None):
         """
         处理指定目录下的所有图片
 
@@ -62,7 +168,16 @@ class FreepikBackgroundRemover:
             input_dir: 输入目录路径
             output_dir: 输出目录路径
             supported_extensions: 支持的图片扩展名列表
+            workers: 并发处理的图片数，实际请求速率由共享限速器控制
+            overwrite: 是否覆盖已存在的输出文件，默认跳过
+            image_base_url: 输入目录托管的访问地址，按URL提交（地址 + 相对路径）；
+                未设置时需在构造时指定 upload_mode 以直接上传本地文件
+
+        Returns:
+            统计信息 {'total', 'processed', 'skipped', 'failed'}
         """
+        if not image_base_url and self.upload_mode is None:
+            raise ValueError("请设置 image_base_url 按URL提交，或在构造时指定 upload_mode 直接上传本地文件")
         if supported_extensions is None:
             supported_extensions = ['.jpg', '.jpeg', '.png']
 
@@ -76,63 +191,99 @@ class FreepikBackgroundRemover:
             if f.suffix.lower() in supported_extensions
         ]
 
-        logger.info(f"找到 {len(image_files)} 个图片文件")
+        self._log(logging.INFO, 'files_found', "找到 %d 个图片文件", len(image_files))
 
+        summary = {'total': len(image_files), 'processed': 0, 'skipped': 0, 'failed': 0}
+        tasks = []
         for image_file in image_files:
-            try:
-                logger.info(f"处理文件: {image_file.name}")
+            output_file = output_path / f"no_bg_{image_file.name}"
+            if not overwrite and output_file.exists() and output_file.stat().st_size > 0:
+                summary['skipped'] += 1
+                continue
+            tasks.append((image_file, output_file))
+        if summary['skipped']:
+            self._log(logging.INFO, 'files_skipped', "跳过 %d 个已处理的文件", summary['skipped'])
 
-                # 这里需要先将图片上传到可访问的URL
-                # 注意：实际使用时需要实现图片上传逻辑
-                image_url = f"https://example.com/{image_file.name}"  # 替换为实际的上传URL
+        def process(image_file: Path, output_file: Path):
+            self._log(logging.DEBUG, 'file_started', "处理文件: %s", image_file.name)
+            if image_base_url:
+                relative = image_file.relative_to(input_path).as_posix()
+                result = self.remove_background(f"{image_base_url.rstrip('/')}/{relative}")
+            else:
+                result = self.remove_background_file(image_file)
 
-                # 调用API去除背景
-                result = self.remove_background(image_url)
+            # 下载处理后的图片
+            result_url = result.get('url') or result.get('high_resolution')
+            if not result_url:
+                raise ValueError(f"API响应中没有结果图片地址: {result}")
+            self._download_image(result_url, output_file)
 
-                # 下载处理后的图片
-                output_file = output_path / f"no_bg_{image_file.name}"
-                self._download_image(result['url'], output_file)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(process, image_file, output_file): image_file
+                       for image_file, output_file in tasks}
+            for future in as_completed(futures):
+                image_file = futures[future]
+                try:
+                    future.result()
+                    summary['processed'] += 1
+                    self._log(logging.INFO, 'file_done', "成功处理文件: %s", image_file.name)
+                except Exception as e:
+                    summary['failed'] += 1
+                    self._log(logging.ERROR, 'file_failed', "处理文件 %s 时出错: %s", image_file.name, e)
 
-                logger.info(f"成功处理文件: {image_file.name}")
-
-                # API调用间隔
-                time.sleep(1)
-
-            except Exception as e:
-                logger.error(f"处理文件 {image_file.name} 时出错: {str(e)}")
+        stats = self.rate_limiter.stats()
+        if self.verbose:
+            logger.info("处理完成: 成功 %d 个，跳过 %d 个，失败 %d 个",
+                        summary['processed'], summary['skipped'], summary['failed'])
+            if self.bytes_original:
+                logger.info("上传数据: %.1f MB（原图 %.1f MB）",
+                            self.bytes_uploaded / 1024 / 1024, self.bytes_original / 1024 / 1024)
+            logger.info("限速统计: 请求 %d 次，429 %d 次，累计等待 %.1f 秒",
+                        stats['acquired'], stats['throttled'], stats['waited_seconds'])
+            logger.info("各阶段耗时:\n%s", self.metrics.format_report())
+        else:
+            log_event(logging.INFO, 'run_summary', **summary, bytes_original=self.bytes_original,
+                      bytes_uploaded=self.bytes_uploaded, phases=self.metrics.summary(), rate_limit=stats)
+        return summary
 
     def _download_image(self, url: str, output_path: Path):
         """
-        下载图片到指定路径
+        流式下载图片到指定路径，先写入临时文件再原子重命名
 
         Args:
             url: 图片URL
             output_path: 输出路径
         """
+        start_time = time.perf_counter()
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            output_path.write_bytes(response.content)
+            download_file(self.session, url, output_path)
+            self.metrics.record('download', time.perf_counter() - start_time)
         except requests.exceptions.RequestException as e:
-            logger.error(f"下载图片失败: {str(e)}")
+            self._log(logging.ERROR, 'download_failed', "下载图片失败: %s", e)
             raise
 
 def main():
     # 配置参数
     INPUT_DIR = "input_images"
     OUTPUT_DIR = "output_images"
+    WORKERS = 4  # 并发处理的图片数
+    OVERWRITE = False  # 是否重新处理已有输出的图片
+    IMAGE_BASE_URL = None  # 输入目录托管的访问地址，设置后按URL提交（接口文档支持的方式）
+    UPLOAD_MODE = 'base64'  # 未设置 IMAGE_BASE_URL 时直接上传本地文件：'base64' 或 'multipart'（实验性）
+    MAX_UPLOAD_SIDE = 2048  # 直接上传前图片长边的上限（像素），None表示按原图上传
 
     try:
         # 创建处理器实例
-        remover = FreepikBackgroundRemover()
+        remover = FreepikBackgroundRemover(upload_mode=UPLOAD_MODE, max_upload_side=MAX_UPLOAD_SIDE)
 
         # 处理图片
-        remover.process_directory(INPUT_DIR, OUTPUT_DIR)
+        remover.process_directory(INPUT_DIR, OUTPUT_DIR, workers=WORKERS, overwrite=OVERWRITE,
+                                  image_base_url=IMAGE_BASE_URL)
     except ValueError as e:
-        logger.error(f"配置错误: {str(e)}")
+        logger.error("配置错误: %s", e)
         return
     except Exception as e:
-        logger.error(f"程序执行出错: {str(e)}")
+        logger.error("程序执行出错: %s", e)
         return
 
 if __name__ == "__main__":
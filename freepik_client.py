@@ -0,0 +1,416 @@
+"""
+Freepik API 客户端公共部分：共享的HTTP连接池与流式下载
+
+- 同一组参数（连接池大小、重试次数）共享一个 requests.Session，保持长连接，避免每次请求都重新建立TCP+TLS连接
+- 连接失败以及GET请求的5xx响应按指数退避自动重试；POST请求只在连接失败（请求未发出）时重试，避免重复创建任务
+- 下载时分块写入同目录下的临时文件，完成后原子重命名，中断时不会留下不完整的图片
+- 所有API请求共用一个令牌桶限速器：按配置的速率和突发量发放请求，遇到429/Retry-After或配额耗尽时
+  暂停并降低速率，之后随成功请求逐步恢复
+- 结构化日志：log_event 输出单行JSON事件，日志级别未启用时不做任何格式化；PhaseMetrics 统计各阶段耗时分布
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_sessions: Dict[Tuple, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_rate_limiters: Dict[str, 'RateLimiter'] = {}
+
+logger = logging.getLogger('freepik')
+
+# 耗时直方图的默认分桶上界（秒）
+HISTOGRAM_BOUNDS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+class _JsonEvent:
+    """日志消息对象，只有在真正输出时才序列化为JSON"""
+
+    __slots__ = ('event', 'fields')
+
+    def __init__(self, event: str, fields: Dict):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        return json.dumps({'event': self.event, **self.fields}, ensure_ascii=False, default=str)
+
+
+def log_event(level: int, event: str, **fields):
+    """输出一条单行JSON事件到 'freepik' 日志，级别未启用时直接返回"""
+    if logger.isEnabledFor(level):
+        logger.log(level, '%s', _JsonEvent(event, fields))
+
+
+def configure_json_logging(level=logging.INFO, stream=None):
+    """
+    为 'freepik' 日志配置单行输出：每行为时间戳、级别和JSON事件
+
+    Args:
+        level: 日志级别，如 logging.INFO、logging.DEBUG 或 'WARNING'
+        stream: 输出流，默认为 stderr
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+class PhaseMetrics:
+    """
+    按阶段（如 submit、queue_wait、generation、download）记录耗时，汇总为分位数和直方图，线程安全
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = {}
+
+    def record(self, phase: str, seconds: float):
+        with self.lock:
+            self.durations.setdefault(phase, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各阶段的次数、平均值、p50、p95和最大值（秒）"""
+        with self.lock:
+            durations = {phase: sorted(values) for phase, values in self.durations.items()}
+        result = {}
+        for phase, values in durations.items():
+            n = len(values)
+            result[phase] = {
+                'count': n,
+                'mean': sum(values) / n,
+                'p50': values[n // 2],
+                'p95': values[min(n - 1, int(n * 0.95))],
+                'max': values[-1],
+            }
+        return result
+
+    def histogram(self, phase: str, bounds: Sequence[float] = HISTOGRAM_BOUNDS) -> List[Tuple[str, int]]:
+        """某个阶段的耗时直方图，返回 [(区间, 次数)]，最后一个区间为超过最大上界的部分"""
+        with self.lock:
+            values = list(self.durations.get(phase, []))
+        counts = [0] * (len(bounds) + 1)
+        for value in values:
+            counts[next((i for i, bound in enumerate(bounds) if value <= bound), len(bounds))] += 1
+        labels = [f"<={bound}s" for bound in bounds] + [f">{bounds[-1]}s"]
+        return list(zip(labels, counts))
+
+    def format_report(self) -> str:
+        """多行文本报告：每个阶段一行统计，加上非空的直方图区间"""
+        lines = []
+        for phase, stats in self.summary().items():
+            buckets = ' '.join(f"{label}:{count}" for label, count in self.histogram(phase) if count)
+            lines.append(f"  {phase:<10} 次数 {stats['count']:>5}  平均 {stats['mean']:.2f}s  "
+                         f"p50 {stats['p50']:.2f}s  p95 {stats['p95']:.2f}s  最大 {stats['max']:.2f}s  [{buckets}]")
+        return '\n'.join(lines)
+
+
+def create_session(pool_size: int = 32, max_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    创建带连接池和重试策略的 Session
+
+    Args:
+        pool_size: 每个主机保持的连接数，应不小于并发请求的线程数
+        max_retries: 最大重试次数
+        backoff_factor: 重试的指数退避系数（秒）
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_shared_session(pool_size: int = 32, max_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """获取共享的 Session，相同参数只创建一次"""
+    key = (pool_size, max_retries, backoff_factor)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = create_session(pool_size, max_retries, backoff_factor)
+        return session
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头，支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器
+
+    - 令牌按 rate 个/秒生成，最多积累 burst 个，每个请求消耗一个
+    - 收到429时速率乘以 backoff（不低于 min_rate），并暂停到 Retry-After 指定的时间
+    - 响应头显示配额耗尽（RateLimit-Remaining 为0）时暂停到 RateLimit-Reset 指定的时间
+    - 每个成功的请求使速率恢复 max_rate * recovery，直到回到配置的速率
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 10, min_rate: float = 0.5, backoff: float = 0.5,
+                 recovery: float = 0.05):
+        """
+        Args:
+            rate: 每秒请求数
+            burst: 突发请求数上限
+            min_rate: 限流后速率的下限
+            backoff: 每次收到429时速率的缩放比例
+            recovery: 每个成功请求恢复的速率（占配置速率的比例）
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.backoff = backoff
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.quota_pauses = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        # 暂停期间 updated 位于未来，暂停结束后才开始积累令牌
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self) -> float:
+        """阻塞直到获得一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    self.acquired += 1
+                    self.waited += waited
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def update(self, response: requests.Response):
+        """根据响应的状态码和限流相关响应头调整速率"""
+        headers = response.headers
+        with self.lock:
+            now = time.monotonic()
+            if response.status_code == 429:
+                self.throttled += 1
+                # 同一次暂停期间并发请求收到的多个429只降速一次
+                if now >= self.paused_until:
+                    self.rate = max(self.min_rate, self.rate * self.backoff)
+                retry_after = parse_retry_after(headers.get('Retry-After'))
+                pause = retry_after if retry_after is not None else 1 / self.rate
+                self.paused_until = max(self.paused_until, now + pause)
+                self.tokens = 0.0
+                self.updated = self.paused_until
+                return
+
+            if response.ok:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+            remaining = headers.get('RateLimit-Remaining') or headers.get('X-RateLimit-Remaining')
+            reset = headers.get('RateLimit-Reset') or headers.get('X-RateLimit-Reset')
+            if remaining == '0' and reset:
+                try:
+                    reset = float(reset)
+                except ValueError:
+                    return
+                # 大于一年的值视为Unix时间戳，否则为剩余秒数
+                pause = reset - time.time() if reset > 365 * 86400 else reset
+                if pause > 0:
+                    self.quota_pauses += 1
+                    self.paused_until = max(self.paused_until, now + pause)
+                    self.tokens = 0.0
+                    self.updated = self.paused_until
+
+    def stats(self) -> Dict[str, float]:
+        """限速统计：当前速率、已发放请求数、收到的429次数、因配额耗尽暂停的次数、累计等待时间"""
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'max_rate': self.max_rate,
+                'acquired': self.acquired,
+                'throttled': self.throttled,
+                'quota_pauses': self.quota_pauses,
+                'waited_seconds': self.waited,
+            }
+
+
+def get_shared_rate_limiter(name: str = 'freepik', rate: float = 10.0, burst: int = 10) -> RateLimiter:
+    """获取按名称共享的限速器，同名限速器只在第一次获取时按参数创建"""
+    with _sessions_lock:
+        limiter = _rate_limiters.get(name)
+        if limiter is None:
+            limiter = _rate_limiters[name] = RateLimiter(rate, burst)
+        return limiter
+
+
+def send_request(session: requests.Session, method: str, url: str, rate_limiter: Optional[RateLimiter] = None,
+                 max_throttle_retries: int = 5, **kwargs) -> requests.Response:
+    """
+    经限速器发送请求，收到429时在限速器的暂停结束后重试
+
+    Args:
+        session: 使用的 Session
+        method: 请求方法
+        url: 请求地址
+        rate_limiter: 限速器，为None时不限速，收到429时按 Retry-After 等待
+        max_throttle_retries: 收到429后的最大重试次数，用完后返回最后一次的429响应
+        **kwargs: 传给 session.request 的其他参数
+    """
+    for attempt in range(max_throttle_retries + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+        response = session.request(method, url, **kwargs)
+        if rate_limiter:
+            rate_limiter.update(response)
+        if response.status_code != 429 or attempt == max_throttle_retries:
+            return response
+        if not rate_limiter:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            time.sleep(retry_after if retry_after is not None else 1)
+        response.close()
+    return response
+
+
+def extension_for_content_type(content_type: str, default: str = '.jpg') -> str:
+    """根据 content-type 确定图片扩展名"""
+    if 'png' in content_type:
+        return '.png'
+    if 'webp' in content_type:
+        return '.webp'
+    if 'jpeg' in content_type or 'jpg' in content_type:
+        return '.jpg'
+    return default
+
+
+def download_file(session: requests.Session, url: str, output_path: Path, timeout: float = 30,
+                  chunk_size: int = 64 * 1024) -> Path:
+    """
+    流式下载文件：分块写入同目录下的临时文件，完成后原子重命名为目标文件
+
+    Args:
+        session: 使用的 Session
+        url: 下载地址
+        output_path: 目标路径，没有扩展名时根据响应的 content-type 补充
+        timeout: 超时时间（秒）
+        chunk_size: 每次写入的块大小（字节）
+
+    Returns:
+        最终的文件路径
+    """
+    output_path = Path(output_path)
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if not output_path.suffix:
+            output_path = output_path.with_name(
+                output_path.name + extension_for_content_type(response.headers.get('content-type', '')))
+
+        fd, temp_name = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+            os.replace(temp_name, output_path)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+    return output_path
+
+
+class _StaticImageHandler(BaseHTTPRequestHandler):
+    """返回固定图片内容的本地HTTP服务，支持长连接"""
+
+    protocol_version = 'HTTP/1.1'
+    image_bytes = b''
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(self.image_bytes)))
+        self.end_headers()
+        self.wfile.write(self.image_bytes)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def benchmark_downloads(count: int = 200, size_kb: int = 512, output_dir: str = "benchmark_downloads"):
+    """
+    基准测试：在本地HTTP服务上对比每次新建连接并整体读入内存的下载方式，与共享连接池的流式下载
+
+    本地服务没有TLS握手，真实API上连接复用的收益会更明显
+    """
+    handler = type('StaticImageHandler', (_StaticImageHandler,), {'image_bytes': os.urandom(size_kb * 1024)})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/image.png"
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    print(f"基准测试: {count} 次下载, 每张 {size_kb} KB")
+
+    try:
+        start = time.perf_counter()
+        for i in range(count):
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            (output_path / f"before_{i}.png").write_bytes(response.content)
+        before = (time.perf_counter() - start) / count
+
+        session = create_session()
+        start = time.perf_counter()
+        for i in range(count):
+            download_file(session, url, output_path / f"after_{i}")
+        after = (time.perf_counter() - start) / count
+
+        print(f"  每次新建连接: {before * 1000:.2f} 毫秒/张")
+        print(f"  连接池+流式: {after * 1000:.2f} 毫秒/张")
+        print(f"  加速比: {before / after:.2f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    benchmark_downloads()
@@ -4,10 +4,9 @@
 2. 将提取的文字内容保存到文本文件中，文件名为图片文件名，文件路径为图片文件所在目录；
 """
 import base64
-import os
 from pathlib import Path
-# 通过 pip install volcengine-python-sdk[ark] 安装方舟SDK
-from volcenginesdkarkruntime import Ark
+
+from ark_client import DEFAULT_API_HOST, get_ark_client
 
 
 def encode_image(image_path: str) -> str:
@@ -24,19 +23,18 @@ def encode_image(image_path: str) -> str:
         raise IOError(f"读取图片文件失败: {e}")
 
 
-def get_completion_from_messages(image_path, endpoint_id, prompt):
+def get_completion_from_messages(image_path, endpoint_id, prompt, api_host=DEFAULT_API_HOST):
     """
     调用大模型API处理图片
 
     Args:
         image_path (str): 图片路径
         endpoint_id (str): 模型端点ID
+        prompt (str): 提示词
         api_host (str): API主机地址
     """
-    # 初始化Client对象
-    client = Ark(
-        api_key=os.environ.get("ARK_API_KEY"),
-    )
+    # 获取共享的Client对象
+    client = get_ark_client(api_host)
 
     # 获取图片格式
     image_path = Path(image_path)
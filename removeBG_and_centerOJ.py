@@ -2,14 +2,29 @@
 将指定目录或指定的图像文件，去除背景后识别主体并使其居中，保存为背景透明的png文件
 """
 
+import hashlib
 import io
+import json
+import math
+import multiprocessing
+import os
 import sys
+import time
+import shutil
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import redirect_stdout
 from pathlib import Path
 from PIL import Image, ImageChops
 import numpy as np
 
 try:
+    import onnxruntime as ort
     from rembg import remove
+    from rembg.bg import fix_image_orientation, naive_cutout
+    from rembg.sessions import sessions_class
 except ImportError as e:
     print("rembg库导入失败，可能的解决方案：")
     print("1. 安装Visual C++ Redistributable: https://aka.ms/vs/17/release/vc_redist.x64.exe")
@@ -19,23 +34,191 @@ except ImportError as e:
     sys.exit(1)
 
 
-def find_object_bounds(image):
+# 支持批量推理的模型及其预处理参数: (mean, std, 模型输入尺寸)，与 rembg 中各模型的 predict 保持一致
+_BATCH_MODEL_PARAMS = {
+    'u2net': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2netp': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2net_human_seg': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'silueta': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'isnet-general-use': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+    'isnet-anime': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+}
+
+
+class BackgroundRemovalEngine:
+    """
+    复用 rembg 会话的AI背景去除引擎，ONNX模型只在创建时加载一次
+    """
+
+    def __init__(self, model_name='u2net', num_threads=None):
+        """
+        Args:
+            model_name: rembg 模型名称，如 'u2net', 'u2netp', 'isnet-general-use'
+            num_threads: ONNX Runtime 线程数，None 表示使用 onnxruntime 默认值
+        """
+        self.model_name = model_name
+        self.num_threads = num_threads
+
+        session_class = next((sc for sc in sessions_class if sc.name() == model_name), None)
+        if session_class is None:
+            available = ", ".join(sc.name() for sc in sessions_class)
+            raise ValueError(f"不支持的模型: {model_name}，可选模型: {available}")
+
+        sess_opts = ort.SessionOptions()
+        if num_threads:
+            sess_opts.intra_op_num_threads = num_threads
+            sess_opts.inter_op_num_threads = num_threads
+        self.session = session_class(model_name, sess_opts)
+
+    def remove(self, image):
+        """
+        去除背景
+        Args:
+            image: PIL图像对象或numpy数组 (H, W, 3/4)
+        Returns:
+            去除背景后的RGBA图像（PIL图像对象）
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        return remove(image, session=self.session)
+
+    def supports_batch(self):
+        """当前模型是否支持批量推理：预处理参数已知，且ONNX模型输入的batch维度是动态的"""
+        if self.model_name not in _BATCH_MODEL_PARAMS:
+            return False
+        batch_dim = self.session.inner_session.get_inputs()[0].shape[0]
+        return not isinstance(batch_dim, int)
+
+    def remove_batch(self, images, batch_size=8):
+        """
+        批量去除背景：预处理后按张量尺寸分组，每 batch_size 张图像执行一次推理，再把遮罩分配回对应图像
+        预处理参数未知的模型，以及ONNX输入batch维度固定的模型（见 supports_batch）不支持批量推理，
+        此时忽略 batch_size，逐张调用 remove，每次推理只处理一张图像
+        Args:
+            images: PIL图像对象或numpy数组的列表
+            batch_size: 每次推理的图像数量
+        Returns:
+            与输入顺序一致的RGBA图像列表
+        """
+        images = [Image.fromarray(image) if isinstance(image, np.ndarray) else image for image in images]
+        if batch_size <= 1 or not self.supports_batch():
+            return [self.remove(image) for image in images]
+
+        mean, std, size = _BATCH_MODEL_PARAMS[self.model_name]
+        input_name = self.session.inner_session.get_inputs()[0].name
+        images = [fix_image_orientation(image) for image in images]
+        tensors = [self.session.normalize(image, mean, std, size)[input_name] for image in images]
+
+        # 按预处理后的张量尺寸分组
+        groups = {}
+        for index, tensor in enumerate(tensors):
+            groups.setdefault(tensor.shape, []).append(index)
+
+        results = [None] * len(images)
+        for indices in groups.values():
+            for start in range(0, len(indices), batch_size):
+                chunk = indices[start:start + batch_size]
+                batch = np.concatenate([tensors[i] for i in chunk], axis=0)
+                preds = self.session.inner_session.run(None, {input_name: batch})[0][:, 0, :, :]
+                for i, pred in zip(chunk, preds):
+                    results[i] = naive_cutout(images[i], _prediction_to_mask(pred, images[i].size))
+        return results
+
+
+def _prediction_to_mask(pred, size):
+    """将单张图像的模型输出归一化为遮罩并缩放回原图尺寸"""
+    ma = np.max(pred)
+    mi = np.min(pred)
+    pred = (pred - mi) / (ma - mi)
+    mask = Image.fromarray((pred * 255).astype(np.uint8))
+    return mask.resize(size, Image.Resampling.LANCZOS)
+
+
+# 每个进程内按 (模型名称, 线程数) 缓存的引擎
+_engines = {}
+
+
+def get_background_removal_engine(model_name='u2net', num_threads=None):
+    """获取当前进程的背景去除引擎，首次调用时加载模型，之后复用"""
+    key = (model_name, num_threads)
+    if key not in _engines:
+        _engines[key] = BackgroundRemovalEngine(model_name, num_threads)
+    return _engines[key]
+
+
+def find_object_bounds(image, threshold=0):
     """
     找到图像中非透明区域的边界
+    Args:
+        image: PIL图像对象
+        threshold: alpha值大于该阈值的像素才视为对象，可用于忽略近乎透明的边缘像素
     返回: (left, top, right, bottom)
     """
+    if image.mode in ('RGB', 'L'):
+        # 没有alpha通道，整幅图像都是不透明的
+        return 0, 0, image.width, image.height
     if image.mode != 'RGBA':
         image = image.convert('RGBA')
-    alpha = image.split()[-1]
-    alpha_array = np.array(alpha)
+
+    if threshold <= 0:
+        # Pillow 对RGBA图像的 getbbox 只看alpha通道，不额外分配内存
+        bbox = image.getbbox()
+    else:
+        # alpha通道和二值化结果各占 宽×高 字节，不生成 numpy 数组和坐标数组
+        lut = [255 if v > threshold else 0 for v in range(256)]
+        bbox = image.getchannel('A').point(lut).getbbox()
+
+    if bbox is None:
+        return 0, 0, image.width, image.height
+    return bbox
+
+
+def _legacy_find_object_bounds(image):
+    """原 np.where 实现，仅用于基准测试对比"""
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    alpha_array = np.array(image.split()[-1])
     non_transparent = np.where(alpha_array > 0)
     if len(non_transparent[0]) == 0:
         return 0, 0, image.width, image.height
-    top = non_transparent[0].min()
-    bottom = non_transparent[0].max() + 1
-    left = non_transparent[1].min()
-    right = non_transparent[1].max() + 1
-    return left, top, right, bottom
+    return (non_transparent[1].min(), non_transparent[0].min(),
+            non_transparent[1].max() + 1, non_transparent[0].max() + 1)
+
+
+def benchmark_find_object_bounds(megapixels=(1, 12, 48), opaque_ratio=0.9, repeat=3):
+    """
+    基准测试：在大面积不透明的图像上比较新旧 find_object_bounds 的耗时与峰值内存
+    Args:
+        megapixels: 测试图像的像素数（百万像素），按4:3比例生成
+        opaque_ratio: 不透明区域占图像宽高的比例
+        repeat: 每种尺寸重复次数，取最短耗时
+    """
+    import tracemalloc
+
+    for mp in megapixels:
+        height = int((mp * 1_000_000 * 3 / 4) ** 0.5)
+        width = int(mp * 1_000_000 / height)
+        image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        margin_x = int(width * (1 - opaque_ratio) / 2)
+        margin_y = int(height * (1 - opaque_ratio) / 2)
+        image.paste((200, 100, 50, 255), (margin_x, margin_y, width - margin_x, height - margin_y))
+
+        print(f"{mp}MP ({width}x{height}):")
+        results = {}
+        for name, func in (("旧实现", _legacy_find_object_bounds), ("新实现", find_object_bounds),
+                           ("新实现(threshold=10)", lambda img: find_object_bounds(img, threshold=10))):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(image)
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            results[name] = tuple(int(v) for v in func(image))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {name}: 耗时 {best * 1000:.1f}ms, 峰值内存 {peak / 1024 / 1024:.1f}MB, 边界 {results[name]}")
+        del image
 
 
 def center_object(image, target_size=None, fit_mode='contain', padding_ratio=0.1):
@@ -56,53 +239,23 @@ def center_object(image, target_size=None, fit_mode='contain', padding_ratio=0.1
 
     print(f"  对象尺寸: {obj_width}x{obj_height}")
 
+    (canvas_width, canvas_height), new_size, crop_box, scale = _center_layout(
+        image.size, (obj_width, obj_height), target_size, fit_mode, padding_ratio)
     if target_size is None:
         # 使用原图片尺寸
-        canvas_width = image.width
-        canvas_height = image.height
         final_obj = cropped
         print(f"  使用原图尺寸: {canvas_width}x{canvas_height}")
     else:
-        canvas_width, canvas_height = target_size
         print(f"  目标画布尺寸: {canvas_width}x{canvas_height}")
+        final_obj = cropped.resize(new_size, Image.Resampling.LANCZOS)
 
         if fit_mode == 'contain':
-            # 保持对象完整，可能会有空白区域
-            # 计算可用空间（扣除边距）
-            available_width = canvas_width * (1 - 2 * padding_ratio)
-            available_height = canvas_height * (1 - 2 * padding_ratio)
-
-            # 计算缩放比例，保持宽高比
-            scale_w = available_width / obj_width if obj_width > 0 else 1
-            scale_h = available_height / obj_height if obj_height > 0 else 1
-            scale = min(scale_w, scale_h, 1.0)  # 不放大，只缩小
-
-            new_width = max(1, int(obj_width * scale))
-            new_height = max(1, int(obj_height * scale))
-            final_obj = cropped.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            print(f"  缩放后尺寸: {new_width}x{new_height}, 缩放比例: {scale:.2f}")
-
+            print(f"  缩放后尺寸: {new_size[0]}x{new_size[1]}, 缩放比例: {scale:.2f}")
         elif fit_mode == 'cover':
-            # 填满画布，可能会裁剪对象
-            scale_w = canvas_width / obj_width if obj_width > 0 else 1
-            scale_h = canvas_height / obj_height if obj_height > 0 else 1
-            scale = max(scale_w, scale_h)
-
-            new_width = max(1, int(obj_width * scale))
-            new_height = max(1, int(obj_height * scale))
-            resized = cropped.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
             # 裁剪到画布大小
-            left_crop = max(0, (new_width - canvas_width) // 2)
-            top_crop = max(0, (new_height - canvas_height) // 2)
-            right_crop = min(new_width, left_crop + canvas_width)
-            bottom_crop = min(new_height, top_crop + canvas_height)
-
-            final_obj = resized.crop((left_crop, top_crop, right_crop, bottom_crop))
-            print(f"  缩放后尺寸: {new_width}x{new_height}, 裁剪后: {final_obj.width}x{final_obj.height}")
+            final_obj = final_obj.crop(crop_box)
+            print(f"  缩放后尺寸: {new_size[0]}x{new_size[1]}, 裁剪后: {final_obj.width}x{final_obj.height}")
         else:  # exact
-            # 强制拉伸到目标尺寸
-            final_obj = cropped.resize((canvas_width, canvas_height), Image.Resampling.LANCZOS)
             print(f"  强制拉伸到: {canvas_width}x{canvas_height}")
 
     # 创建透明画布
@@ -120,6 +273,47 @@ def center_object(image, target_size=None, fit_mode='contain', padding_ratio=0.1
     return centered_image
 
 
+def _center_layout(image_size, obj_size, target_size=None, fit_mode='contain', padding_ratio=0.1):
+    """
+    center_object 的尺寸计算
+    Returns:
+        (画布尺寸, 对象缩放后的尺寸, 缩放后对象上保留的区域 (left, top, right, bottom), 缩放比例)
+    """
+    obj_width, obj_height = obj_size
+    if target_size is None:
+        return tuple(image_size), (obj_width, obj_height), (0, 0, obj_width, obj_height), 1.0
+
+    canvas_width, canvas_height = target_size
+    if fit_mode == 'contain':
+        # 保持对象完整，可能会有空白区域
+        # 计算可用空间（扣除边距）
+        available_width = canvas_width * (1 - 2 * padding_ratio)
+        available_height = canvas_height * (1 - 2 * padding_ratio)
+
+        # 计算缩放比例，保持宽高比
+        scale_w = available_width / obj_width if obj_width > 0 else 1
+        scale_h = available_height / obj_height if obj_height > 0 else 1
+        scale = min(scale_w, scale_h, 1.0)  # 不放大，只缩小
+    elif fit_mode == 'cover':
+        # 填满画布，可能会裁剪对象
+        scale_w = canvas_width / obj_width if obj_width > 0 else 1
+        scale_h = canvas_height / obj_height if obj_height > 0 else 1
+        scale = max(scale_w, scale_h)
+    else:  # exact
+        # 强制拉伸到目标尺寸
+        return (canvas_width, canvas_height), (canvas_width, canvas_height), (0, 0, canvas_width, canvas_height), None
+
+    new_width = max(1, int(obj_width * scale))
+    new_height = max(1, int(obj_height * scale))
+    crop_box = (0, 0, new_width, new_height)
+    if fit_mode == 'cover':
+        left_crop = max(0, (new_width - canvas_width) // 2)
+        top_crop = max(0, (new_height - canvas_height) // 2)
+        crop_box = (left_crop, top_crop, min(new_width, left_crop + canvas_width),
+                    min(new_height, top_crop + canvas_height))
+    return (canvas_width, canvas_height), (new_width, new_height), crop_box, scale
+
+
 def remove_background_by_color(image, target_color=(0, 0, 0), tolerance=30, edge_smooth=True):
     """
     基于颜色容限去除背景
@@ -134,93 +328,562 @@ def remove_background_by_color(image, target_color=(0, 0, 0), tolerance=30, edge
     if image.mode != 'RGB':
         image = image.convert('RGB')
 
-    # 转换为numpy数组处理
-    img_array = np.array(image)
-    height, width, channels = img_array.shape
+    # 预分配RGBA输出，RGB通道直接写入，alpha通道由距离计算得到
+    width, height = image.size
+    rgba_array = np.empty((height, width, 4), dtype=np.uint8)
+    rgba_array[:, :, :3] = np.asarray(image)
+    _compute_color_alpha(rgba_array[:, :, :3], target_color, tolerance, edge_smooth, out=rgba_array[:, :, 3])
 
-    # 计算每个像素与目标颜色的欧几里得距离
-    target_color = np.array(target_color)
-    diff = img_array - target_color
-    distances = np.sqrt(np.sum(diff ** 2, axis=2))
+    return Image.fromarray(rgba_array, 'RGBA')
 
-    # 创建alpha通道
-    alpha = np.ones((height, width), dtype=np.uint8) * 255
+
+def _compute_color_alpha(rgb_array, target_color, tolerance, edge_smooth, out):
+    """
+    根据像素与目标颜色的欧几里得距离计算alpha通道，结果写入 out (uint8)
+    逐通道累加int32平方距离，仅保留少量与图像同尺寸的临时数组
+    """
+    # 计算每个像素与目标颜色的距离平方
+    dist_sq = np.zeros(rgb_array.shape[:2], dtype=np.int32)
+    channel_diff = np.empty_like(dist_sq)
+    for c in range(3):
+        np.subtract(rgb_array[:, :, c], int(target_color[c]), out=channel_diff, dtype=np.int32)
+        np.multiply(channel_diff, channel_diff, out=channel_diff)
+        dist_sq += channel_diff
+    del channel_diff
 
     if edge_smooth and tolerance > 0:
-        # 平滑边缘：在容限范围内使用渐变透明度
-        smooth_zone = tolerance * 0.3  # 平滑区域为容限的30%
+        # 平滑边缘：在容限范围内使用渐变透明度，平滑区域为容限的30%
+        # alpha = clip((距离 - (容限 - 平滑区)) / (2 * 平滑区) * 255, 0, 255)，一次计算覆盖透明、渐变和不透明区域
+        smooth_zone = tolerance * 0.3
+        distances = dist_sq.astype(np.float32)
+        del dist_sq
+        np.sqrt(distances, out=distances)
+        distances -= np.float32(tolerance - smooth_zone)
+        distances *= np.float32(255 / (2 * smooth_zone))
+        np.clip(distances, 0, 255, out=distances)
+        np.copyto(out, distances, casting='unsafe')
+    else:
+        # 简单的阈值处理，直接比较距离平方，无需开方；结果直接写入 out，不生成整图的临时数组
+        np.greater(dist_sq, tolerance * tolerance, out=out, casting='unsafe')
+        out *= 255
+    return out
 
-        # 完全透明区域
-        alpha[distances <= tolerance - smooth_zone] = 0
 
-        # 渐变区域
+def _legacy_remove_background_by_color(image, target_color=(0, 0, 0), tolerance=30, edge_smooth=True):
+    """原 float64 多临时数组实现，仅用于基准测试对比"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    img_array = np.array(image)
+    height, width, channels = img_array.shape
+    diff = img_array - np.array(target_color)
+    distances = np.sqrt(np.sum(diff ** 2, axis=2))
+    alpha = np.ones((height, width), dtype=np.uint8) * 255
+    if edge_smooth and tolerance > 0:
+        smooth_zone = tolerance * 0.3
+        alpha[distances <= tolerance - smooth_zone] = 0
         gradient_mask = (distances > tolerance - smooth_zone) & (distances <= tolerance + smooth_zone)
         if np.any(gradient_mask):
-            gradient_distances = distances[gradient_mask]
-            # 计算渐变透明度
-            gradient_alpha = ((gradient_distances - (tolerance - smooth_zone)) / (2 * smooth_zone)) * 255
-            gradient_alpha = np.clip(gradient_alpha, 0, 255).astype(np.uint8)
-            alpha[gradient_mask] = gradient_alpha
+            gradient_alpha = ((distances[gradient_mask] - (tolerance - smooth_zone)) / (2 * smooth_zone)) * 255
+            alpha[gradient_mask] = np.clip(gradient_alpha, 0, 255).astype(np.uint8)
     else:
-        # 简单的阈值处理
         alpha[distances <= tolerance] = 0
-
-    # 创建RGBA图像
     rgba_array = np.zeros((height, width, 4), dtype=np.uint8)
     rgba_array[:, :, :3] = img_array
     rgba_array[:, :, 3] = alpha
-
     return Image.fromarray(rgba_array, 'RGBA')
 
 
+def benchmark_remove_background_by_color(megapixels=(1, 12, 48), tolerance=50, repeat=3):
+    """
+    微基准测试：比较新旧 remove_background_by_color 在不同图像尺寸下的耗时与峰值内存
+    Args:
+        megapixels: 测试图像的像素数（百万像素），按4:3比例生成
+        tolerance: 颜色容限
+        repeat: 每种尺寸重复次数，取最短耗时
+    """
+    import tracemalloc
+
+    rng = np.random.default_rng(0)
+    for mp in megapixels:
+        height = int((mp * 1_000_000 * 3 / 4) ** 0.5)
+        width = int(mp * 1_000_000 / height)
+        img_array = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        image = Image.fromarray(img_array)
+        del img_array
+
+        print(f"{mp}MP ({width}x{height}):")
+        outputs = {}
+        for name, func in (("旧实现", _legacy_remove_background_by_color), ("新实现", remove_background_by_color)):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = func(image, (0, 0, 0), tolerance, True)
+                best = min(best, time.perf_counter() - start)
+                del result
+
+            tracemalloc.start()
+            outputs[name] = np.asarray(func(image, (0, 0, 0), tolerance, True))[:, :, 3].copy()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {name}: 耗时 {best * 1000:.1f}ms, 峰值内存 {peak / 1024 / 1024:.1f}MB")
+
+        max_diff = np.abs(outputs["旧实现"].astype(np.int16) - outputs["新实现"]).max()
+        print(f"  alpha最大差异: {max_diff}")
+        del outputs, image
+
+
+def remove_background_by_color_tiled(input_path, output_path, target_color=(0, 0, 0), tolerance=30, edge_smooth=True,
+                                    strip_height=512):
+    """
+    按水平条带流式去除背景，适用于超大图像（如20000x20000的扫描件）
+    逐条带计算alpha、累计对象边界并写出RGBA的PNG，不生成整幅图像的numpy数组
+    未压缩的单块 TIFF/BMP/PPM 直接按条带读取文件，内存只与条带大小相关；
+    PNG/JPEG、压缩或分块存储的 TIFF 等格式无法按行读取，会打印提示并由Pillow整体解码一次后再按条带处理，
+    此时峰值内存仍随图像尺寸增长
+    Args:
+        input_path: 输入图像路径
+        output_path: 输出PNG路径
+        target_color: 目标背景颜色 (R, G, B)
+        tolerance: 颜色容限 (0-255)
+        edge_smooth: 是否对边缘进行平滑处理
+        strip_height: 每个条带的行数
+    Returns:
+        对象边界 (left, top, right, bottom)，与 find_object_bounds 结果一致
+    """
+    with Image.open(input_path) as image:
+        width, height = image.size
+        left, top, right, bottom = width, height, 0, 0
+        with _PngStreamWriter(output_path, width, height) as writer:
+            for strip_top, rgba_array in _iter_color_removed_strips(image, target_color, tolerance, edge_smooth,
+                                                                    strip_height):
+                # 累计非透明区域的边界
+                alpha = rgba_array[:, :, 3]
+                rows = np.flatnonzero(alpha.any(axis=1))
+                if rows.size:
+                    cols = np.flatnonzero(alpha.any(axis=0))
+                    top = min(top, strip_top + rows[0])
+                    bottom = max(bottom, strip_top + rows[-1] + 1)
+                    left = min(left, cols[0])
+                    right = max(right, cols[-1] + 1)
+
+                writer.write_rows(rgba_array)
+
+    if right == 0:
+        return 0, 0, width, height
+    return int(left), int(top), int(right), int(bottom)
+
+
+def remove_background_by_color_tiled_and_center(input_path, output_path, target_color=(0, 0, 0), tolerance=30,
+                                                edge_smooth=True, target_size=None, fit_mode='contain',
+                                                padding_ratio=0.1, strip_height=512):
+    """
+    超大图像的颜色去除 + 居中，结果与 remove_background_by_color + center_object 逐像素相同
+    第一遍按条带计算对象边界；第二遍按条带读取对象所在的行，逐段缩放后贴到画布条带上，用 _PngStreamWriter 逐行写出，
+    不生成整幅图像、对象区域或画布的数组
+    可按条带读取的格式（见 remove_background_by_color_tiled）峰值内存只随图像宽度和条带行数增长：
+    处理 8000x8000 的BMP时进程RSS增加约 150MB，整图处理约 1GB
+    Args:
+        strip_height: 每个条带的行数，其余参数同 remove_background_by_color_tiled 与 center_object
+    """
+    with Image.open(input_path) as image:
+        width, height = image.size
+        left, top, right, bottom = width, height, 0, 0
+        for strip_top, rgba_array in _iter_color_removed_strips(image, target_color, tolerance, edge_smooth,
+                                                                strip_height):
+            alpha = rgba_array[:, :, 3]
+            rows = np.flatnonzero(alpha.any(axis=1))
+            if rows.size:
+                cols = np.flatnonzero(alpha.any(axis=0))
+                top = min(top, strip_top + rows[0])
+                bottom = max(bottom, strip_top + rows[-1] + 1)
+                left = min(left, cols[0])
+                right = max(right, cols[-1] + 1)
+        if right == 0:
+            left, top, right, bottom = 0, 0, width, height
+    left, top, right, bottom = int(left), int(top), int(right), int(bottom)
+
+    (canvas_width, canvas_height), new_size, crop_box, _ = _center_layout(
+        (width, height), (right - left, bottom - top), target_size, fit_mode, padding_ratio)
+    final_width, final_height = crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]
+    paste_x = (canvas_width - final_width) // 2
+    paste_y = (canvas_height - final_height) // 2
+
+    def write_blank_rows(writer, count):
+        for start in range(0, count, strip_height):
+            writer.write_rows(np.zeros((min(strip_height, count - start), canvas_width, 4), dtype=np.uint8))
+
+    # 第二遍：对象行只在缩放需要时读取，已用过的行随即丢弃
+    with Image.open(input_path) as image, _PngStreamWriter(output_path, canvas_width, canvas_height) as writer:
+        strips = _iter_color_removed_strips(image, target_color, tolerance, edge_smooth, strip_height, stop_row=bottom)
+        # 已读取的对象行（相对对象顶部）：rows 为第 start 行到第 next 行
+        window = {'start': 0, 'next': 0, 'rows': np.empty((0, right - left, 4), dtype=np.uint8)}
+
+        def read_object_rows(start, end):
+            """返回对象区域内第 start 到 end 行（相对对象顶部）的RGBA数组"""
+            parts = [window['rows'][max(0, start - window['start']):]]
+            while window['next'] < end:
+                strip_top, rgba_array = next(strips)
+                first = max(top, strip_top)
+                part_start, part_end = first - top, strip_top + rgba_array.shape[0] - top
+                window['next'] = max(window['next'], part_end)
+                if part_end > start:
+                    skip = max(start, part_start) - part_start
+                    parts.append(rgba_array[first - strip_top + skip:, left:right])
+            rows = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            window['start'], window['rows'] = start, rows
+            return rows[:end - start]
+
+        write_blank_rows(writer, paste_y)
+        for obj_rows in _iter_resized_rows(read_object_rows, (right - left, bottom - top), new_size, crop_box,
+                                           strip_height):
+            obj_image = Image.fromarray(np.ascontiguousarray(obj_rows), 'RGBA')
+            # 与 center_object 相同：以对象的alpha为蒙版贴到透明画布上
+            canvas_strip = Image.new('RGBA', (canvas_width, obj_image.height), (0, 0, 0, 0))
+            canvas_strip.paste(obj_image, (paste_x, 0), obj_image)
+            writer.write_rows(np.asarray(canvas_strip))
+        write_blank_rows(writer, canvas_height - paste_y - final_height)
+
+
+def _iter_resized_rows(read_rows, size, new_size, crop_box, strip_height):
+    """
+    分段把 size 大小的RGBA图像用LANCZOS缩放到 new_size，并只保留 crop_box 区域，结果与 Image.resize + crop 相同
+    每段先取出所需的源行，水平方向交给 Pillow 缩放，垂直方向按 Pillow 的定点系数计算（见 _lanczos_coefficients）
+    Args:
+        read_rows: 函数 (起始行, 结束行) -> 源图像这些行的RGBA数组，起始行单调不减
+    Yields:
+        结果中依次相连的若干行，形状为 (行数, 保留区域宽度, 4)
+    """
+    width, height = size
+    new_width, new_height = new_size
+    crop_left, crop_top, crop_right, crop_bottom = crop_box
+    resize_x, resize_y = new_width != width, new_height != height
+    coefficients = _lanczos_coefficients(height, new_height) if resize_y else None
+    # 每段输出行对应的源行数约为 strip_height
+    step = max(1, min(strip_height, strip_height * new_height // height))
+
+    for out_top in range(crop_top, crop_bottom, step):
+        out_bottom = min(crop_bottom, out_top + step)
+        if resize_y:
+            row_coefficients = coefficients[out_top:out_bottom]
+            src_top = row_coefficients[0][0]
+            src_bottom = max(start + len(weights) for start, weights in row_coefficients)
+        else:
+            src_top, src_bottom = out_top, out_bottom
+        rows = read_rows(src_top, src_bottom)
+
+        if resize_x or resize_y:
+            # 与 Image.resize 相同，在预乘alpha的 RGBa 模式下缩放
+            image = Image.fromarray(np.ascontiguousarray(rows), 'RGBA').convert('RGBa')
+            if resize_x:
+                image = image.resize((new_width, image.height), Image.Resampling.LANCZOS)
+            if resize_y:
+                flat = np.asarray(image).reshape(image.height, -1)
+                resized = np.empty((out_bottom - out_top, flat.shape[1]), dtype=np.uint8)
+                for i, (start, weights) in enumerate(row_coefficients):
+                    block = flat[start - src_top:start - src_top + len(weights)].astype(np.int64)
+                    total = weights @ block + (1 << (_PRECISION_BITS - 1))
+                    np.clip(total >> _PRECISION_BITS, 0, 255, out=resized[i], casting='unsafe')
+                image = Image.frombytes('RGBa', (new_width, resized.shape[0]), resized.tobytes())
+            rows = np.asarray(image.convert('RGBA'))
+        yield rows[:, crop_left:crop_right]
+
+
+# Pillow 缩放使用的定点小数位数（libImaging/Resample.c）
+_PRECISION_BITS = 32 - 8 - 2
+
+
+def _lanczos_coefficients(in_size, out_size):
+    """
+    按 Pillow 的 LANCZOS 实现（precompute_coeffs + normalize_coeffs_8bpc）计算一维缩放的定点系数，
+    使分段缩放与整幅 Image.resize 的结果逐像素相同
+    Returns:
+        每个输出位置的 (起始输入下标, int64 系数数组)
+    """
+    def sinc(x):
+        if x == 0.0:
+            return 1.0
+        x = x * math.pi
+        return math.sin(x) / x
+
+    def lanczos(x):
+        if -3.0 <= x < 3.0:
+            return sinc(x) * sinc(x / 3)
+        return 0.0
+
+    filterscale = scale = in_size / out_size
+    if filterscale < 1.0:
+        filterscale = 1.0
+    support = 3.0 * filterscale
+    inv_filterscale = 1.0 / filterscale
+
+    coefficients = []
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        weights = []
+        total = 0.0
+        for x in range(xmax):
+            w = lanczos((x + xmin - center + 0.5) * inv_filterscale)
+            weights.append(w)
+            total += w
+        if total != 0.0:
+            weights = [w / total for w in weights]
+        fixed = [int(-0.5 + w * (1 << _PRECISION_BITS)) if w < 0 else int(0.5 + w * (1 << _PRECISION_BITS))
+                 for w in weights]
+        coefficients.append((xmin, np.array(fixed, dtype=np.int64)))
+    return coefficients
+
+
+def _iter_color_removed_strips(image, target_color, tolerance, edge_smooth, strip_height, stop_row=None):
+    """按条带迭代颜色去除后的RGBA数组，返回 (条带起始行, 形状为 (行数, 宽度, 4) 的数组)"""
+    width = image.width
+    for strip_top, strip in _iter_image_strips(image, strip_height, stop_row):
+        if strip.mode != 'RGB':
+            strip = strip.convert('RGB')
+        rgba_array = np.empty((strip.height, width, 4), dtype=np.uint8)
+        rgba_array[:, :, :3] = np.asarray(strip)
+        _compute_color_alpha(rgba_array[:, :, :3], target_color, tolerance, edge_smooth, out=rgba_array[:, :, 3])
+        yield strip_top, rgba_array
+
+
+def _iter_image_strips(image, strip_height, stop_row=None, start_row=0):
+    """
+    按水平条带迭代图像，返回 (条带起始行, 条带图像)；从 start_row 开始，stop_row 之后的条带不再读取
+    不能按条带读取文件的格式会先打印提示，再整体解码
+    """
+    width, height = image.size
+    stop_row = height if stop_row is None else min(stop_row, height)
+    raw_layout = _get_raw_layout(image)
+    if raw_layout is None:
+        print(f"  提示: {image.format or '该'} 格式（压缩或分块存储）无法按条带读取，将整体解码，内存占用随图像尺寸增长")
+        image.load()
+        for top in range(start_row, stop_row, strip_height):
+            yield top, image.crop((0, top, width, min(top + strip_height, height)))
+        return
+
+    rawmode, stride, ystep, offset = raw_layout
+    for top in range(start_row, stop_row, strip_height):
+        bottom = min(top + strip_height, height)
+        # 自下而上存储的图像（如BMP），条带在文件中的位置从图像底部倒数
+        first_row = top if ystep == 1 else height - bottom
+        image.fp.seek(offset + first_row * stride)
+        data = image.fp.read((bottom - top) * stride)
+        yield top, Image.frombuffer(image.mode, (width, bottom - top), data, 'raw', rawmode, stride, ystep)
+
+
+def _get_raw_layout(image):
+    """
+    未压缩单块图像的存储布局 (rawmode, 行字节数, 行方向, 数据偏移)，其他情况返回None
+    """
+    tiles = getattr(image, 'tile', None)
+    if not tiles or len(tiles) != 1 or image.mode not in ('RGB', 'RGBA', 'L'):
+        return None
+    codec, extents, offset, args = tiles[0]
+    width, height = image.size
+    if codec != 'raw' or tuple(extents) != (0, 0, width, height):
+        return None
+
+    if isinstance(args, str):
+        args = (args,)
+    rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+    try:
+        if stride == 0:
+            stride = len(Image.new(image.mode, (width, 1)).tobytes('raw', rawmode))
+    except Exception:
+        return None
+    if stride <= 0 or ystep not in (1, -1):
+        return None
+    return rawmode, stride, ystep, offset
+
+
+class _PngStreamWriter:
+    """
+    逐行写出8位RGBA的PNG文件，每行使用Up滤波，压缩数据随写随出
+    """
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.path = Path(path)
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(compress_level)
+        self._prev_row = np.zeros(width * 4, dtype=np.uint8)
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write_rows(self, rgba_array):
+        """写入若干行，rgba_array 形状为 (行数, 宽度, 4)"""
+        rows = rgba_array.reshape(rgba_array.shape[0], -1)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # Up 滤波：当前行减去上一行
+        np.subtract(rows[0], self._prev_row, out=filtered[0, 1:])
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        self._prev_row = rows[-1].copy()
+        self.rows_written += rows.shape[0]
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._write_chunk(b'IDAT', data)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG行数不完整: 已写入 {self.rows_written}/{self.height} 行")
+            self._write_chunk(b'IDAT', self._compressor.flush())
+            self._write_chunk(b'IEND', b'')
+        except Exception:
+            self._file.close()
+            self.path.unlink(missing_ok=True)
+            raise
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时删除不完整的PNG，避免留下无效的输出文件
+            self._file.close()
+            self.path.unlink(missing_ok=True)
+
+
 def calculate_color_distance(color1, color2):
     """计算两个颜色之间的欧几里得距离"""
     return np.sqrt(sum([(c1 - c2) ** 2 for c1, c2 in zip(color1, color2)]))
 
 
-def auto_detect_background_color(image, sample_size=50):
+def auto_detect_background_color(image, sample_size=50, mode='corners', return_confidence=False,
+                                 confidence_tolerance=10):
     """
-    自动检测背景颜色（基于图像四个角落的像素）
+    自动检测背景颜色（基于图像边缘的像素）
     Args:
         image: PIL图像对象
-        sample_size: 采样区域大小
+        sample_size: 采样区域大小（角落边长或边缘条带宽度）
+        mode: 'corners' 采样四个角落，分别取出现最多的颜色后求平均；
+              'border' 采样四条边的条带，取整体出现最多的颜色
+        return_confidence: 是否同时返回置信度
+        confidence_tolerance: 与检测结果的颜色距离在此范围内的采样像素计入置信度
     Returns:
-        检测到的背景颜色 (R, G, B)
+        检测到的背景颜色 (R, G, B)；return_confidence=True 时返回 ((R, G, B), 置信度)，
+        置信度为 0-1，即采样像素中接近背景颜色的比例
     """
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    regions = _background_sample_regions(image.size, sample_size, mode)
+    if not regions:
+        return ((0, 0, 0), 0.0) if return_confidence else (0, 0, 0)
 
-    width, height = image.size
+    # 只转换采样区域，并将RGB打包为uint32以便统计
+    samples = [_pack_rgb(np.asarray(image.crop(region).convert('RGB'))) for region in regions]
+    return _background_color_from_samples(samples, mode, return_confidence, confidence_tolerance)
+
+
+def _auto_detect_background_color_tiled(image, sample_size=50, mode='corners', confidence_tolerance=10,
+                                        strip_height=512):
+    """
+    条带模式下的 auto_detect_background_color（return_confidence=True）：按条带读取与整图相同的采样区域，
+    四条边和四个角的采样像素都与整图一致，不整体解码图像
+    """
+    if _get_raw_layout(image) is None:
+        # 无法按条带读取的格式后续也会整体解码，直接按整图检测
+        return auto_detect_background_color(image, sample_size, mode, True, confidence_tolerance)
+
+    regions = _background_sample_regions(image.size, sample_size, mode)
+    if not regions:
+        return (0, 0, 0), 0.0
+    parts = [[] for _ in regions]
+    # 行范围相同的区域（如左右两条边）共用一次读取
+    for row_range in dict.fromkeys((top, bottom) for _, top, _, bottom in regions):
+        start_row, stop_row = row_range
+        for strip_top, strip in _iter_image_strips(image, strip_height, stop_row, start_row):
+            for i, (left, top, right, bottom) in enumerate(regions):
+                if (top, bottom) != row_range:
+                    continue
+                first, last = max(top, strip_top), min(bottom, strip_top + strip.height)
+                if last > first:
+                    region_strip = strip.crop((left, first - strip_top, right, last - strip_top)).convert('RGB')
+                    parts[i].append(_pack_rgb(np.asarray(region_strip)))
+    samples = [np.concatenate(region_parts) for region_parts in parts]
+    return _background_color_from_samples(samples, mode, True, confidence_tolerance)
+
+
+def _background_sample_regions(size, sample_size, mode):
+    """背景检测的采样区域列表 (left, top, right, bottom)，图像太小时返回空列表"""
+    width, height = size
     sample_size = min(sample_size, width // 4, height // 4)
+    if sample_size <= 0:
+        return []
+
+    if mode == 'corners':
+        regions = [
+            (0, 0, sample_size, sample_size),  # 左上
+            (width - sample_size, 0, width, sample_size),  # 右上
+            (0, height - sample_size, sample_size, height),  # 左下
+            (width - sample_size, height - sample_size, width, height)  # 右下
+        ]
+    elif mode == 'border':
+        regions = [
+            (0, 0, width, sample_size),  # 上
+            (0, height - sample_size, width, height),  # 下
+            (0, sample_size, sample_size, height - sample_size),  # 左
+            (width - sample_size, sample_size, width, height - sample_size)  # 右
+        ]
+    else:
+        raise ValueError(f"不支持的采样模式: {mode}")
+    return regions
 
-    # 采样四个角落
-    corners = [
-        (0, 0, sample_size, sample_size),  # 左上
-        (width - sample_size, 0, width, sample_size),  # 右上
-        (0, height - sample_size, sample_size, height),  # 左下
-        (width - sample_size, height - sample_size, width, height)  # 右下
-    ]
 
-    corner_colors = []
-    for corner in corners:
-        crop = image.crop(corner)
-        # 获取该区域的主要颜色
-        colors = crop.getcolors(maxcolors=256*256*256)
-        if colors:
-            # 选择出现最频繁的颜色
-            most_common_color = max(colors, key=lambda x: x[0])[1]
-            corner_colors.append(most_common_color)
+def _background_color_from_samples(samples, mode, return_confidence, confidence_tolerance):
+    """由各采样区域打包后的像素计算背景颜色（及置信度），规则见 auto_detect_background_color"""
+    if mode == 'corners':
+        # 每个角落出现最多的颜色求平均
+        corner_colors = np.array([_unpack_rgb(_most_common(packed)) for packed in samples])
+        color = tuple(int(c) for c in corner_colors.sum(axis=0) // len(corner_colors))
+    else:
+        color = tuple(int(c) for c in _unpack_rgb(_most_common(np.concatenate(samples))))
 
-    if corner_colors:
-        # 计算平均颜色
-        avg_color = tuple(int(sum(c[i] for c in corner_colors) / len(corner_colors)) for i in range(3))
-        return avg_color
+    if not return_confidence:
+        return color
 
-    return (0, 0, 0)  # 默认返回黑色
+    pixels = np.concatenate(samples)
+    dist_sq = np.zeros(pixels.shape, dtype=np.int32)
+    for shift, c in zip((16, 8, 0), color):
+        channel_diff = ((pixels >> shift) & 0xff).astype(np.int32) - c
+        dist_sq += channel_diff * channel_diff
+    confidence = float(np.count_nonzero(dist_sq <= confidence_tolerance ** 2)) / pixels.size
+    return color, confidence
+
+
+def _pack_rgb(rgb_array):
+    """将 (..., 3) 的uint8数组打包为一维uint32数组"""
+    rgb = rgb_array.reshape(-1, 3).astype(np.uint32)
+    return (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def _unpack_rgb(packed):
+    return np.array([(packed >> 16) & 0xff, (packed >> 8) & 0xff, packed & 0xff], dtype=np.int64)
+
+
+def _most_common(packed):
+    """出现次数最多的打包颜色（次数相同时取数值最小的颜色）"""
+    values, counts = np.unique(packed, return_counts=True)
+    return values[np.argmax(counts)]
 
 
 def remove_background_and_center(input_path, output_path, target_size=None, fit_mode='contain', padding_ratio=0.1,
-                                use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False):
+                                use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False,
+                                model_name='u2net', num_threads=None, tiled_threshold_mp=None):
     """
     去除背景并将主体居中
     Args:
@@ -233,7 +896,12 @@ def remove_background_and_center(input_path, output_path, target_size=None, fit_
         target_color: 目标背景颜色 (R, G, B)，默认为黑色
         color_tolerance: 颜色容限 (0-255)
         edge_smooth: 是否对边缘进行平滑处理
-        auto_detect_bg: 是否自动检测背景颜色
+        auto_detect_bg: 是否自动检测背景颜色，True 或 'corners' 采样四角，'border' 采样四条边
+        model_name: rembg 模型名称（AI去除模式）
+        num_threads: ONNX Runtime 线程数（AI去除模式）
+        tiled_threshold_mp: 颜色去除模式下，像素数（百万像素）不小于该值的图像按条带流式处理，None 表示不启用
+    Returns:
+        成功返回None，出错时返回错误信息
     """
     try:
         print(f"正在处理: {input_path.name}")
@@ -242,38 +910,204 @@ def remove_background_and_center(input_path, output_path, target_size=None, fit_
             # 使用颜色去除方法
             print("  使用颜色容限去除背景...")
             image = Image.open(input_path)
+            tiled = tiled_threshold_mp is not None and image.width * image.height >= tiled_threshold_mp * 1_000_000
 
             if auto_detect_bg:
-                detected_color = auto_detect_background_color(image)
-                print(f"  自动检测的背景颜色: RGB{detected_color}")
+                detect_mode = auto_detect_bg if isinstance(auto_detect_bg, str) else 'corners'
+                if tiled:
+                    # 条带模式只按条带读取四角或四条边的采样区域，避免整体解码
+                    detected_color, confidence = _auto_detect_background_color_tiled(image, mode=detect_mode)
+                else:
+                    detected_color, confidence = auto_detect_background_color(image, mode=detect_mode,
+                                                                              return_confidence=True)
+                print(f"  自动检测的背景颜色: RGB{detected_color}, 置信度: {confidence:.2f}")
                 target_color = detected_color
             elif target_color is None:
                 target_color = (0, 0, 0)  # 默认黑色
 
             print(f"  目标背景颜色: RGB{target_color}, 容限: {color_tolerance}")
+            if tiled:
+                print(f"  图像尺寸 {image.width}x{image.height}，按条带流式处理...")
+                image.close()
+                remove_background_by_color_tiled_and_center(input_path, output_path, target_color, color_tolerance,
+                                                            edge_smooth, target_size, fit_mode, padding_ratio)
+                return None
             image = remove_background_by_color(image, target_color, color_tolerance, edge_smooth)
         else:
             # 使用rembg方法
             print("  使用AI模型去除背景...")
-            with open(input_path, 'rb') as f:
-                input_data = f.read()
-            output_data = remove(input_data)
-            image = Image.open(io.BytesIO(output_data))
-
-        print(f"  原始尺寸: {image.width}x{image.height}")
+            engine = get_background_removal_engine(model_name, num_threads)
+            with Image.open(input_path) as input_image:
+                image = engine.remove(input_image)
 
-        print("  居中处理中...")
-        centered_image = center_object(image, target_size, fit_mode, padding_ratio)
-
-        print("  保存文件中...")
-        centered_image.save(output_path, 'PNG')
-        print(f"✓ 处理完成: {output_path.name}\n")
+        _center_and_save(image, output_path, target_size, fit_mode, padding_ratio)
+        return None
     except Exception as e:
         print(f"✗ 处理 {input_path} 时出错: {str(e)}\n")
+        return str(e)
+
+
+def _center_and_save(image, output_path, target_size=None, fit_mode='contain', padding_ratio=0.1):
+    """将去除背景后的图像居中并保存为PNG"""
+    print(f"  原始尺寸: {image.width}x{image.height}")
+
+    print("  居中处理中...")
+    centered_image = center_object(image, target_size, fit_mode, padding_ratio)
+
+    print("  保存文件中...")
+    centered_image.save(output_path, 'PNG')
+    print(f"✓ 处理完成: {output_path.name}\n")
+
+
+def _process_file_in_worker(input_path, output_path, options):
+    """
+    进程池中执行单个文件的处理，捕获打印输出以便主进程按顺序输出
+    Returns:
+        (错误信息或None, 处理过程中的打印输出)
+    """
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        error = remove_background_and_center(input_path, output_path, **options)
+    return error, buffer.getvalue()
+
+
+class ResultCache:
+    """
+    处理结果的磁盘缓存，键为输入文件内容哈希加全部处理参数，超出容量时按最近使用时间(LRU)淘汰
+    """
+
+    INDEX_NAME = 'index.json'
+    VERSION = 1  # 处理逻辑变化导致输出不同时递增，使旧缓存失效
+
+    def __init__(self, cache_dir, max_size_mb=1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / self.INDEX_NAME
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.entries = self._load_index()  # 键 -> {'size': 字节数, 'last_used': 时间戳}
+        self.total_bytes = sum(entry['size'] for entry in self.entries.values())
+        self.hits = 0
+        self.misses = 0
+        self._unsaved = 0
+        self._evict()
+
+    def _load_index(self):
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    @classmethod
+    def make_key(cls, input_path, options):
+        """根据输入文件内容和处理参数生成缓存键"""
+        file_hash = hashlib.sha256()
+        with open(input_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+
+        # 线程数不影响结果；颜色去除模式与模型无关
+        params = {k: v for k, v in options.items() if k != 'num_threads'}
+        if params.get('use_color_removal'):
+            params.pop('model_name', None)
+        payload = json.dumps({'version': cls.VERSION, 'input': file_hash.hexdigest(), 'params': params},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.png"
+
+    def fetch(self, key, output_path):
+        """命中时将缓存结果复制到 output_path 并返回True"""
+        entry = self.entries.get(key)
+        cached_file = self._entry_path(key)
+        if entry is None or not cached_file.exists():
+            if entry is not None:
+                self.total_bytes -= self.entries.pop(key)['size']
+            self.misses += 1
+            return False
+        shutil.copyfile(cached_file, output_path)
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return True
+
+    def store(self, key, result_path):
+        """将处理结果加入缓存"""
+        cached_file = self._entry_path(key)
+        try:
+            shutil.copyfile(result_path, cached_file)
+        except OSError as e:
+            print(f"  ⚠️ 写入缓存失败: {e}")
+            return
+        if key in self.entries:
+            self.total_bytes -= self.entries[key]['size']
+        size = cached_file.stat().st_size
+        self.entries[key] = {'size': size, 'last_used': time.time()}
+        self.total_bytes += size
+        self._evict()
+
+        # 定期保存索引，中途退出时已处理的结果仍可复用
+        self._unsaved += 1
+        if self._unsaved >= 100:
+            self.save()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.total_bytes -= self.entries.pop(key)['size']
+            self._entry_path(key).unlink(missing_ok=True)
+
+    def save(self):
+        """写入索引文件（先写临时文件再替换）"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'version': self.VERSION, 'entries': self.entries}), encoding='utf-8')
+        os.replace(tmp_path, self.index_path)
+        self._unsaved = 0
+
+
+def _check_existing(img_file, output_file, options, cache):
+    """
+    处理前检查是否可以跳过：未启用缓存时输出文件已存在即跳过；启用缓存时按输入内容和参数查找缓存结果
+    Returns:
+        (跳过原因或None, 缓存键)
+    """
+    if cache is None:
+        if output_file.exists():
+            return f"跳过已存在的文件: {output_file.name}", None
+        return None, None
+    cache_key = cache.make_key(img_file, options)
+    if cache.fetch(cache_key, output_file):
+        return f"缓存命中: {output_file.name}", cache_key
+    return None, cache_key
+
+
+def _print_summary(summary):
+    """打印批量处理的汇总信息"""
+    print("=== 处理汇总 ===")
+    print(f"总文件数: {summary['total']}, 成功: {summary['processed']}, "
+          f"跳过: {summary['skipped']}, 失败: {len(summary['errors'])}")
+    if 'cache_hits' in summary:
+        lookups = summary['cache_hits'] + summary['cache_misses']
+        hit_rate = summary['cache_hits'] / lookups * 100 if lookups else 0
+        print(f"缓存命中: {summary['cache_hits']}, 未命中: {summary['cache_misses']}, 命中率: {hit_rate:.1f}%")
+    for name, error in summary['errors']:
+        print(f"  ✗ {name}: {error}")
+    print("================\n")
 
 
 def process_single_file(input_file, output_dir=None, target_size=None, fit_mode='contain', padding_ratio=0.1,
-                       use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False):
+                       use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False,
+                       model_name='u2net', num_threads=None, tiled_threshold_mp=None):
     input_path = Path(input_file)
     if not input_path.exists():
         print(f"文件不存在: {input_path}")
@@ -289,11 +1123,30 @@ def process_single_file(input_file, output_dir=None, target_size=None, fit_mode=
     else:
         output_path = input_path.parent / f"{input_path.stem}_no_bg_centered.png"
     remove_background_and_center(input_path, output_path, target_size, fit_mode, padding_ratio,
-                                use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg)
+                                use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg,
+                                model_name, num_threads, tiled_threshold_mp)
 
 
 def process_directory(input_dir, output_dir=None, target_size=None, fit_mode='contain', padding_ratio=0.1,
-                     use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False):
+                     use_color_removal=False, target_color=None, color_tolerance=30, edge_smooth=True, auto_detect_bg=False,
+                     workers=1, max_in_flight=None, model_name='u2net', num_threads=None, batch_size=1,
+                     cache_dir=None, cache_max_size_mb=1024, tiled_threshold_mp=None):
+    """
+    批量处理目录下的图像文件
+    Args:
+        workers: 并行进程数，1表示串行处理，None表示使用全部CPU核心
+        max_in_flight: 并行模式下同时提交到进程池的最大任务数，默认为 workers * 2
+        model_name: rembg 模型名称（AI去除模式）
+        num_threads: 每个进程的 ONNX Runtime 线程数，并行模式下默认为 CPU核心数 / workers
+        batch_size: AI去除模式下每次推理的图像数量，大于1时启用批量推理（仅串行模式）
+        cache_dir: 结果缓存目录，设置后按输入内容和参数复用结果，代替"输出文件已存在即跳过"
+        cache_max_size_mb: 缓存总大小上限（MB）
+        tiled_threshold_mp: 颜色去除模式下按条带流式处理的图像像素数阈值（百万像素），None 表示不启用
+        其余参数同 remove_background_and_center
+    Returns:
+        处理汇总 {'total', 'processed', 'skipped', 'errors': [(文件名, 错误信息)]}，
+        启用缓存时另含 'cache_hits', 'cache_misses'
+    """
     input_path = Path(input_dir)
     if not input_path.exists() or not input_path.is_dir():
         print(f"目录不存在: {input_path}")
@@ -325,18 +1178,270 @@ def process_directory(input_dir, output_dir=None, target_size=None, fit_mode='co
 
     output_path.mkdir(parents=True, exist_ok=True)
 
-    # 处理每个文件
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and num_threads is None:
+        # 避免多个进程的 ONNX Runtime 线程争抢CPU
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    options = dict(target_size=target_size, fit_mode=fit_mode, padding_ratio=padding_ratio,
+                   use_color_removal=use_color_removal, target_color=target_color,
+                   color_tolerance=color_tolerance, edge_smooth=edge_smooth, auto_detect_bg=auto_detect_bg,
+                   model_name=model_name, num_threads=num_threads, tiled_threshold_mp=tiled_threshold_mp)
+    summary = {'total': len(image_files), 'processed': 0, 'skipped': 0, 'errors': []}
+    cache = ResultCache(cache_dir, cache_max_size_mb) if cache_dir else None
+
+    if workers > 1:
+        _process_files_parallel(image_files, output_path, options, summary, workers, max_in_flight, cache)
+    elif batch_size > 1 and not use_color_removal:
+        _process_files_batched(image_files, output_path, options, summary, batch_size, cache)
+    else:
+        # 处理每个文件
+        for i, img_file in enumerate(image_files, 1):
+            print(f"[{i}/{len(image_files)}]", end=" ")
+            output_file = output_path / f"{img_file.stem}.png"
+
+            # 检查输出文件是否已存在或缓存是否命中
+            skip_reason, cache_key = _check_existing(img_file, output_file, options, cache)
+            if skip_reason:
+                print(skip_reason)
+                summary['skipped'] += 1
+                continue
+
+            error = remove_background_and_center(img_file, output_file, **options)
+            if error is None:
+                summary['processed'] += 1
+                if cache is not None:
+                    cache.store(cache_key, output_file)
+            else:
+                summary['errors'].append((img_file.name, error))
+
+    if cache is not None:
+        cache.save()
+        summary['cache_hits'] = cache.hits
+        summary['cache_misses'] = cache.misses
+
+    _print_summary(summary)
+    return summary
+
+
+def _process_files_batched(image_files, output_path, options, summary, batch_size, cache=None):
+    """
+    AI去除模式下的批量推理：每次读取 batch_size 个文件，一次推理后逐个居中保存
+    """
+    total = len(image_files)
+    engine = get_background_removal_engine(options['model_name'], options['num_threads'])
+    print(f"批量推理模式: 每批 {batch_size} 张")
+
+    pending = []  # (序号, 输入文件, 输出文件, 缓存键)
     for i, img_file in enumerate(image_files, 1):
-        print(f"[{i}/{len(image_files)}]", end=" ")
         output_file = output_path / f"{img_file.stem}.png"
+        skip_reason, cache_key = _check_existing(img_file, output_file, options, cache)
+        if skip_reason:
+            print(f"[{i}/{total}] {skip_reason}")
+            summary['skipped'] += 1
+            continue
+        pending.append((i, img_file, output_file, cache_key))
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+
+        images = []
+        loaded = []
+        for i, img_file, output_file, cache_key in chunk:
+            try:
+                with Image.open(img_file) as img:
+                    img.load()
+                    images.append(img.copy())
+                loaded.append((i, img_file, output_file, cache_key))
+            except Exception as e:
+                print(f"[{i}/{total}] ✗ 处理 {img_file} 时出错: {str(e)}\n")
+                summary['errors'].append((img_file.name, str(e)))
+        if not images:
+            continue
 
-        # 检查输出文件是否已存在
-        if output_file.exists():
-            print(f"跳过已存在的文件: {output_file.name}")
+        try:
+            results = engine.remove_batch(images, batch_size)
+        except Exception as e:
+            for i, img_file, _, _ in loaded:
+                print(f"[{i}/{total}] ✗ 处理 {img_file} 时出错: {str(e)}\n")
+                summary['errors'].append((img_file.name, str(e)))
             continue
 
-        remove_background_and_center(img_file, output_file, target_size, fit_mode, padding_ratio,
-                                   use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg)
+        for (i, img_file, output_file, cache_key), image in zip(loaded, results):
+            print(f"[{i}/{total}] 正在处理: {img_file.name}")
+            try:
+                _center_and_save(image, output_file, options['target_size'], options['fit_mode'],
+                                 options['padding_ratio'])
+                summary['processed'] += 1
+                if cache is not None:
+                    cache.store(cache_key, output_file)
+            except Exception as e:
+                print(f"✗ 处理 {img_file} 时出错: {str(e)}\n")
+                summary['errors'].append((img_file.name, str(e)))
+
+
+def _process_files_parallel(image_files, output_path, options, summary, workers, max_in_flight=None, cache=None):
+    """
+    使用进程池并行处理文件
+    同时在途的任务数量受 max_in_flight 限制；各文件的输出按文件顺序打印，与串行模式一致
+    """
+    total = len(image_files)
+    max_in_flight = max_in_flight or workers * 2
+    print(f"并行模式: {workers} 个进程, 最多 {max_in_flight} 个在途任务")
+
+    results = {}  # 序号 -> (文件名, 错误信息, 打印输出, 是否跳过)
+    next_to_report = 1
+
+    def report_ready():
+        nonlocal next_to_report
+        while next_to_report in results:
+            name, error, log, skipped = results.pop(next_to_report)
+            print(f"[{next_to_report}/{total}]", end=" ")
+            print(log, end="")
+            if skipped:
+                summary['skipped'] += 1
+            elif error is None:
+                summary['processed'] += 1
+            else:
+                summary['errors'].append((name, error))
+            next_to_report += 1
+
+    initializer, initargs = None, ()
+    if not options['use_color_removal']:
+        # 每个工作进程启动时加载一次模型
+        initializer = get_background_removal_engine
+        initargs = (options['model_name'], options['num_threads'])
+
+    # 使用spawn启动工作进程：rembg依赖的pymatting(numba)线程在fork后会导致主进程退出时挂起，
+    # 同时与Windows下的默认行为保持一致
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=initializer, initargs=initargs) as executor:
+        in_flight = {}
+        for i, img_file in enumerate(image_files, 1):
+            output_file = output_path / f"{img_file.stem}.png"
+
+            # 检查输出文件是否已存在或缓存是否命中
+            skip_reason, cache_key = _check_existing(img_file, output_file, options, cache)
+            if skip_reason:
+                results[i] = (img_file.name, None, f"{skip_reason}\n", True)
+                report_ready()
+                continue
+
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _collect_result(future, in_flight.pop(future), results, cache)
+                report_ready()
+
+            future = executor.submit(_process_file_in_worker, img_file, output_file, options)
+            in_flight[future] = (i, img_file, output_file, cache_key)
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                _collect_result(future, in_flight.pop(future), results, cache)
+            report_ready()
+
+
+def _collect_result(future, task, results, cache=None):
+    """取出进程池任务结果，工作进程异常退出等情况也记录为该文件的错误"""
+    index, img_file, output_file, cache_key = task
+    try:
+        error, log = future.result()
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        log = f"✗ 处理 {img_file} 时出错: {error}\n\n"
+    if error is None and cache is not None:
+        cache.store(cache_key, output_file)
+    results[index] = (img_file.name, error, log, False)
+
+
+def benchmark_batch_inference(model_name='u2netp', batch_sizes=(1, 4, 8, 16), num_images=32,
+                              image_size=(256, 256), num_threads=None):
+    """
+    基准测试：比较AI去除背景在不同批量大小下的吞吐量（张/秒）
+    Args:
+        model_name: rembg 模型名称
+        batch_sizes: 需要测试的批量大小
+        num_images: 测试图像数量
+        image_size: 测试图像尺寸
+        num_threads: ONNX Runtime 线程数
+    """
+    engine = get_background_removal_engine(model_name, num_threads)
+    if not engine.supports_batch():
+        print(f"模型 {model_name} 的ONNX输入不支持动态batch，批量推理将退化为逐张处理")
+
+    rng = np.random.default_rng(0)
+    width, height = image_size
+    images = []
+    for _ in range(num_images):
+        img_array = np.full((height, width, 3), 255, dtype=np.uint8)
+        top, left = rng.integers(0, height // 2), rng.integers(0, width // 2)
+        img_array[top:top + height // 3, left:left + width // 3] = rng.integers(0, 200, 3)
+        images.append(Image.fromarray(img_array))
+
+    # 预热，排除首次推理的初始化开销
+    engine.remove_batch(images[:1], 1)
+
+    print(f"基准测试: 模型 {model_name}, {num_images} 张 {width}x{height} 图像")
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        engine.remove_batch(images, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"  batch_size={batch_size:<3} 耗时: {elapsed:.2f}s, 吞吐: {num_images / elapsed:.1f} 张/秒")
+
+
+def benchmark_process_directory(num_images=64, image_size=(512, 512), worker_counts=None):
+    """
+    基准测试：使用颜色去除模式，比较不同进程数下 process_directory 的耗时，并校验输出与串行结果逐字节一致
+    Args:
+        num_images: 生成的测试图像数量
+        image_size: 测试图像尺寸
+        worker_counts: 需要测试的进程数列表，默认 1, 2, 4 ... 直到CPU核心数
+    """
+    cpu_count = os.cpu_count() or 1
+    if worker_counts is None:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpu_count:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cpu_count:
+            worker_counts.append(cpu_count)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="removebg_bench_"))
+    try:
+        input_dir = work_dir / "input"
+        input_dir.mkdir()
+        rng = np.random.default_rng(0)
+        width, height = image_size
+        for n in range(num_images):
+            img_array = np.zeros((height, width, 3), dtype=np.uint8)
+            top, left = rng.integers(0, height // 2), rng.integers(0, width // 2)
+            img_array[top:top + height // 3, left:left + width // 3] = rng.integers(60, 256, 3)
+            Image.fromarray(img_array).save(input_dir / f"icon_{n:04d}.png")
+
+        print(f"基准测试: {num_images} 张 {width}x{height} 图像, CPU核心数: {cpu_count}")
+        baseline_time = None
+        baseline_dir = None
+        for workers in worker_counts:
+            output_dir = work_dir / f"output_{workers}"
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                process_directory(input_dir, output_dir, use_color_removal=True, target_color=(0, 0, 0),
+                                  color_tolerance=50, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            if baseline_time is None:
+                baseline_time, baseline_dir = elapsed, output_dir
+                identical = True
+            else:
+                identical = all((output_dir / f.name).read_bytes() == f.read_bytes()
+                                for f in baseline_dir.iterdir())
+            print(f"  workers={workers:<3} 耗时: {elapsed:.2f}s, "
+                  f"吞吐: {num_images / elapsed:.1f} 张/秒, 加速比: {baseline_time / elapsed:.2f}x, "
+                  f"输出一致: {'是' if identical else '否'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 
 def main():
@@ -376,7 +1481,32 @@ def main():
     edge_smooth = True
 
     # 是否自动检测背景颜色（基于图像四角）
-    auto_detect_bg = False  # 设为True会自动检测背景颜色
+    auto_detect_bg = False  # 设为True（或'corners'）基于四角检测背景颜色，设为'border'基于四条边检测
+
+    # 超大图像（如扫描件）按条带流式处理的像素数阈值（百万像素），None 表示始终整图处理；需要时设为如 100
+    # 未压缩的 TIFF/BMP 按条带读取，内存只与图像宽度和条带行数相关；PNG/JPEG 等仍需整体解码一次
+    tiled_threshold_mp = None
+
+    # ============ AI模型配置（use_color_removal=False时生效） ============
+    # rembg 模型名称：'u2net', 'u2netp'（轻量）, 'isnet-general-use' 等
+    model_name = 'u2net'
+
+    # ONNX Runtime 线程数，None 使用默认值
+    num_threads = None
+
+    # AI模型批量推理的图像数量，1为逐张推理（仅在 workers=1 时生效）
+    batch_size = 1
+
+    # ============ 并行处理配置 ============
+    # 处理目录时的并行进程数，1为串行，None为使用全部CPU核心
+    workers = 1
+
+    # ============ 结果缓存配置 ============
+    # 缓存目录，设置后按输入内容和处理参数复用结果（输入改名或参数变化都能正确处理），None 为不使用缓存
+    cache_dir = None  # 例如: r".\cache\no_bg_centered"
+
+    # 缓存总大小上限（MB），超出后淘汰最久未使用的结果
+    cache_max_size_mb = 1024
 
     # ========================================
 
@@ -388,7 +1518,8 @@ def main():
         else:
             print("使用AI模型去除背景")
         process_single_file(input_path, output_dir, target_size, fit_mode, padding_ratio,
-                           use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg)
+                           use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg,
+                           model_name, num_threads, tiled_threshold_mp)
     elif input_path_obj.is_dir():
         print(f"处理目录: {input_path}")
         if use_color_removal:
@@ -396,7 +1527,10 @@ def main():
         else:
             print("使用AI模型去除背景")
         process_directory(input_path, output_dir, target_size, fit_mode, padding_ratio,
-                         use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg)
+                         use_color_removal, target_color, color_tolerance, edge_smooth, auto_detect_bg,
+                         workers=workers, model_name=model_name, num_threads=num_threads, batch_size=batch_size,
+                         cache_dir=cache_dir, cache_max_size_mb=cache_max_size_mb,
+                         tiled_threshold_mp=tiled_threshold_mp)
     else:
         print(f"输入路径无效: {input_path}")
         print("请在main()函数中修改 input_path 变量")
@@ -1,39 +1,378 @@
 """
-将指定目录或指定的图像文件，按照N*N的网格，分割成多个小图像，并保存到指定目录
+将指定目录或指定的图像文件，按照N*N（或R*C）的网格，分割成多个小图像，并保存到指定目录
+网格也可以自动检测：沿行、列方向统计内容投影，找出图标之间的空白分隔带后按分隔带切分
+
+每张图像只解码一次，网格中的小图以numpy视图的形式切出，编码保存在线程池中并行执行（Pillow编码时会释放GIL）
+可选跳过全透明或纯色的空白小图、将小图裁剪到内容边界，以及在输出目录写出 manifest.jsonl 记录保留的小图及其在原图中的位置
 """
 
+import json
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
 from PIL import Image
+import numpy as np
+
+# 可以直接转为numpy数组并从视图还原的图像模式
+ARRAY_MODES = {'RGB', 'RGBA', 'L', 'LA', 'P'}
 
+# 网格参数：N 表示 N*N，(R, C) 表示 R 行 C 列，'auto' 表示自动检测
+Grid = Union[int, Tuple[int, int], str]
 
-def split_image_to_icons(image_path: Path, output_dir: Path, grid: int):
-    img = Image.open(image_path)
+
+def iter_tiles(img: Image.Image, grid: Grid, skip_empty: bool = False, trim: bool = False,
+               color_tolerance: int = 0, alpha_threshold: int = 0, min_gap: int = 4):
+    """
+    按网格切分已加载的图像，返回 (行号, 列号, 在原图中的区域, 小图) 的迭代器
+    图像只转换一次为numpy数组，小图是该数组的视图，在编码时才生成各自的图像
+    Args:
+        grid: 网格，N、(行数, 列数) 或 'auto'
+        skip_empty: 跳过全透明或纯色的小图
+        trim: 将小图裁剪到内容边界
+        color_tolerance: 各通道取值范围不超过该值的小图视为纯色；与背景色的差异超过该值的像素才算内容
+        alpha_threshold: alpha不超过该值的像素视为透明
+        min_gap: 自动检测时，分隔带的最小宽度（像素），更窄的空白视为图标内部的空隙
+    """
     w, h = img.size
-    icon_w, icon_h = w // grid, h // grid
+    array = np.asarray(img) if img.mode in ARRAY_MODES else None
+    has_alpha = img.mode in ('RGBA', 'LA')
+
+    # 其他模式（如CMYK、I;16）按区域裁剪小图，需要分析内容时另转为RGBA
+    analysis = array
+    if array is None and (grid == 'auto' or skip_empty or trim):
+        analysis = np.asarray(img.convert('RGBA'))
+        has_alpha = True
+
+    row_bounds, col_bounds = resolve_grid_bounds(grid, w, h, analysis, has_alpha, color_tolerance,
+                                                 alpha_threshold, min_gap)
+    if not row_bounds or not col_bounds:
+        return
+
+    empty = np.zeros((len(row_bounds), len(col_bounds)), dtype=bool)
+    if skip_empty:
+        empty = find_empty_tiles(analysis, row_bounds, col_bounds, has_alpha, color_tolerance, alpha_threshold)
+
+    for i, (upper, lower) in enumerate(row_bounds):
+        for j, (left, right) in enumerate(col_bounds):
+            if empty[i, j]:
+                continue
+            box = (left, upper, right, lower)
+            if trim:
+                content = content_box(analysis[upper:lower, left:right], has_alpha, color_tolerance, alpha_threshold)
+                if content is None:
+                    continue
+                box = (left + content[0], upper + content[1], left + content[2], upper + content[3])
+            if array is not None:
+                tile = array[box[1]:box[3], box[0]:box[2]]
+            else:
+                tile = img.crop(box)
+            yield i, j, box, tile
+
+
+def resolve_grid_bounds(grid: Grid, width: int, height: int, array: Optional[np.ndarray] = None,
+                        has_alpha: bool = False, color_tolerance: int = 0, alpha_threshold: int = 0,
+                        min_gap: int = 4):
+    """
+    计算网格各行、各列的像素范围
+    Returns:
+        (行范围列表, 列范围列表)，每项为 (起点, 终点)
+    """
+    if grid == 'auto':
+        return detect_grid_bounds(array, has_alpha, color_tolerance, alpha_threshold, min_gap)
+    rows, cols = (grid, grid) if isinstance(grid, int) else grid
+    return split_evenly(height, rows), split_evenly(width, cols)
+
+
+def split_evenly(length: int, count: int) -> List[Tuple[int, int]]:
+    """将长度分为 count 段，余数像素分摊到各段中，不丢弃边缘像素"""
+    return [(k * length // count, (k + 1) * length // count) for k in range(count)]
+
+
+def detect_grid_bounds(array: np.ndarray, has_alpha: bool, color_tolerance: int = 0, alpha_threshold: int = 0,
+                       min_gap: int = 4):
+    """
+    自动检测网格：将内容像素分别投影到行、列方向，连续无内容且宽度不小于 min_gap 的区域视为分隔带，
+    在分隔带中线处切分，首尾的行列延伸到图像边界
+    Returns:
+        (行范围列表, 列范围列表)，图像没有内容时均为空列表
+    """
+    mask = _content_mask(array, has_alpha, color_tolerance, alpha_threshold)
+    return _profile_bounds(mask.any(axis=1), min_gap), _profile_bounds(mask.any(axis=0), min_gap)
+
+
+def _profile_bounds(profile: np.ndarray, min_gap: int) -> List[Tuple[int, int]]:
+    """根据一维内容投影计算切分范围"""
+    content = np.flatnonzero(profile)
+    if not content.size:
+        return []
+    # 相邻内容位置的间距减一即空白宽度
+    gaps = np.flatnonzero(np.diff(content) > min_gap)
+    starts = content[np.r_[0, gaps + 1]]
+    ends = content[np.r_[gaps, content.size - 1]] + 1
+    cuts = (ends[:-1] + starts[1:]) // 2
+    edges = np.r_[0, cuts, profile.size]
+    return [(int(start), int(end)) for start, end in zip(edges[:-1], edges[1:])]
+
+
+def _content_mask(array: np.ndarray, has_alpha: bool, color_tolerance: int = 0, alpha_threshold: int = 0) -> np.ndarray:
+    """
+    内容像素的布尔掩码：有alpha通道时为不透明像素，否则为与左上角颜色差异超过 color_tolerance 的像素
+    """
+    if array.ndim == 2:
+        array = array[:, :, None]
+    if has_alpha:
+        return array[:, :, -1] > alpha_threshold
+    background = array[0, 0].astype(np.int16)
+    mask = np.zeros(array.shape[:2], dtype=bool)
+    for c in range(array.shape[-1]):
+        mask |= np.abs(array[:, :, c].astype(np.int16) - background[c]) > color_tolerance
+    return mask
+
+
+def find_empty_tiles(array: np.ndarray, row_bounds: List[Tuple[int, int]], col_bounds: List[Tuple[int, int]],
+                     has_alpha: bool, color_tolerance: int = 0, alpha_threshold: int = 0) -> np.ndarray:
+    """
+    一次性判断所有小图是否为空白：全透明，或所有通道（含alpha）的取值范围都不超过 color_tolerance
+    Returns:
+        形状为 (行数, 列数) 的布尔数组
+    """
+    if array.ndim == 2:
+        array = array[:, :, None]
+    tile_max = _reduce_tiles(np.maximum, array, row_bounds, col_bounds)
+    tile_min = _reduce_tiles(np.minimum, array, row_bounds, col_bounds)
+
+    empty = ((tile_max.astype(np.int16) - tile_min) <= color_tolerance).all(axis=-1)
+    if has_alpha:
+        empty |= tile_max[:, :, -1] <= alpha_threshold
+    return empty
+
+
+def _reduce_tiles(ufunc, array: np.ndarray, row_bounds, col_bounds) -> np.ndarray:
+    """用 reduceat 按行、列范围对每个小图做归约，结果形状为 (行数, 列数, 通道数)"""
+    rows = ufunc.reduceat(array, _segment_indices(row_bounds, array.shape[0]), axis=0)[::2]
+    return ufunc.reduceat(rows, _segment_indices(col_bounds, array.shape[1]), axis=1)[:, ::2]
+
+
+def _segment_indices(bounds, length: int) -> List[int]:
+    """reduceat 的分段起点：每个范围的起点和终点交替排列，结果中偶数位置即各范围的归约值"""
+    indices = [i for start, end in bounds for i in (start, end)]
+    if indices[-1] == length:
+        indices.pop()
+    return indices
+
+
+def content_box(tile: np.ndarray, has_alpha: bool, color_tolerance: int = 0, alpha_threshold: int = 0):
+    """
+    小图中内容的边界 (left, upper, right, lower)，没有内容时返回None
+    """
+    mask = _content_mask(tile, has_alpha, color_tolerance, alpha_threshold)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def _tile_to_image(tile, source: Image.Image) -> Image.Image:
+    """将numpy视图还原为图像，调色板模式保留原调色板"""
+    if isinstance(tile, Image.Image):
+        return tile
+    icon = Image.fromarray(np.ascontiguousarray(tile))
+    if source.mode == 'P':
+        icon.putpalette(source.palette.palette, source.palette.mode)
+    return icon
+
+
+def _save_tile(tile, source: Image.Image, icon_file: Path, save_kwargs: Dict):
+    _tile_to_image(tile, source).save(icon_file, **save_kwargs)
+
+
+def get_save_kwargs(source: Image.Image, image_format: str = 'png', compress_level: int = 6,
+                    webp_lossless: bool = True, webp_quality: int = 90) -> Dict:
+    """
+    生成保存小图时的编码参数
+    Args:
+        image_format: 'png' 或 'webp'
+        compress_level: PNG压缩级别 0-9，数值越小编码越快、文件越大
+        webp_lossless: WebP是否无损
+        webp_quality: WebP质量（有损时为画质，无损时为压缩力度）
+    """
+    if image_format == 'png':
+        save_kwargs = {'format': 'PNG', 'compress_level': compress_level}
+        if 'transparency' in source.info:
+            save_kwargs['transparency'] = source.info['transparency']
+        return save_kwargs
+    if image_format == 'webp':
+        return {'format': 'WEBP', 'lossless': webp_lossless, 'quality': webp_quality}
+    raise ValueError(f"不支持的输出格式: {image_format}")
+
+
+def split_image_to_icons(image_path: Path, output_dir: Path, grid: Grid, executor: Optional[ThreadPoolExecutor] = None,
+                         image_format: str = 'png', compress_level: int = 6, webp_lossless: bool = True,
+                         max_pending: Optional[int] = None, pending: Optional[Set] = None,
+                         skip_empty: bool = False, trim: bool = False, color_tolerance: int = 0,
+                         alpha_threshold: int = 0, min_gap: int = 4) -> List[Dict]:
+    """
+    将图像按网格分割并保存
+    Args:
+        image_path: 图像路径
+        output_dir: 输出目录
+        grid: 网格数N（N*N）、(行数, 列数) 或 'auto'（自动检测分隔带）
+        executor: 编码用的线程池，为None时在当前线程中依次编码
+        image_format: 输出格式 'png' 或 'webp'
+        compress_level: PNG压缩级别 0-9
+        webp_lossless: WebP是否无损
+        max_pending: 线程池中最多排队的编码任务数，用于限制内存占用
+        pending: 跨文件共享的在途任务集合，由 main 传入；为None时在返回前等待本图所有任务完成
+        skip_empty, trim, color_tolerance, alpha_threshold, min_gap: 空白检测、裁剪与自动网格参数，同 iter_tiles
+    Returns:
+        保留的小图信息列表，每项为 {'source', 'file', 'row', 'col', 'box'}，box 为小图在原图中的区域
+    """
     output_dir.mkdir(parents=True, exist_ok=True)
-    for i in range(grid):
-        for j in range(grid):
-            left = j * icon_w
-            upper = i * icon_h
-            right = left + icon_w
-            lower = upper + icon_h
-            icon = img.crop((left, upper, right, lower))
-            icon_file = output_dir / f"{image_path.stem}_{i}_{j}.png"
-            icon.save(icon_file, format='PNG')
-
-def main(input_path: Path, output_dir: Path, grid: int):
+    own_pending = pending is None
+    if own_pending:
+        pending = set()
+    max_pending = max_pending or 64
+
+    with Image.open(image_path) as img:
+        img.load()
+        save_kwargs = get_save_kwargs(img, image_format, compress_level, webp_lossless)
+        suffix = '.webp' if image_format == 'webp' else '.png'
+
+        entries = []
+        for i, j, box, tile in iter_tiles(img, grid, skip_empty, trim, color_tolerance, alpha_threshold, min_gap):
+            icon_file = output_dir / f"{image_path.stem}_{i}_{j}{suffix}"
+            entries.append({'source': str(image_path), 'file': icon_file.name, 'row': i, 'col': j,
+                            'box': list(box)})
+            if executor is None:
+                _save_tile(tile, img, icon_file, save_kwargs)
+                continue
+
+            while len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(_save_tile, tile, img, icon_file, save_kwargs))
+
+        if own_pending and pending:
+            for future in pending:
+                future.result()
+    return entries
+
+
+def main(input_path: Path, output_dir: Path, grid: Grid, workers: int = 4, image_format: str = 'png',
+         compress_level: int = 6, webp_lossless: bool = True, skip_empty: bool = False, trim: bool = False,
+         color_tolerance: int = 0, alpha_threshold: int = 0, write_manifest: bool = False, min_gap: int = 4):
+    """
+    分割单个文件或目录下的所有图像，逐张解码、检测网格并切分，整个目录只遍历一次
+    Args:
+        workers: 编码线程数，1为在主线程中依次编码
+        write_manifest: 是否在输出目录写出 manifest.jsonl（默认不写出），每行记录一个保留的小图
+        其余参数同 split_image_to_icons
+    """
     if input_path.is_file():
-        split_image_to_icons(input_path, output_dir, grid)
+        image_files = [input_path]
     elif input_path.is_dir():
+        image_files = []
         for ext in ['*.png', '*.jpg', '*.jpeg', '*.bmp']:
-            for img_file in input_path.glob(ext):
-                split_image_to_icons(img_file, output_dir, grid)
+            image_files.extend(input_path.glob(ext))
     else:
         print(f"输入路径 {input_path} 无效")
+        return
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = open(output_dir / 'manifest.jsonl', 'w', encoding='utf-8') if write_manifest else None
+    kept_tiles = 0
+    tile_options = dict(skip_empty=skip_empty, trim=trim, color_tolerance=color_tolerance,
+                        alpha_threshold=alpha_threshold, min_gap=min_gap)
+    # 多线程时所有图像共用一个线程池，在途任务数有上限，解码下一张图像与编码上一张图像的小图可以重叠进行
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = set()
+    try:
+        for img_file in image_files:
+            entries = split_image_to_icons(img_file, output_dir, grid, executor, image_format, compress_level,
+                                           webp_lossless, max_pending=workers * 4, pending=pending,
+                                           **tile_options)
+            kept_tiles += len(entries)
+            if manifest:
+                manifest.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        for future in pending:
+            future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if manifest:
+            manifest.close()
+
+    print(f"共处理 {len(image_files)} 张图像，输出 {kept_tiles} 个小图")
+
+
+def benchmark_split(grids=(2, 4, 8, 16), num_sheets=8, sheet_size=(1024, 1024), workers=4,
+                    image_format='png', compress_level=6):
+    """
+    基准测试：比较原逐块裁剪保存与线程池并行编码在不同网格下的吞吐量
+    Args:
+        grids: 需要测试的网格数
+        num_sheets: 生成的测试图像数量
+        sheet_size: 测试图像尺寸
+        workers: 并行编码的线程数
+        image_format: 输出格式
+        compress_level: PNG压缩级别
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="split_bench_"))
+    try:
+        input_dir = work_dir / "input"
+        input_dir.mkdir()
+        rng = np.random.default_rng(0)
+        width, height = sheet_size
+        for n in range(num_sheets):
+            # 带噪声的色块，接近实际图标的压缩难度
+            sheet = np.repeat(np.repeat(rng.integers(0, 256, (height // 32, width // 32, 4), dtype=np.uint8),
+                                        32, axis=0), 32, axis=1)
+            sheet ^= rng.integers(0, 8, sheet.shape, dtype=np.uint8)
+            Image.fromarray(sheet, 'RGBA').save(input_dir / f"sheet_{n:03d}.png")
+
+        print(f"基准测试: {num_sheets} 张 {width}x{height} 图像, 输出 {image_format}, 线程数 {workers}")
+        for grid in grids:
+            num_tiles = num_sheets * grid * grid
+
+            # 原实现：逐块 crop 后串行保存
+            output_dir = work_dir / f"serial_{grid}"
+            output_dir.mkdir()
+            start = time.perf_counter()
+            for sheet_file in sorted(input_dir.iterdir()):
+                img = Image.open(sheet_file)
+                icon_w, icon_h = img.width // grid, img.height // grid
+                for i in range(grid):
+                    for j in range(grid):
+                        box = (j * icon_w, i * icon_h, (j + 1) * icon_w, (i + 1) * icon_h)
+                        img.crop(box).save(output_dir / f"{sheet_file.stem}_{i}_{j}.png", format='PNG')
+            serial_time = time.perf_counter() - start
+
+            output_dir = work_dir / f"parallel_{grid}"
+            start = time.perf_counter()
+            main(input_dir, output_dir, grid, workers, image_format, compress_level)
+            parallel_time = time.perf_counter() - start
+
+            print(f"  grid={grid:<3} 小图数 {num_tiles:<5} 串行: {num_tiles / serial_time:.0f} 张/秒, "
+                  f"并行: {num_tiles / parallel_time:.0f} 张/秒, 加速比: {serial_time / parallel_time:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 
 if __name__ == '__main__':
     input_path = Path('./input/poses')
     output_dir = input_path / 'icons'
-    grid = 4  # 网格数N*N
-    main(input_path, output_dir, grid)
+    grid = 4  # 网格数N*N，也可以是 (行数, 列数) 或 'auto'（按图标间的空白分隔带自动切分）
+    workers = 4  # 编码线程数
+    image_format = 'png'  # 输出格式：'png' 或 'webp'
+    compress_level = 6  # PNG压缩级别 0-9，数值越小越快
+    skip_empty = False  # 设为True时跳过全透明或纯色的空白网格
+    trim = False  # 将小图裁剪到内容边界
+    write_manifest = False  # 在输出目录写出 manifest.jsonl，记录保留的小图及其在原图中的位置
+    main(input_path, output_dir, grid, workers, image_format, compress_level, skip_empty=skip_empty, trim=trim,
+         write_manifest=write_manifest)
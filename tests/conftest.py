@@ -0,0 +1,5 @@
+"""测试公共设置：脚本都在仓库根目录下，按模块名直接导入"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,70 @@
+"""ark_client 的回归测试，在本地模拟的 chat completions 服务上运行"""
+import threading
+
+import pytest
+
+import ark_client
+import text_correction_with_doubao as tc
+
+
+@pytest.fixture
+def counted_clients(monkeypatch):
+    """清空共享客户端，并记录 create_ark_client 的调用参数"""
+    monkeypatch.setattr(ark_client, '_clients', {})
+    created = []
+    create = ark_client.create_ark_client
+
+    def counting_create(*args):
+        created.append(args)
+        return create(*args)
+
+    monkeypatch.setattr(ark_client, 'create_ark_client', counting_create)
+    return created
+
+
+def test_ark_base_url():
+    """user-022：主机名按https访问，带协议的地址原样使用"""
+    assert ark_client.ark_base_url('ark.cn-beijing.volces.com') == 'https://ark.cn-beijing.volces.com/api/v3'
+    assert ark_client.ark_base_url('http://127.0.0.1:8000/') == 'http://127.0.0.1:8000/api/v3'
+
+
+def test_get_ark_client_is_shared_per_settings(counted_clients, monkeypatch):
+    """user-022：相同的主机、API key和连接参数共享一个客户端，并发首次调用也只创建一次"""
+    monkeypatch.setenv('ARK_API_KEY', 'env-key')
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def worker():
+        barrier.wait()
+        clients.append(ark_client.get_ark_client('http://127.0.0.1:1'))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in clients}) == 1
+    assert clients[0].api_key == 'env-key'
+    assert ark_client.get_ark_client('http://127.0.0.1:1', api_key='env-key') is clients[0]
+    assert ark_client.get_ark_client('http://127.0.0.1:1', api_key='other-key') is not clients[0]
+    assert ark_client.get_ark_client('http://127.0.0.1:2') is not clients[0]
+    assert len(counted_clients) == 3
+
+
+def test_doubao_requests_reuse_one_client(counted_clients, monkeypatch):
+    """user-022：多次、多线程调用模型只创建一个客户端"""
+    monkeypatch.setenv('ARK_API_KEY', 'mock-key')
+    server, api_host = ark_client.run_mock_ark_server(latency=0.01)
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(
+            tc.correct_text(f"第{i}段", "修正文本", 'mock-endpoint', api_host))) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+    assert sorted(results) == [f"第{i}段" for i in range(6)]
+    assert len(counted_clients) == 1
+    assert server.request_count == 6
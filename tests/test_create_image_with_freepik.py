@@ -0,0 +1,246 @@
+"""create_image_with_freepik 的回归测试，在本地模拟的 imagen3 服务上运行"""
+import json
+import logging
+import time
+from pathlib import Path
+
+import pytest
+
+import create_image_with_freepik as freepik
+
+
+@pytest.fixture
+def mock_server():
+    server = freepik.run_mock_server(latency=0.05)
+    yield server
+    server.shutdown()
+
+
+def _generator(server):
+    base_url = f"http://127.0.0.1:{server.server_port}/v1/ai/text-to-image/imagen3"
+    return freepik.FreepikImageGenerator(api_key='mock-api-key-0000', base_url=base_url, verbose=False)
+
+
+def test_resume_polls_submitted_tasks_without_resubmitting(tmp_path, mock_server):
+    """user-016：日志中已提交的批次恢复时只重新轮询并下载，不会再次提交"""
+    generator = _generator(mock_server)
+    journal_path = tmp_path / 'jobs.jsonl'
+    files = generator.generate_and_download_batch('cat', tmp_path / 'output', 6, max_concurrency=2,
+                                                  poll_interval=0.02, journal_path=journal_path)
+    assert len(files) == 6
+    tasks = mock_server.RequestHandlerClass.tasks
+    submitted = set(tasks)
+    assert len(submitted) == 2  # 每批最多4张
+
+    # 模拟提交后进程中断：日志只保留任务开始和提交记录，图片尚未下载
+    events = [json.loads(line) for line in journal_path.read_text(encoding='utf-8').splitlines()]
+    journal_path.write_text(''.join(json.dumps(event) + '\n' for event in events
+                                    if event['event'] in ('job_started', 'task_submitted')), encoding='utf-8')
+    for path in files:
+        path.unlink()
+
+    resumed = generator.resume(journal_path, poll_interval=0.02)
+    assert len(resumed) == 6
+    assert all(path.exists() for path in resumed)
+    assert set(tasks) == submitted
+    assert freepik.JobJournal(journal_path).pending_jobs() == {}
+    assert generator.resume(journal_path, poll_interval=0.02) == []
+
+
+def test_resume_submits_batches_missing_from_journal(tmp_path, mock_server):
+    """user-016：中断于提交之前的任务，恢复时补交所有批次"""
+    generator = _generator(mock_server)
+    journal = freepik.JobJournal(tmp_path / 'jobs.jsonl')
+    journal.start_job('dog', str(tmp_path / 'output'), 5, {})
+
+    resumed = generator.resume(journal.path, poll_interval=0.02)
+    assert len(resumed) == 5
+    assert len(mock_server.RequestHandlerClass.tasks) == 2
+    assert journal.pending_jobs() == {}
+
+
+def test_resume_rebuilds_manifest_results(tmp_path, mock_server):
+    """user-018：清单任务中断后 resume，results.jsonl 按日志补全恢复时下载的图片"""
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('id,prompt,num_images,style\ncat,a cat,2,photo|anime\ndog,a dog,1,\n', encoding='utf-8')
+    generator = _generator(mock_server)
+    journal_path = tmp_path / 'jobs.jsonl'
+    output_dir = tmp_path / 'output'
+    records = generator.run_manifest(manifest, output_dir, poll_interval=0.02, journal_path=journal_path)
+    assert [len(record['files']) for record in records] == [2, 2, 1]
+
+    # 模拟提交后进程中断：图片未下载，结果索引中还没有文件
+    events = [json.loads(line) for line in journal_path.read_text(encoding='utf-8').splitlines()]
+    journal_path.write_text(''.join(json.dumps(event) + '\n' for event in events
+                                    if event['event'] in ('job_started', 'task_submitted')), encoding='utf-8')
+    for record in records:
+        for path in record['files']:
+            Path(path).unlink()
+        record['files'] = []
+    index_path = output_dir / 'results.jsonl'
+    index_path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+
+    resumed = generator.resume(journal_path, poll_interval=0.02)
+    assert len(resumed) == 5
+    rebuilt = [json.loads(line) for line in index_path.read_text(encoding='utf-8').splitlines()]
+    assert [(record['id'], record['variant']) for record in rebuilt] == [('cat', 1), ('cat', 2), ('dog', 1)]
+    assert [len(record['files']) for record in rebuilt] == [2, 2, 1]
+    assert sorted(path for record in rebuilt for path in record['files']) == sorted(map(str, resumed))
+    for record in rebuilt:
+        assert all(Path(path).parent == Path(record['output_dir']) for path in record['files'])
+
+
+def test_load_manifest_rejects_duplicate_ids(tmp_path):
+    """user-018：清单中 id 重复（包括与自动生成的 row{行号} 重复）时报错，不会互相覆盖输出和日志"""
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('{"id": "a", "prompt": "x"}\n{"id": "a", "prompt": "y"}\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='id 重复'):
+        freepik.load_manifest(manifest)
+
+    manifest.write_text('{"prompt": "x"}\n{"id": "row0001", "prompt": "y"}\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='id 重复'):
+        freepik.load_manifest(manifest)
+
+    manifest.write_text('{"prompt": "x"}\n{"id": 7, "prompt": "y"}\n', encoding='utf-8')
+    assert [row['id'] for row in freepik.load_manifest(manifest)] == ['row0001', '7']
+
+
+class _CountingArg:
+    """记录被格式化次数的日志参数"""
+    formatted = 0
+
+    def __str__(self):
+        type(self).formatted += 1
+        return 'arg'
+
+
+def test_log_formats_message_only_in_verbose_mode(capsys, caplog):
+    """user-019：安静模式只输出JSON事件，不格式化 message；详细模式按 % 格式化打印"""
+    generator = freepik.FreepikImageGenerator(api_key='mock-api-key-0000', verbose=False)
+    arg = _CountingArg()
+    with caplog.at_level('DEBUG', logger='freepik'):
+        generator._log(logging.DEBUG, 'task_pending', "当前状态: %s，%.1f秒后重新检查...", arg, 1.25,
+                       status='IN_PROGRESS')
+    assert _CountingArg.formatted == 0
+    assert capsys.readouterr().out == ''
+    assert json.loads(caplog.records[-1].getMessage()) == {'event': 'task_pending', 'status': 'IN_PROGRESS'}
+
+    generator.verbose = True
+    generator._log(logging.DEBUG, 'task_pending', "当前状态: %s，%.1f秒后重新检查...", arg, 1.25)
+    generator._log(logging.INFO, 'no_images', "命中率 100%")
+    assert capsys.readouterr().out == "当前状态: arg，1.2秒后重新检查...\n命中率 100%\n"
+
+
+def test_batches_run_concurrently_and_keep_numbering(tmp_path):
+    """user-012：各批次并发提交、共用一个轮询循环，总耗时接近单个任务的耗时，文件按全局序号编号"""
+    server = freepik.run_mock_server(latency=0.5)
+    try:
+        generator = _generator(server)
+        start = time.perf_counter()
+        files = generator.generate_and_download_batch('cat', tmp_path / 'output', 10, max_concurrency=3,
+                                                      poll_interval=0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    assert len(files) == 10
+    assert elapsed < 1.2  # 依次执行3个批次至少需要1.5秒
+    assert sorted(task[1] for task in server.RequestHandlerClass.tasks.values()) == [2, 4, 4]
+    assert sorted(int(path.stem.rsplit('_', 1)[-1]) for path in files) == list(range(1, 11))
+    assert all(path.stat().st_size > 0 for path in files)
+
+
+def test_adaptive_poller_backs_off_and_learns_latency(tmp_path, monkeypatch):
+    """user-013：无历史时按已等待时长指数退避（有上限），有历史时首次查询安排在预期耗时的80%处，Retry-After优先"""
+    monkeypatch.setattr(freepik.random, 'uniform', lambda a, b: 1.0)
+    history = tmp_path / 'latency.json'
+    poller = freepik.AdaptivePoller(initial_interval=0.5, max_interval=4.0, growth=0.5, history_file=history)
+    key = freepik.AdaptivePoller.make_key(aspect_ratio='widescreen_16_9', style='anime', color='b&w')
+    assert key == 'widescreen_16_9|anime'
+    assert [poller.next_interval(key, elapsed) for elapsed in (0, 2, 6, 20)] == [0.5, 1.0, 3.0, 4.0]
+    assert poller.next_interval(key, 20, retry_after=1.5) == 1.5
+
+    poller.record(key, 10.0, polls=3)
+    poller.record(key, 20.0, polls=2)
+    assert poller.expected[key] == pytest.approx(13.0)
+    assert poller.next_interval(key, 0) == pytest.approx(0.8 * 13.0)
+    assert poller.next_interval(key, 11.0) == pytest.approx(0.5)
+    assert poller.next_interval(key, 14.4) == pytest.approx(2.0)
+    assert poller.next_interval('square_1_1|photo', 0) == 0.5
+
+    summary = poller.summary()
+    assert (summary['tasks'], summary['polls'], summary['retry_after_hits']) == (2, 5, 1)
+    assert freepik.AdaptivePoller(history_file=history).expected == {key: pytest.approx(13.0)}
+
+
+def test_wait_for_completion_polls_until_done(mock_server):
+    """user-013：wait_for_completion 在任务完成前持续查询，完成后记录耗时和轮询次数"""
+    generator = _generator(mock_server)
+    task_id = generator._extract_task_id(generator.create_image('cat', num_images=2))
+    result = generator.wait_for_completion(task_id, max_wait_time=5, poll_interval=0.01)
+    assert len(result['data']['generated']) == 2
+    summary = generator.poller.summary()
+    assert summary['tasks'] == 1
+    assert summary['polls'] >= 2
+    assert summary['time_to_first_result']['max'] >= 0.05
+
+
+def test_prompt_cache_key_normalizes_request():
+    """user-017：缓存键不含生成数量，提示词的多余空白和参数顺序不影响结果，其他参数不同则键不同"""
+    key = freepik.PromptCache.make_key({'prompt': 'a  red\ncat ', 'num_images': 4, 'aspect_ratio': 'square_1_1',
+                                        'styling': {'style': 'photo'}})
+    assert key == freepik.PromptCache.make_key({'styling': {'style': 'photo'}, 'aspect_ratio': 'square_1_1',
+                                                'prompt': 'a red cat', 'num_images': 1})
+    assert key != freepik.PromptCache.make_key({'prompt': 'a red cat', 'aspect_ratio': 'square_1_1',
+                                                'styling': {'style': 'anime'}})
+
+
+def test_generate_and_download_reuses_cached_images(tmp_path, mock_server):
+    """user-017：相同参数优先复用缓存图片，只为不足的数量提交任务；缓存索引跨实例保留"""
+    base_url = f"http://127.0.0.1:{mock_server.server_port}/v1/ai/text-to-image/imagen3"
+    cache_dir = tmp_path / 'cache'
+    tasks = mock_server.RequestHandlerClass.tasks
+
+    def generator():
+        return freepik.FreepikImageGenerator(api_key='mock-api-key-0000', base_url=base_url, verbose=False,
+                                             cache_dir=cache_dir)
+
+    first = generator()
+    assert len(first.generate_and_download('a cat', tmp_path / 'run1', 2, style='anime')) == 2
+    assert len(tasks) == 1
+    files = first.generate_and_download('a  cat', tmp_path / 'run2', 3, style='anime')
+    assert len(files) == 3
+    assert sum(path.name.startswith('freepik_imagen3_cached_') for path in files) == 2
+    assert sorted(task[1] for task in tasks.values()) == [1, 2]
+    assert first.cache.stats()['images_hit'] == 2
+
+    second = generator()
+    files = second.generate_and_download('a cat', tmp_path / 'nested' / 'run3', 3, style='anime')
+    assert len(files) == 3 and all(path.exists() for path in files)
+    assert len(tasks) == 2
+    second.generate_and_download('a cat', tmp_path / 'run4', 1, style='photo')
+    assert len(tasks) == 3
+    assert second.cache.stats()['hit_rate'] == pytest.approx(3 / 4)
+
+
+def test_prompt_cache_evicts_expired_and_least_recently_used(tmp_path, monkeypatch):
+    """user-017：过期图片在加载时删除，超出容量时按最近使用时间淘汰整组参数"""
+    now = [1000.0]
+    monkeypatch.setattr(freepik.time, 'time', lambda: now[0])
+    image = tmp_path / 'image.png'
+    image.write_bytes(b'\x00' * 400 * 1024)
+    cache = freepik.PromptCache(tmp_path / 'cache', max_size_mb=1, max_age_days=1)
+    cache.store('a' * 64, image)
+    now[0] += 10
+    cache.store('b' * 64, image)
+    now[0] += 10
+    cache.fetch('a' * 64, 1, tmp_path)  # a 最近使用过
+    now[0] += 10
+    cache.store('c' * 64, image)
+    assert sorted(key[0] for key in cache.entries) == ['a', 'c']
+    assert len(list((tmp_path / 'cache').glob('*.png'))) == 2
+    cache.save()
+
+    now[0] = 1000.0 + 86400 + 15  # a 创建于1000秒已过期，c 创建于1030秒仍有效
+    cache = freepik.PromptCache(tmp_path / 'cache', max_size_mb=1, max_age_days=1)
+    assert list(cache.entries) == ['c' * 64]
+    assert cache.total_bytes == 400 * 1024
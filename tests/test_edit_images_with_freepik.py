@@ -0,0 +1,145 @@
+"""edit_images_with_freepik 的回归测试，在本地模拟的去背景服务上运行"""
+import base64
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import edit_images_with_freepik as editor
+
+
+def _png_bytes(size=(8, 8), color=(255, 0, 0, 255)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class _RemoveBackgroundHandler(BaseHTTPRequestHandler):
+    """POST 记录请求体并返回结果地址，GET 返回结果图片"""
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.requests.append((self.headers.get('Content-Type', ''), body))
+        payload = json.dumps({'url': f"http://127.0.0.1:{self.server.server_port}/result.png"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        data = _png_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server():
+    handler = type('Handler', (_RemoveBackgroundHandler,), {'requests': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def _remover(server, **kwargs):
+    remover = editor.FreepikBackgroundRemover(api_key='mock-api-key-0000', **kwargs)
+    remover.base_url = f"http://127.0.0.1:{server.server_port}/v1/ai/beta/remove-background"
+    return remover
+
+
+def test_main_default_config_uploads_local_files(tmp_path, monkeypatch, mock_server):
+    """user-020：main() 的默认配置（未设置 IMAGE_BASE_URL）以base64直接上传，不再因配置错误退出"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FREEPIK_API_KEY', 'mock-api-key-0000')
+    init = editor.FreepikBackgroundRemover.__init__
+
+    def patched_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.base_url = f"http://127.0.0.1:{mock_server.server_port}/v1/ai/beta/remove-background"
+
+    monkeypatch.setattr(editor.FreepikBackgroundRemover, '__init__', patched_init)
+    (tmp_path / 'input_images').mkdir()
+    (tmp_path / 'input_images' / 'a.png').write_bytes(_png_bytes())
+
+    editor.main()
+
+    assert (tmp_path / 'output_images' / 'no_bg_a.png').stat().st_size > 0
+    content_type, body = mock_server.RequestHandlerClass.requests[0]
+    assert content_type == 'application/json'
+    assert base64.b64decode(json.loads(body)['image']) == _png_bytes()
+
+
+def test_process_directory_skips_finished_outputs(tmp_path, mock_server):
+    """user-020：已存在且非空的输出默认跳过，overwrite=True 时重新处理"""
+    input_dir, output_dir = tmp_path / 'input', tmp_path / 'output'
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for name in ('a.png', 'b.png', 'c.png'):
+        (input_dir / name).write_bytes(_png_bytes())
+    (output_dir / 'no_bg_a.png').write_bytes(b'done')
+    (output_dir / 'no_bg_b.png').write_bytes(b'')  # 空文件视为未完成
+
+    remover = _remover(mock_server, upload_mode='multipart', verbose=False)
+    summary = remover.process_directory(input_dir, output_dir, workers=2)
+    assert summary == {'total': 3, 'processed': 2, 'skipped': 1, 'failed': 0}
+    assert (output_dir / 'no_bg_a.png').read_bytes() == b'done'
+    assert len(mock_server.RequestHandlerClass.requests) == 2
+    assert all(content_type.startswith('multipart/form-data')
+               for content_type, _ in mock_server.RequestHandlerClass.requests)
+
+    summary = remover.process_directory(input_dir, output_dir, workers=2, overwrite=True)
+    assert summary['processed'] == 3
+    assert (output_dir / 'no_bg_a.png').read_bytes() == _png_bytes()
+
+
+def test_image_base_url_submits_relative_urls(tmp_path, mock_server):
+    """user-020：设置 image_base_url 时按 地址 + 相对路径 提交，不上传文件"""
+    input_dir = tmp_path / 'input'
+    (input_dir / 'sub').mkdir(parents=True)
+    (input_dir / 'sub' / 'a.png').write_bytes(_png_bytes())
+
+    remover = _remover(mock_server, verbose=False)
+    summary = remover.process_directory(input_dir, tmp_path / 'output', image_base_url='https://cdn.example.com/imgs/')
+    assert summary['processed'] == 1
+    content_type, body = mock_server.RequestHandlerClass.requests[0]
+    assert content_type == 'application/x-www-form-urlencoded'
+    assert body == b'image_url=https%3A%2F%2Fcdn.example.com%2Fimgs%2Fsub%2Fa.png'
+    assert remover.bytes_original == 0
+
+
+def test_without_base_url_or_upload_mode_raises(tmp_path):
+    """user-020：既未设置 image_base_url 也未开启 upload_mode 时报配置错误"""
+    remover = editor.FreepikBackgroundRemover(api_key='mock-api-key-0000', verbose=False)
+    with pytest.raises(ValueError):
+        remover.process_directory(tmp_path, tmp_path / 'output')
+    with pytest.raises(ValueError):
+        editor.FreepikBackgroundRemover(api_key='mock-api-key-0000', upload_mode='ftp')
+
+
+def test_prepare_upload_downscales_large_images(tmp_path):
+    """user-020：长边超过 max_upload_side 的图片等比缩小并重新编码，并统计上传数据量"""
+    remover = editor.FreepikBackgroundRemover(api_key='mock-api-key-0000', upload_mode='base64',
+                                              max_upload_side=100, verbose=False)
+    small = tmp_path / 'small.png'
+    small.write_bytes(_png_bytes((50, 20)))
+    assert remover._prepare_upload(small) == ('small.png', small.read_bytes(), 'image/png')
+
+    large = tmp_path / 'large.jpg'
+    Image.new('RGB', (400, 200), (0, 128, 255)).save(large, quality=95)
+    name, data, mime = remover._prepare_upload(large)
+    assert (name, mime) == ('large.jpg', 'image/jpeg')
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (100, 50)
+    assert remover.bytes_original == small.stat().st_size + large.stat().st_size
+    assert remover.bytes_uploaded == small.stat().st_size + len(data)
@@ -0,0 +1,231 @@
+"""freepik_client 的回归测试，限速器使用模拟时钟，不实际等待"""
+import io
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+import freepik_client
+
+
+class _FakeClock:
+    """代替 time 模块：sleep 只推进时间，和真实时钟一样至少推进一个最小刻度"""
+
+    EPOCH = 1_700_000_000.0
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.EPOCH + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-9)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(freepik_client, 'time', clock)
+    return clock
+
+
+def _response(status_code=200, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content, response._content_consumed = b'', True
+    response.headers.update({k.replace('_', '-'): v for k, v in headers.items()})
+    return response
+
+
+def test_parse_retry_after_seconds_and_http_date(clock):
+    """user-015：Retry-After 支持秒数和HTTP日期，无法解析时返回None"""
+    assert freepik_client.parse_retry_after('3') == 3.0
+    assert freepik_client.parse_retry_after('0.5') == 0.5
+    http_date = format_datetime(datetime.fromtimestamp(clock.time() + 30, tz=timezone.utc), usegmt=True)
+    assert freepik_client.parse_retry_after(http_date) == pytest.approx(30)
+    for value in (None, '', 'soon'):
+        assert freepik_client.parse_retry_after(value) is None
+
+
+def test_rate_limiter_allows_burst_then_paces(clock):
+    """user-015：先放行 burst 个请求，之后按 rate 个/秒发放令牌"""
+    limiter = freepik_client.RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert limiter.acquire() == pytest.approx(0.5)
+    clock.now += 10  # 空闲期间最多积累 burst 个令牌
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert limiter.stats()['acquired'] == 9
+
+
+def test_rate_limiter_backs_off_on_429_and_recovers(clock):
+    """user-015：429 按 Retry-After 暂停并降速，同一暂停期间只降速一次，成功请求逐步恢复速率"""
+    limiter = freepik_client.RateLimiter(rate=10, burst=10, backoff=0.5, recovery=0.1)
+    limiter.update(_response(429, Retry_After='2'))
+    limiter.update(_response(429, Retry_After='1'))
+    stats = limiter.stats()
+    assert stats['rate'] == 5
+    assert stats['throttled'] == 2
+    assert limiter.acquire() == pytest.approx(2 + 1 / 5)
+
+    limiter.update(_response(429))  # 没有 Retry-After 时暂停 1/rate 秒
+    assert limiter.rate == 2.5
+    assert limiter.acquire() == pytest.approx(1 / 2.5 + 1 / 2.5)
+
+    for _ in range(3):
+        limiter.update(_response(200))
+    assert limiter.rate == pytest.approx(5.5)
+    for _ in range(10):
+        limiter.update(_response(200))
+    assert limiter.rate == 10
+
+
+def test_rate_limiter_pauses_when_quota_is_exhausted(clock):
+    """user-015：RateLimit-Remaining 为0时暂停到 RateLimit-Reset（剩余秒数或Unix时间戳）"""
+    limiter = freepik_client.RateLimiter(rate=10, burst=10)
+    limiter.update(_response(200, RateLimit_Remaining='0', RateLimit_Reset='3'))
+    assert limiter.acquire() == pytest.approx(3 + 1 / 10)
+
+    limiter.update(_response(200, X_RateLimit_Remaining='0', X_RateLimit_Reset=str(clock.time() + 5)))
+    assert limiter.acquire() == pytest.approx(5 + 1 / 10)
+    limiter.update(_response(200, RateLimit_Remaining='1', RateLimit_Reset='60'))
+    assert limiter.stats()['quota_pauses'] == 2
+    assert limiter.stats()['rate'] == 10
+
+
+def test_send_request_retries_throttled_requests(clock):
+    """user-015：send_request 收到429后经限速器暂停再重试，重试次数用完时返回最后一次的429响应"""
+    class _Session:
+        def __init__(self, statuses):
+            self.statuses = list(statuses)
+
+        def request(self, method, url, **kwargs):
+            return _response(self.statuses.pop(0), Retry_After='1')
+
+    limiter = freepik_client.RateLimiter(rate=10, burst=10)
+    response = freepik_client.send_request(_Session([429, 429, 200]), 'GET', 'http://mock', rate_limiter=limiter)
+    assert response.status_code == 200
+    assert limiter.stats()['acquired'] == 3
+    assert sum(clock.sleeps) == pytest.approx((1 + 1 / 5) + (1 + 1 / 2.5))
+
+    response = freepik_client.send_request(_Session([429, 429]), 'GET', 'http://mock', max_throttle_retries=1)
+    assert response.status_code == 429
+
+
+class _DownloadHandler(BaseHTTPRequestHandler):
+    """/image 返回WebP数据，/truncated 在数据未发完时断开连接，其余路径返回404；记录客户端连接"""
+    protocol_version = 'HTTP/1.1'
+    body = bytes(range(256)) * 512
+    clients = set()
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        if self.path == '/image':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/webp')
+            self.send_header('Content-Length', str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+        elif self.path == '/truncated':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body[:1000])
+            self.close_connection = True
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def download_server():
+    handler = type('Handler', (_DownloadHandler,), {'clients': set()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_shared_session_is_reused_per_settings():
+    """user-014：相同参数共享同一个 Session，不同参数各自创建"""
+    session = freepik_client.get_shared_session(7, 2)
+    assert freepik_client.get_shared_session(7, 2) is session
+    assert freepik_client.get_shared_session(7, 3) is not session
+    assert session.get_adapter('https://api.freepik.com')._pool_maxsize == 7
+
+
+def test_download_file_streams_to_final_path_over_one_connection(tmp_path, download_server):
+    """user-014：流式下载按 content-type 补全扩展名，原子重命名，连接在多次下载间复用"""
+    session = freepik_client.create_session(pool_size=2)
+    base = f"http://127.0.0.1:{download_server.server_port}"
+    paths = [freepik_client.download_file(session, f"{base}/image", tmp_path / f"image_{i}", chunk_size=1000)
+             for i in range(5)]
+    assert [path.name for path in paths] == [f"image_{i}.webp" for i in range(5)]
+    assert all(path.read_bytes() == _DownloadHandler.body for path in paths)
+    assert freepik_client.download_file(session, f"{base}/image", tmp_path / 'keep.jpg').name == 'keep.jpg'
+    assert len(download_server.RequestHandlerClass.clients) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([p.name for p in paths] + ['keep.jpg'])
+
+
+def test_download_file_leaves_no_partial_file(tmp_path, download_server):
+    """user-014：下载失败（HTTP错误或连接中断）时不留下目标文件和临时文件"""
+    session = freepik_client.create_session(max_retries=0)
+    base = f"http://127.0.0.1:{download_server.server_port}"
+    with pytest.raises(requests.exceptions.HTTPError):
+        freepik_client.download_file(session, f"{base}/missing", tmp_path / 'missing.png')
+    with pytest.raises(requests.exceptions.RequestException):
+        freepik_client.download_file(session, f"{base}/truncated", tmp_path / 'truncated.png')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_phase_metrics_summary_and_histogram():
+    """user-019：按阶段汇总次数、平均值和分位数，直方图最后一个区间为超过最大上界的部分"""
+    metrics = freepik_client.PhaseMetrics()
+    for seconds in (0.05, 0.3, 0.3, 1.5, 200):
+        metrics.record('download', seconds)
+    summary = metrics.summary()['download']
+    assert summary == {'count': 5, 'mean': pytest.approx(40.43), 'p50': 0.3, 'p95': 200, 'max': 200}
+    assert [item for item in metrics.histogram('download', (0.1, 1, 10)) if item[1]] == [
+        ('<=0.1s', 1), ('<=1s', 2), ('<=10s', 1), ('>10s', 1)]
+    assert metrics.format_report().startswith('  download   次数     5')
+
+
+def test_log_event_is_lazy_and_single_line(monkeypatch):
+    """user-019：未启用的级别不序列化事件，启用时每个事件输出一行JSON"""
+    serialized = []
+    original = freepik_client._JsonEvent.__str__
+    monkeypatch.setattr(freepik_client._JsonEvent, '__str__', lambda self: serialized.append(1) or original(self))
+    stream = io.StringIO()
+    handlers, level, propagate = freepik_client.logger.handlers[:], freepik_client.logger.level, \
+        freepik_client.logger.propagate
+    try:
+        freepik_client.configure_json_logging(logging.INFO, stream)
+        freepik_client.log_event(logging.DEBUG, 'task_pending', task_id='t1')
+        assert serialized == []
+        freepik_client.log_event(logging.INFO, 'task_completed', task_id='t1', text='多行\n文本', path=Path('a.png'))
+    finally:
+        freepik_client.logger.handlers[:] = handlers
+        freepik_client.logger.setLevel(level)
+        freepik_client.logger.propagate = propagate
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1 and len(serialized) == 1
+    assert json.loads(lines[0].split(' INFO ', 1)[1]) == {'event': 'task_completed', 'task_id': 't1',
+                                                           'text': '多行\n文本', 'path': 'a.png'}
@@ -0,0 +1,360 @@
+"""removeBG_and_centerOJ 的回归测试，只使用颜色去除模式，不需要下载 rembg 模型"""
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import removeBG_and_centerOJ as rb
+
+
+def _make_image(path, size=(160, 120), box=(40, 30, 110, 90), color=(200, 80, 40)):
+    """黑色背景上画一个带圆形的色块，作为待处理的对象"""
+    image = Image.new('RGB', size, (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle(box, fill=color)
+    draw.ellipse((box[0] - 10, box[1] - 10, box[0] + 20, box[1] + 20), fill=(30, 160, 220))
+    image.save(path)
+
+
+def _make_images(directory, count=4):
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        _make_image(directory / f"image_{i}.png", box=(20 + i * 5, 15 + i * 3, 100 + i * 4, 80 + i * 2))
+
+
+def test_parallel_output_matches_serial(tmp_path):
+    """user-001：进程池并行处理的输出与串行处理逐字节相同"""
+    input_dir = tmp_path / 'input'
+    _make_images(input_dir)
+    options = dict(target_size=(128, 128), use_color_removal=True, target_color=(0, 0, 0), color_tolerance=30)
+
+    serial = rb.process_directory(input_dir, tmp_path / 'serial', workers=1, **options)
+    parallel = rb.process_directory(input_dir, tmp_path / 'parallel', workers=2, **options)
+
+    assert serial['processed'] == parallel['processed'] == 4
+    assert not serial['errors'] and not parallel['errors']
+    for serial_file in sorted((tmp_path / 'serial').iterdir()):
+        assert serial_file.read_bytes() == (tmp_path / 'parallel' / serial_file.name).read_bytes()
+
+
+def _pixels(path):
+    with Image.open(path) as image:
+        return image.size, image.mode, image.tobytes()
+
+
+@pytest.mark.parametrize('suffix', ['.bmp', '.tif', '.png'])
+@pytest.mark.parametrize('target_size, fit_mode, padding_ratio', [
+    (None, 'contain', 0.1),
+    ((96, 96), 'contain', 0.1),
+    ((200, 80), 'cover', 0.0),
+    ((61, 170), 'exact', 0.0),
+])
+def test_tiled_output_matches_full_image(tmp_path, suffix, target_size, fit_mode, padding_ratio):
+    """user-005：按条带处理的结果与整图处理相同，条带边界落在对象内部时也一样"""
+    input_file = tmp_path / f"input{suffix}"
+    _make_image(input_file, size=(150, 130), box=(25, 33, 120, 101))
+    options = dict(target_size=target_size, fit_mode=fit_mode, padding_ratio=padding_ratio,
+                   use_color_removal=True, target_color=(0, 0, 0), color_tolerance=30)
+
+    assert rb.remove_background_and_center(input_file, tmp_path / 'full.png', **options) is None
+    rb.remove_background_by_color_tiled_and_center(
+        input_file, tmp_path / 'tiled.png', target_color=(0, 0, 0), tolerance=30, target_size=target_size,
+        fit_mode=fit_mode, padding_ratio=padding_ratio, strip_height=16)
+    # 通过阈值从普通入口进入条带流程
+    assert rb.remove_background_and_center(input_file, tmp_path / 'routed.png', tiled_threshold_mp=0, **options) is None
+
+    expected = _pixels(tmp_path / 'full.png')
+    assert _pixels(tmp_path / 'tiled.png') == expected
+    assert _pixels(tmp_path / 'routed.png') == expected
+
+
+def test_tiled_output_without_object_matches_full_image(tmp_path):
+    """user-005：整幅图都是背景时，与整图处理一样输出全透明的画布"""
+    input_file = tmp_path / 'blank.bmp'
+    Image.new('RGB', (40, 30), (0, 0, 0)).save(input_file)
+    options = dict(target_color=(0, 0, 0), color_tolerance=30, use_color_removal=True)
+
+    rb.remove_background_and_center(input_file, tmp_path / 'full.png', (20, 20), **options)
+    rb.remove_background_and_center(input_file, tmp_path / 'tiled.png', (20, 20), tiled_threshold_mp=0, **options)
+    assert _pixels(tmp_path / 'tiled.png') == _pixels(tmp_path / 'full.png')
+
+
+@pytest.mark.parametrize('mode', ['corners', 'border'])
+def test_tiled_background_detection_samples_same_pixels(tmp_path, mode):
+    """user-005：条带模式的背景检测与整图采样相同的区域，左右两条边占多数时结果也一致"""
+    image = Image.new('RGB', (60, 400), (250, 250, 250))
+    ImageDraw.Draw(image).rectangle((0, 12, 59, 387), fill=(0, 0, 0))
+    ImageDraw.Draw(image).rectangle((20, 100, 40, 300), fill=(200, 80, 40))
+    input_file = tmp_path / 'input.bmp'
+    image.save(input_file)
+
+    with Image.open(input_file) as full_image:
+        expected = rb.auto_detect_background_color(full_image, mode=mode, return_confidence=True)
+    with Image.open(input_file) as tiled_image:
+        assert rb._auto_detect_background_color_tiled(tiled_image, mode=mode, strip_height=32) == expected
+    if mode == 'border':
+        assert expected[0] == (0, 0, 0)
+
+    options = dict(target_size=(64, 64), use_color_removal=True, auto_detect_bg=mode)
+    rb.remove_background_and_center(input_file, tmp_path / 'full.png', **options)
+    rb.remove_background_and_center(input_file, tmp_path / 'tiled.png', tiled_threshold_mp=0, **options)
+    assert _pixels(tmp_path / 'tiled.png') == _pixels(tmp_path / 'full.png')
+
+
+def test_png_stream_writer_removes_partial_file(tmp_path):
+    """user-005：写入中途出错时不留下不完整的PNG"""
+    output_file = tmp_path / 'partial.png'
+    with pytest.raises(RuntimeError):
+        with rb._PngStreamWriter(output_file, 4, 4) as writer:
+            writer.write_rows(np.zeros((2, 4, 4), dtype=np.uint8))
+            raise RuntimeError('interrupted')
+    assert not output_file.exists()
+
+
+def test_result_cache_key_depends_on_content_and_options(tmp_path):
+    """user-007：缓存键随输入内容和处理参数变化，与文件名和线程数无关"""
+    first, second = tmp_path / 'a.png', tmp_path / 'b.png'
+    _make_image(first)
+    second.write_bytes(first.read_bytes())
+    options = dict(target_size=(64, 64), use_color_removal=True, model_name='u2net', num_threads=1)
+
+    key = rb.ResultCache.make_key(first, options)
+    assert rb.ResultCache.make_key(second, options) == key
+    assert rb.ResultCache.make_key(first, {**options, 'num_threads': 4}) == key
+    assert rb.ResultCache.make_key(first, {**options, 'model_name': 'u2netp'}) == key
+    assert rb.ResultCache.make_key(first, {**options, 'target_size': (32, 32)}) != key
+
+    _make_image(second, color=(10, 200, 10))
+    assert rb.ResultCache.make_key(second, options) != key
+
+
+def test_result_cache_hit_miss_and_eviction(tmp_path):
+    """user-007：命中时复制缓存结果，超出容量时淘汰最久未使用的条目，索引重新加载后仍可命中"""
+    result = tmp_path / 'result.bin'
+    result.write_bytes(b'x' * 400 * 1024)
+    cache = rb.ResultCache(tmp_path / 'cache', max_size_mb=1)
+
+    assert not cache.fetch('a', tmp_path / 'out_a.bin')
+    cache.store('a', result)
+    cache.store('b', result)
+    assert cache.fetch('a', tmp_path / 'out_a.bin')
+    assert (tmp_path / 'out_a.bin').read_bytes() == result.read_bytes()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 第三个条目超出1MB上限，淘汰最久未使用的 b
+    cache.store('c', result)
+    assert set(cache.entries) == {'a', 'c'}
+    assert not (tmp_path / 'cache' / 'b.png').exists()
+    assert cache.total_bytes <= cache.max_bytes
+    cache.save()
+
+    reloaded = rb.ResultCache(tmp_path / 'cache', max_size_mb=1)
+    assert reloaded.fetch('c', tmp_path / 'out_c.bin')
+    assert not reloaded.fetch('b', tmp_path / 'out_b.bin')
+
+
+def test_process_directory_reuses_cached_results(tmp_path):
+    """user-007：第二次处理相同内容时全部命中缓存，删除输出后也能从缓存恢复"""
+    input_dir = tmp_path / 'input'
+    _make_images(input_dir, count=3)
+    options = dict(target_size=(64, 64), use_color_removal=True, target_color=(0, 0, 0),
+                   cache_dir=tmp_path / 'cache')
+
+    first = rb.process_directory(input_dir, tmp_path / 'output', **options)
+    assert (first['processed'], first['cache_hits']) == (3, 0)
+    expected = {path.name: path.read_bytes() for path in (tmp_path / 'output').iterdir()}
+
+    for path in (tmp_path / 'output').iterdir():
+        path.unlink()
+    second = rb.process_directory(input_dir, tmp_path / 'output', **options)
+    assert (second['processed'], second['cache_hits']) == (0, 3)
+    assert {path.name: path.read_bytes() for path in (tmp_path / 'output').iterdir()} == expected
+
+
+def _reference_bounds(alpha, threshold):
+    rows, cols = np.nonzero(alpha > threshold)
+    if rows.size == 0:
+        return 0, 0, alpha.shape[1], alpha.shape[0]
+    return int(cols.min()), int(rows.min()), int(cols.max()) + 1, int(rows.max()) + 1
+
+
+@pytest.mark.parametrize('threshold', [0, 1, 10, 128, 254])
+def test_find_object_bounds_matches_reference(threshold):
+    """user-006：各阈值下的边界与按像素比较的结果一致，没有对象时返回整幅图像"""
+    rng = np.random.default_rng(threshold)
+    for _ in range(30):
+        height, width = rng.integers(1, 50, size=2)
+        rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        for _ in range(rng.integers(0, 4)):
+            rgba[rng.integers(0, height), rng.integers(0, width), 3] = rng.integers(1, 256)
+        image = Image.fromarray(rgba, 'RGBA')
+        assert tuple(int(v) for v in rb.find_object_bounds(image, threshold)) == \
+            _reference_bounds(rgba[:, :, 3], threshold)
+
+
+def test_find_object_bounds_without_alpha_is_whole_image():
+    """user-006：没有alpha通道的图像整幅都是对象"""
+    assert rb.find_object_bounds(Image.new('RGB', (7, 5))) == (0, 0, 7, 5)
+    assert rb.find_object_bounds(Image.new('RGBA', (7, 5)), threshold=10) == (0, 0, 7, 5)
+
+
+class _FakeInnerSession:
+    """代替 ONNX 会话：每张图像的输出只取决于自身的输入张量，并记录每次推理的batch大小"""
+
+    def __init__(self, batch_dim):
+        self.batch_dim = batch_dim
+        self.batch_sizes = []
+
+    def get_inputs(self):
+        class _Input:
+            name = 'input.1'
+            shape = [self.batch_dim, 3, 320, 320]
+        return [_Input()]
+
+    def run(self, output_names, feed):
+        tensor = feed['input.1']
+        self.batch_sizes.append(tensor.shape[0])
+        return [tensor.mean(axis=1, keepdims=True) * tensor[:, :1]]
+
+
+def _fake_engine(batch_dim):
+    """不加载模型的 u2net 引擎，预处理和后处理仍使用 rembg 的实现"""
+    session = object.__new__(rb.sessions_class[[sc.name() for sc in rb.sessions_class].index('u2net')])
+    session.inner_session = _FakeInnerSession(batch_dim)
+    engine = object.__new__(rb.BackgroundRemovalEngine)
+    engine.model_name = 'u2net'
+    engine.num_threads = None
+    engine.session = session
+    return engine
+
+
+def _batch_inputs():
+    rng = np.random.default_rng(3)
+    return [Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+            for h, w in ((60, 80), (90, 50), (64, 64), (33, 120), (70, 70))]
+
+
+def test_remove_batch_matches_single_image_removal():
+    """user-003：动态batch维度的模型按 batch_size 分批推理，结果与逐张 remove 相同"""
+    engine = _fake_engine('batch_size')
+    assert engine.supports_batch()
+    images = _batch_inputs()
+    batched = engine.remove_batch(images, batch_size=2)
+    assert engine.session.inner_session.batch_sizes == [2, 2, 1]
+
+    single = [engine.remove(image) for image in images]
+    assert [image.size for image in batched] == [image.size for image in images]
+    for result, expected in zip(batched, single):
+        assert result.mode == 'RGBA'
+        assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+
+def test_remove_batch_falls_back_for_fixed_batch_models():
+    """user-003：输入batch维度固定的模型不支持批量推理，逐张调用 remove"""
+    engine = _fake_engine(1)
+    assert not engine.supports_batch()
+    images = _batch_inputs()
+    results = engine.remove_batch(images, batch_size=4)
+    assert engine.session.inner_session.batch_sizes == [1] * len(images)
+
+    expected = _fake_engine('batch_size').remove_batch(images, batch_size=4)
+    for result, reference in zip(results, expected):
+        assert np.array_equal(np.asarray(result), np.asarray(reference))
+
+
+class _ColorEngine:
+    """代替AI引擎：按黑色背景去除，记录创建次数"""
+    created = []
+
+    def __init__(self, model_name='u2net', num_threads=None):
+        self.created.append((model_name, num_threads))
+
+    def remove(self, image):
+        return rb.remove_background_by_color(image, (0, 0, 0), 30)
+
+    def remove_batch(self, images, batch_size=8):
+        return [self.remove(image) for image in images]
+
+
+@pytest.fixture
+def color_engine(monkeypatch):
+    monkeypatch.setattr(rb, 'BackgroundRemovalEngine', type('Engine', (_ColorEngine,), {'created': []}))
+    monkeypatch.setattr(rb, '_engines', {})
+    return rb.BackgroundRemovalEngine
+
+
+def test_engine_is_created_once_per_model(color_engine):
+    """user-002：同一进程内按 (模型, 线程数) 复用引擎，模型只加载一次"""
+    engine = rb.get_background_removal_engine('u2netp', 2)
+    assert rb.get_background_removal_engine('u2netp', 2) is engine
+    assert rb.get_background_removal_engine('u2netp') is not engine
+    assert color_engine.created == [('u2netp', 2), ('u2netp', None)]
+
+
+def test_ai_directory_processing_reuses_one_engine(tmp_path, color_engine):
+    """user-002：AI去除模式处理整个目录只创建一个引擎，批量推理与逐张处理的输出相同"""
+    input_dir = tmp_path / 'input'
+    _make_images(input_dir, count=5)
+    options = dict(target_size=(96, 96), model_name='u2netp')
+
+    serial = rb.process_directory(input_dir, tmp_path / 'serial', **options)
+    batched = rb.process_directory(input_dir, tmp_path / 'batched', batch_size=2, **options)
+    assert serial['processed'] == batched['processed'] == 5
+    assert color_engine.created == [('u2netp', None)]
+    for serial_file in sorted((tmp_path / 'serial').iterdir()):
+        assert serial_file.read_bytes() == (tmp_path / 'batched' / serial_file.name).read_bytes()
+
+
+@pytest.mark.parametrize('tolerance', [0, 1, 30, 120])
+@pytest.mark.parametrize('edge_smooth', [True, False])
+def test_color_removal_matches_legacy_kernel(tolerance, edge_smooth):
+    """user-004：单次遍历的颜色去除与原 float64 实现一致（渐变区只允许浮点舍入造成的1级差异）"""
+    rng = np.random.default_rng(tolerance)
+    image = Image.fromarray(rng.integers(0, 256, (64, 96, 3), dtype=np.uint8))
+    target_color = (40, 200, 90)
+    result = np.asarray(rb.remove_background_by_color(image, target_color, tolerance, edge_smooth))
+    expected = np.asarray(rb._legacy_remove_background_by_color(image, target_color, tolerance, edge_smooth))
+    assert np.array_equal(result[:, :, :3], expected[:, :, :3])
+    diff = np.abs(result[:, :, 3].astype(np.int16) - expected[:, :, 3])
+    if edge_smooth and tolerance > 0:
+        assert diff.max() <= 1
+    else:
+        assert diff.max() == 0
+
+
+def _noisy_background(seed, size=(120, 90)):
+    """每个角落以一种颜色为主、夹杂随机噪点的图像"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    array = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    half_w, half_h = width // 2, height // 2
+    for k, (rows, cols) in enumerate([(slice(0, half_h), slice(0, half_w)), (slice(0, half_h), slice(half_w, None)),
+                                      (slice(half_h, None), slice(0, half_w)),
+                                      (slice(half_h, None), slice(half_w, None))]):
+        block = array[rows, cols]
+        keep = rng.random(block.shape[:2]) < 0.6
+        block[keep] = (10 * k + seed % 7, 200 - 20 * k, 30 + 5 * k)
+    return Image.fromarray(array)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_background_detection_matches_getcolors(seed):
+    """user-008：向量化的背景检测与原 getcolors 实现结果相同，置信度为采样中接近背景色的像素比例"""
+    image = _noisy_background(seed)
+    regions = rb._background_sample_regions(image.size, 20, 'corners')
+    corner_colors = [max(image.crop(region).getcolors(maxcolors=400))[1] for region in regions]
+    expected = tuple(sum(c[i] for c in corner_colors) // 4 for i in range(3))
+    color, confidence = rb.auto_detect_background_color(image, sample_size=20, return_confidence=True,
+                                                       confidence_tolerance=10)
+    assert color == expected == rb.auto_detect_background_color(image, sample_size=20)
+
+    pixels = np.concatenate([np.asarray(image.crop(region)).reshape(-1, 3) for region in regions]).astype(int)
+    close = ((pixels - np.array(color)) ** 2).sum(axis=1) <= 100
+    assert confidence == pytest.approx(close.mean())
+
+    border_regions = rb._background_sample_regions(image.size, 20, 'border')
+    counts = {}
+    for region in border_regions:
+        crop = image.crop(region)
+        for count, pixel in crop.getcolors(maxcolors=crop.width * crop.height):
+            counts[pixel] = counts.get(pixel, 0) + count
+    assert rb.auto_detect_background_color(image, sample_size=20, mode='border') == max(counts, key=counts.get)
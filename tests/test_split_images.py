@@ -0,0 +1,125 @@
+"""split_images 的回归测试"""
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import split_images
+
+
+def _sheet(tmp_path, name='sheet.png'):
+    """2x2 网格的RGBA图像：左上、右下有方块，其余两格全透明"""
+    array = np.zeros((40, 40, 4), dtype=np.uint8)
+    array[5:15, 4:12] = (255, 0, 0, 255)
+    array[25:33, 22:38] = (0, 0, 255, 255)
+    path = tmp_path / name
+    Image.fromarray(array, 'RGBA').save(path)
+    return path
+
+
+def test_manifest_is_opt_in(tmp_path):
+    """user-010：默认不写出 manifest.jsonl，write_manifest=True 时每行记录一个保留的小图"""
+    path = _sheet(tmp_path)
+    main_dir = tmp_path / 'default'
+    split_images.main(path, main_dir, 2, workers=1)
+    assert sorted(p.name for p in main_dir.iterdir()) == [f"sheet_{i}_{j}.png" for i in range(2) for j in range(2)]
+
+    manifest_dir = tmp_path / 'manifest'
+    split_images.main(path, manifest_dir, 2, workers=2, skip_empty=True, write_manifest=True)
+    entries = [json.loads(line) for line in (manifest_dir / 'manifest.jsonl').read_text(encoding='utf-8').splitlines()]
+    assert [(entry['row'], entry['col'], entry['box']) for entry in entries] == [(0, 0, [0, 0, 20, 20]),
+                                                                                (1, 1, [20, 20, 40, 40])]
+    assert all((manifest_dir / entry['file']).exists() for entry in entries)
+
+
+def test_skip_empty_and_trim(tmp_path):
+    """user-010：跳过全透明的小图，trim 时裁剪到内容边界且像素与原图一致"""
+    path = _sheet(tmp_path)
+    entries = split_images.split_image_to_icons(path, tmp_path / 'out', 2, skip_empty=True, trim=True)
+    assert [(entry['row'], entry['col'], entry['box']) for entry in entries] == [(0, 0, [4, 5, 12, 15]),
+                                                                                (1, 1, [22, 25, 38, 33])]
+    with Image.open(path) as sheet:
+        for entry in entries:
+            with Image.open(tmp_path / 'out' / entry['file']) as tile:
+                assert np.array_equal(np.asarray(tile), np.asarray(sheet.crop(tuple(entry['box']))))
+
+
+def test_find_empty_tiles_uses_color_tolerance():
+    """user-010：无alpha通道时，各通道取值范围不超过 color_tolerance 的小图视为纯色"""
+    array = np.full((20, 20, 3), 200, dtype=np.uint8)
+    array[:10, :10] += np.arange(10, dtype=np.uint8)[:, None, None]  # 左上格有 0-9 的起伏
+    bounds = split_images.split_evenly(20, 2)
+    assert split_images.find_empty_tiles(array, bounds, bounds, False, color_tolerance=9).all()
+    empty = split_images.find_empty_tiles(array, bounds, bounds, False, color_tolerance=8)
+    assert empty.tolist() == [[False, True], [True, True]]
+
+
+def test_rectangular_grid_keeps_edge_pixels():
+    """user-011：(行数, 列数) 网格把余数像素分摊到各段，不丢弃边缘像素"""
+    rows, cols = split_images.resolve_grid_bounds((3, 2), width=11, height=10)
+    assert rows == [(0, 3), (3, 6), (6, 10)]
+    assert cols == [(0, 5), (5, 11)]
+
+
+def test_auto_grid_cuts_in_the_middle_of_gaps(tmp_path):
+    """user-011：自动检测在空白分隔带中线处切分，窄于 min_gap 的空隙不切分"""
+    array = np.zeros((30, 50, 4), dtype=np.uint8)
+    array[2:10, 2:10, 3] = 255
+    array[2:10, 12:18, 3] = 255  # 与左侧方块只隔2像素，属于同一个图标
+    array[20:28, 30:45, 3] = 255
+    rows, cols = split_images.detect_grid_bounds(array, has_alpha=True, min_gap=4)
+    assert rows == [(0, 15), (15, 30)]
+    assert cols == [(0, 24), (24, 50)]
+
+    path = tmp_path / 'auto.png'
+    Image.fromarray(array, 'RGBA').save(path)
+    entries = split_images.split_image_to_icons(path, tmp_path / 'out', 'auto', skip_empty=True)
+    assert [entry['box'] for entry in entries] == [[0, 0, 24, 15], [24, 15, 50, 30]]
+
+
+def _palette_sheet(path):
+    array = (np.arange(30 * 45).reshape(30, 45) % 7).astype(np.uint8)
+    image = Image.fromarray(array, 'L').convert('P')
+    image.putpalette([v for i in range(256) for v in (i * 30 % 256, i * 70 % 256, i * 110 % 256)])
+    image.save(path)
+
+
+@pytest.mark.parametrize('mode', ['RGBA', 'RGB', 'LA', 'P', 'I;16'])
+def test_tiles_match_crop_of_source(tmp_path, mode):
+    """user-009：numpy视图切出的小图（线程池编码）与原图逐块 crop 的像素一致，调色板模式保留调色板"""
+    path = tmp_path / f"sheet_{mode.replace(';', '')}.png"
+    if mode == 'P':
+        _palette_sheet(path)
+    else:
+        rng = np.random.default_rng(1)
+        image = Image.fromarray(rng.integers(0, 256, (30, 45, 4), dtype=np.uint8), 'RGBA')
+        if mode == 'I;16':  # 不能直接转为numpy视图的模式按区域裁剪
+            image = Image.fromarray(rng.integers(0, 65536, (30, 45), dtype=np.uint16))
+        image.convert(mode).save(path)
+
+    output_dir = tmp_path / 'tiles'
+    split_images.main(path, output_dir, (2, 3), workers=3)
+    with Image.open(path) as sheet:
+        sheet.load()
+        rows, cols = split_images.split_evenly(30, 2), split_images.split_evenly(45, 3)
+        for i, (upper, lower) in enumerate(rows):
+            for j, (left, right) in enumerate(cols):
+                expected = sheet.crop((left, upper, right, lower))
+                with Image.open(output_dir / f"{path.stem}_{i}_{j}.png") as tile:
+                    assert tile.size == expected.size
+                    assert tile.mode == expected.mode
+                    assert np.array_equal(np.asarray(tile), np.asarray(expected))
+                    assert tile.getpalette() == expected.getpalette()
+
+
+def test_webp_output(tmp_path):
+    """user-009：WebP无损输出与PNG输出的像素一致"""
+    path = _sheet(tmp_path)
+    split_images.main(path, tmp_path / 'png', 2, workers=2)
+    split_images.main(path, tmp_path / 'webp', 2, workers=2, image_format='webp')
+    for i in range(2):
+        for j in range(2):
+            with Image.open(tmp_path / 'png' / f"sheet_{i}_{j}.png") as png, \
+                    Image.open(tmp_path / 'webp' / f"sheet_{i}_{j}.webp") as webp:
+                assert np.array_equal(np.asarray(png), np.asarray(webp))
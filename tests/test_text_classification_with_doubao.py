@@ -0,0 +1,176 @@
+"""text_classification_with_doubao 的回归测试"""
+import json
+import threading
+import time
+
+import pytest
+
+import text_classification_with_doubao as tcl
+from ark_client import run_mock_ark_server
+
+CATEGORIES = ["Github项目", "书籍推荐", "其他"]
+SYSTEM_MESSAGE = "可能的类别包括：Github项目、书籍推荐、其他；请只输出类别，不要输出其他内容。"
+
+
+def test_extract_categories():
+    """user-023：从分类规则中解析类别列表，找不到时提示通过参数指定"""
+    assert tcl.extract_categories(SYSTEM_MESSAGE) == CATEGORIES
+    assert tcl.extract_categories("类别包括: A, B，C。") == ["A", "B", "C"]
+    with pytest.raises(ValueError):
+        tcl.extract_categories("请判断文本的类别")
+
+
+def test_parse_batch_response_keeps_only_valid_lines():
+    """user-023：只保留编号在范围内、类别合法的行，重复编号取第一次出现的结果"""
+    response = "\n".join([
+        "1. Github项目",
+        "2、**书籍推荐**",
+        "3：新类别",
+        "4) “其他”",
+        "4. 书籍推荐",
+        "9. 其他",
+        "0. 其他",
+        "说明：以上为分类结果",
+    ])
+    assert tcl.parse_batch_response(response, 5, CATEGORIES) == {0: "Github项目", 1: "书籍推荐", 3: "其他"}
+
+
+def test_make_batches_respects_count_and_char_limits():
+    """user-023：按条数和字符数上限分批，单条超长的笔记单独成批"""
+    notes = ["a" * 10, "b" * 10, "c" * 50, "d" * 10, "e" * 10, "f" * 10]
+    assert list(tcl.make_batches(range(6), notes, batch_size=2, max_batch_chars=40)) == [[0, 1], [2], [3, 4], [5]]
+
+
+def test_per_note_fallback_validates_labels_and_isolates_failures(tmp_path, monkeypatch):
+    """user-023：逐条判断的结果同样校验类别，不合法的记为“其他”，单条请求失败只影响该笔记"""
+    replies = {"a": "“书籍推荐”", "b": "新类别", "d": "Github项目\n"}
+
+    def decide_category(system_message, note):
+        if note == "c":
+            raise ConnectionError("mock failure")
+        return replies[note]
+
+    monkeypatch.setattr(tcl, "decide_categories_batch", lambda *args: {})
+    monkeypatch.setattr(tcl, "decide_category", decide_category)
+    notes = ["a", "b", "c", "d"]
+    assert tcl.classify_notes_in_batches(notes, SYSTEM_MESSAGE, max_retries=0, verbose=False) == \
+        ["书籍推荐", "其他", None, "Github项目"]
+
+    results_file = tmp_path / "results.jsonl"
+    summary = tcl.classify_notes_concurrently(notes, SYSTEM_MESSAGE, results_file, batch_size=4)
+    assert (summary["completed"], summary["failed"]) == (3, 1)
+    assert sorted(tcl.load_results(results_file, notes)) == [0, 1, 3]
+
+
+def test_batch_classification_matches_single_requests(monkeypatch):
+    """user-023：批量分类的结果与逐条分类一致，漏掉的笔记重发后补齐"""
+    monkeypatch.setenv("ARK_API_KEY", "mock-key")
+    server, api_host = run_mock_ark_server(latency=0, responder=tcl._mock_classifier)
+    monkeypatch.setattr(tcl, "api_host", api_host)
+    notes = tcl._mock_notes(90, seed=3)
+    try:
+        batched = tcl.classify_notes_in_batches(notes, SYSTEM_MESSAGE, batch_size=30, verbose=False)
+        single = [tcl.decide_category(SYSTEM_MESSAGE, note).strip() for note in notes]
+    finally:
+        server.shutdown()
+    assert batched == single
+
+
+def _labeled(count, seed):
+    notes = tcl._mock_notes(count, seed=seed)
+    return notes, [tcl._mock_classifier({"messages": [{"content": note}]}) for note in notes]
+
+
+def test_pre_classifier_thresholds():
+    """user-025：相似度和领先幅度都达到阈值时才本地判定，恰好等于阈值时判定"""
+    texts, labels = _labeled(300, seed=1)
+    classifier = tcl.LocalPreClassifier().fit(texts, labels)
+    note = "https://github.com/模型12/repo 开源推理工具项目"
+    label, score, margin = classifier.predict(note)
+    assert label == "Github项目" and 0 < margin <= score <= 1
+
+    classifier.min_score, classifier.min_margin = score, margin
+    assert classifier.decide(note) == label
+    classifier.min_score = score + 1e-6
+    assert classifier.decide(note) is None
+    classifier.min_score, classifier.min_margin = score, margin + 1e-6
+    assert classifier.decide(note) is None
+
+    # 没有任何已知特征的文本交给模型
+    assert classifier.predict("###") == (None, 0.0, 0.0)
+    assert classifier.decide("###") is None
+
+
+def test_pre_classifier_ignores_rare_categories():
+    """user-025：已分类笔记少于 min_samples 条的类别不参与本地判定"""
+    texts = ["推荐阅读《模型》", "推荐阅读《推理》", "推荐阅读《效率》", "https://github.com/a/repo"]
+    labels = ["书籍推荐", "书籍推荐", "书籍推荐", "Github项目"]
+    classifier = tcl.LocalPreClassifier(min_samples=3).fit(texts, labels)
+    assert classifier.labels == ["书籍推荐"]
+    assert classifier.predict("https://github.com/a/repo")[0] != "Github项目"
+
+
+def test_pre_classifier_only_sends_uncertain_notes_to_model(tmp_path, monkeypatch):
+    """user-025：本地判定的笔记不再请求模型，且不会作为下次训练的数据"""
+    monkeypatch.setenv("ARK_API_KEY", "mock-key")
+    server, api_host = run_mock_ark_server(latency=0, responder=tcl._mock_classifier)
+    monkeypatch.setattr(tcl, "api_host", api_host)
+    texts, labels = _labeled(500, seed=1)
+    notes = tcl._mock_notes(200, seed=2)
+    results_file = tmp_path / "results.jsonl"
+    monkeypatch.setattr(tcl, "usage_stats", {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    try:
+        summary = tcl.classify_notes_concurrently(notes, SYSTEM_MESSAGE, results_file, max_in_flight=4,
+                                                  pre_classifier=tcl.LocalPreClassifier().fit(texts, labels))
+    finally:
+        server.shutdown()
+
+    assert summary["completed"] == len(notes) and summary["failed"] == 0
+    assert 0 < summary["local"] < len(notes)
+    assert tcl.usage_stats["requests"] == len(notes) - summary["local"]
+    records = tcl.load_results(results_file, notes)
+    assert sorted(records) == list(range(len(notes)))
+    assert sum(record["source"] == "local" for record in records.values()) == summary["local"]
+    relabeled, _ = tcl.load_labeled_notes([results_file])
+    assert len(relabeled) <= len(notes) - summary["local"]
+
+
+def test_concurrent_classification_bounds_requests_and_resumes(tmp_path, monkeypatch):
+    """user-024：同时进行的请求不超过 max_in_flight，结果逐条写入JSONL，重新运行时跳过已有结果"""
+    lock = threading.Lock()
+    active, peak, calls = [0], [0], []
+
+    def decide_category(system_message, note):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            calls.append(note)
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        if note == "n5":
+            raise ConnectionError("mock failure")
+        return f" {CATEGORIES[int(note[1:]) % 3]}\n"
+
+    monkeypatch.setattr(tcl, "decide_category", decide_category)
+    notes = [f"n{i}" for i in range(12)]
+    results_file = tmp_path / "nested" / "results.jsonl"
+    summary = tcl.classify_notes_concurrently(notes, SYSTEM_MESSAGE, results_file, max_in_flight=3)
+    assert summary == {"completed": 11, "skipped": 0, "failed": 1, "local": 0}
+    assert peak[0] == 3
+    records = tcl.load_results(results_file, notes)
+    assert sorted(records) == [i for i in range(12) if i != 5]
+    assert all(record["category"] == CATEGORIES[i % 3] and record["source"] == "llm" for i, record in records.items())
+
+    # 中断时留下的不完整行和与当前笔记不一致的记录被忽略
+    with open(results_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"index": 5, "category": "其他", "note": "旧内容"}, ensure_ascii=False) + "\n")
+        f.write('{"index": 6, "categ')
+    calls.clear()
+    summary = tcl.classify_notes_concurrently(notes, SYSTEM_MESSAGE, results_file, max_in_flight=3)
+    assert (summary["skipped"], summary["failed"]) == (11, 1)
+    assert calls == ["n5"]
+
+    report = tcl.write_report(results_file, tmp_path / "report.md", notes)
+    assert report == {category: [f"n{i}" for i in range(12) if i % 3 == k and i != 5]
+                      for k, category in enumerate(CATEGORIES)}
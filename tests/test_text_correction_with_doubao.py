@@ -0,0 +1,78 @@
+"""text_correction_with_doubao 的回归测试，在本地模拟的 Ark 服务上运行"""
+import itertools
+import os
+import re
+import time
+
+import pytest
+
+import text_correction_with_doubao as tc
+from ark_client import run_mock_ark_server
+
+
+def _slower_first(count):
+    """模拟修正服务：越早到达的请求返回越慢，使完成顺序与提交顺序相反"""
+    arrivals = itertools.count()
+
+    def respond(body):
+        time.sleep(0.02 * max(0, count - next(arrivals)))
+        return re.search(r"<note>.*</note>", body["messages"][-1]["content"], re.S).group(0)
+    return respond
+
+
+def test_concurrent_segments_keep_input_order(monkeypatch):
+    """user-021：并发修正的段落按原顺序合并，与完成顺序无关"""
+    monkeypatch.setenv("ARK_API_KEY", "mock-key")
+    server, api_host = run_mock_ark_server(latency=0, responder=_slower_first(8))
+    segment = "这是用于测试的句子。" * 5
+    note = "".join(f"第{i}段。{segment}" for i in range(8))
+    try:
+        result = tc.main("mock", "mock-endpoint", api_host, note, max_length=len(segment) + 10, max_concurrency=8)
+    finally:
+        server.shutdown()
+    segments = result.split("\n")
+    assert segments == tc.split_long_text(note, len(segment) + 10)
+    assert len(segments) > 1
+    assert "".join(segments) == note
+
+
+def test_failed_segments_are_retried_in_place(monkeypatch):
+    """user-021：失败的段落重试后放回原位置，重试仍失败时抛出 RuntimeError"""
+    attempts = {}
+
+    def flaky(text, *args):
+        attempts[text] = attempts.get(text, 0) + 1
+        if text == "b" and attempts[text] == 1:
+            raise ConnectionError("mock failure")
+        return text.upper()
+
+    monkeypatch.setattr(tc, "correct_text", flaky)
+    assert tc.correct_segments(["a", "b", "c"], "mock", "mock-endpoint", "mock-host", retry_delay=0) == ["A", "B", "C"]
+    assert attempts["b"] == 2
+
+    monkeypatch.setattr(tc, "correct_text", lambda text, *args: 1 / 0 if text == "c" else text)
+    with pytest.raises(RuntimeError):
+        tc.correct_segments(["a", "c"], "mock", "mock-endpoint", "mock-host", max_retries=1, retry_delay=0)
+
+
+def test_benchmark_restores_api_key(monkeypatch, capsys):
+    """user-021：基准测试结束后恢复 ARK_API_KEY，不影响同一进程中的后续代码"""
+    monkeypatch.delenv("ARK_API_KEY", raising=False)
+    tc.benchmark_segment_correction(segment_count=3, latency=0, max_concurrency=3)
+    assert "顺序正确" in capsys.readouterr().out
+    assert "ARK_API_KEY" not in os.environ
+
+
+def test_main_splits_segments_by_max_length(monkeypatch):
+    """user-021：max_length 同时决定每段的最大长度"""
+    seen = []
+
+    def record(segments, *args, **kwargs):
+        seen.extend(segments)
+        return segments
+
+    monkeypatch.setattr(tc, "correct_segments", record)
+    note = "短句。" * 40
+    assert tc.main("mock", "mock-endpoint", "mock-host", note, max_length=30) == "\n".join(seen)
+    assert len(seen) > 1 and all(len(segment) <= 30 for segment in seen)
+    assert "".join(seen) == note
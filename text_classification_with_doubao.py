@@ -8,19 +8,50 @@
 3. 按分隔符拆分笔记
 4. 使用 AI 模型对每条笔记进行分类
 5. 将分类结果保存为新的 Markdown 文件
+
+批量模式（batch_size > 1）把多条笔记编号后放进同一个请求，要求模型逐行输出“编号. 类别”；
+解析出的类别须在允许的类别列表中，未能解析或不合法的笔记单独组批重发，多次重发仍失败的再逐条判断。
+
+并发模式（max_in_flight > 1）同时最多进行 max_in_flight 个请求；每条笔记的分类结果一完成就追加写入JSONL文件，
+中断后使用同一个结果文件重新运行会跳过已分类的笔记，Markdown报告最后从结果文件生成。
+
+本地预分类（labeled_files）：用已由模型分类的笔记训练字符 n-gram TF-IDF + 最近类中心的分类器，
+把置信度高的笔记直接在本地判定，只有不确定的笔记才调用模型；启用前先在留出样本上统计本地判定比例和一致率。
 """
 
 import os
 import re
+import json
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 import datetime
+import numpy as np
 import requests
-from volcenginesdkarkruntime import Ark
+
+from ark_client import get_ark_client, run_mock_ark_server
 
 # 火山引擎 ARK Runtime API 配置
 endpoint_id = "ep-20241201202141-xghlt"         # doubao-pro-4k 模型端点
 api_host = "ark.cn-beijing.volces.com"          # 华北 2 (北京) 服务器
 
+# 累计的请求次数和token用量
+usage_stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+# 批量模式下附加在分类规则后的输出格式要求
+BATCH_INSTRUCTION = """
+批量判断：用户会一次提供多条文本，每条文本包含在带编号的xml标签中，如 <note id="1">文本</note>；
+请分别判断每条文本的类别，每条输出一行，格式为“编号. 类别”，按编号顺序输出全部文本的类别，不要输出其他内容。
+"""
+
+# 批量结果中的一行：编号 + 分隔符 + 类别
+BATCH_LINE_PATTERN = re.compile(r"^\s*(\d+)\s*[.、:：)）]\s*(.+?)\s*$")
+
 def get_completion_from_messages(messages, model=endpoint_id, temperature=0.8, max_tokens=2048):
     """
     调用 Doubao API 获取模型响应
@@ -34,20 +65,21 @@ def get_completion_from_messages(messages, model=endpoint_id, temperature=0.8, m
     Returns:
         str: 模型生成的响应文本
     """
-    client = Ark(
-    api_key=os.environ.get("ARK_API_KEY"),
-    base_url=f"https://{api_host}/api/v3",
-    # timeout=120,
-    # max_retries=3,
-    )
+    client = get_ark_client(api_host)
 
     completion = client.chat.completions.create(
-        model=endpoint_id,
+        model=model,
         messages=messages,
         temperature=temperature,
         max_tokens=max_tokens,
     )
 
+    with _usage_lock:
+        usage_stats["requests"] += 1
+        if completion.usage:
+            usage_stats["prompt_tokens"] += completion.usage.prompt_tokens
+            usage_stats["completion_tokens"] += completion.usage.completion_tokens
+
     return completion.choices[0].message.content
 
 def decide_category(system_message, user_message):
@@ -73,6 +105,134 @@ def decide_category(system_message, user_message):
     response = get_completion_from_messages(messages)
     return response
 
+def extract_categories(system_message):
+    """
+    从分类规则中解析允许的类别列表，即“类别包括：A、B、C；”中的类别
+
+    Returns:
+        list: 类别列表
+
+    Raises:
+        ValueError: 分类规则中没有找到类别列表
+    """
+    match = re.search(r"类别包括[：:](.+?)[；;。\n]", system_message)
+    if not match:
+        raise ValueError("无法从分类规则中解析类别列表，请通过 categories 参数指定")
+    return [category.strip() for category in re.split(r"[、,，]", match.group(1)) if category.strip()]
+
+def clean_category(text):
+    """去掉模型输出的类别两侧的空白、引号、书名号和 markdown 标记"""
+    return text.strip().strip(" \"'“”《》[]【】*`")
+
+def parse_batch_response(response, count, categories):
+    """
+    解析批量分类的结果，只保留编号在范围内、类别在允许列表中的行
+
+    Args:
+        response (str): 模型返回的文本
+        count (int): 本批笔记数量
+        categories (list): 允许的类别
+
+    Returns:
+        dict: 笔记在本批中的位置（从0开始） -> 类别
+    """
+    results = {}
+    for line in response.splitlines():
+        match = BATCH_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        index = int(match.group(1)) - 1
+        category = clean_category(match.group(2))
+        if 0 <= index < count and category in categories:
+            results.setdefault(index, category)
+    return results
+
+def decide_categories_batch(system_message, notes, categories):
+    """
+    在一个请求中判断多条笔记的类别
+
+    Args:
+        system_message (str): 系统提示词，定义分类规则
+        notes (list): 本批笔记
+        categories (list): 允许的类别
+
+    Returns:
+        dict: 成功解析的笔记位置（从0开始） -> 类别
+    """
+    items = "\n".join(f'<note id="{i}">{note}</note>' for i, note in enumerate(notes, start=1))
+    messages = [
+        {'role': 'system', 'content': system_message + BATCH_INSTRUCTION},
+        {'role': 'user', 'content': f"请判断以下 {len(notes)} 条文本的类别：\n{items}"},
+    ]
+    # 每条结果一行，按每行约20个token预留输出长度
+    response = get_completion_from_messages(messages, temperature=0, max_tokens=max(64, 20 * len(notes)))
+    return parse_batch_response(response, len(notes), categories)
+
+def make_batches(indexes, notes, batch_size, max_batch_chars):
+    """按条数和总字符数上限把待分类笔记分组，单条超长的笔记单独成批"""
+    batch, batch_chars = [], 0
+    for index in indexes:
+        length = len(notes[index])
+        if batch and (len(batch) >= batch_size or batch_chars + length > max_batch_chars):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(index)
+        batch_chars += length
+    if batch:
+        yield batch
+
+def classify_notes_in_batches(notes, system_message, categories=None, batch_size=30, max_batch_chars=2500, max_retries=2,
+                              verbose=True):
+    """
+    批量判断笔记类别，结果与笔记顺序一致
+
+    Args:
+        notes (list): 笔记列表
+        system_message (str): 分类规则系统提示词
+        categories (list): 允许的类别，默认从分类规则中解析
+        batch_size (int): 每个请求最多包含的笔记数
+        max_batch_chars (int): 每个请求中笔记的总字符数上限，避免超出模型上下文
+        max_retries (int): 未能解析的笔记重新组批发送的轮数，之后仍失败的逐条判断
+        verbose (bool): 是否打印进度
+
+    Returns:
+        list: 每条笔记的类别；逐条判断时不在允许列表中的类别记为“其他”，请求失败的笔记为 None
+    """
+    categories = categories or extract_categories(system_message)
+    results = [None] * len(notes)
+    pending = list(range(len(notes)))
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt and verbose:
+            print(f"第 {attempt} 次重发未能解析的 {len(pending)} 条笔记")
+        failed = []
+        for batch in make_batches(pending, notes, batch_size, max_batch_chars):
+            try:
+                parsed = decide_categories_batch(system_message, [notes[i] for i in batch], categories)
+            except Exception as e:
+                print(f"批量请求失败: {e}")
+                parsed = {}
+            for position, index in enumerate(batch):
+                if position in parsed:
+                    results[index] = parsed[position]
+                else:
+                    failed.append(index)
+        if verbose:
+            print(f"已完成 {len(notes) - len(failed)}/{len(notes)} 条笔记的分类")
+        pending = failed
+
+    # 多次重发仍无法解析的笔记逐条判断，单条失败不影响其他笔记
+    for index in pending:
+        try:
+            category = clean_category(decide_category(system_message, notes[index]))
+        except Exception as e:
+            print(f"第 {index + 1} 条笔记分类失败: {e}")
+            continue
+        results[index] = category if category in categories else "其他"
+    return results
+
 def split_notes(txt_file, delimiter):
     """
     按指定分隔符拆分笔记文本文件
@@ -91,7 +251,307 @@ def split_notes(txt_file, delimiter):
     # print(notes)
     return notes
 
-def save_organized_notes(txt_file, notes, system_message):
+class LocalPreClassifier:
+    """
+    本地预分类器：字符 n-gram TF-IDF 向量 + 最近类中心
+
+    每个类别的中心为该类笔记 TF-IDF 向量之和归一化后的向量；新笔记与各类中心的余弦相似度中，
+    最高分不低于 min_score 且领先第二名至少 min_margin 时在本地判定，否则返回 None 交给模型
+    """
+
+    def __init__(self, ngram_range=(1, 3), max_features=100000, min_score=0.3, min_margin=0.1, min_samples=3):
+        """
+        Args:
+            ngram_range (tuple): 字符 n-gram 的最小和最大长度
+            max_features (int): 保留的 n-gram 数量上限，按出现的笔记数从多到少保留
+            min_score (float): 本地判定所需的最低相似度
+            min_margin (float): 本地判定所需的与第二名的最小相似度差距
+            min_samples (int): 类别至少有这么多条已分类笔记才参与本地判定
+        """
+        self.ngram_range = ngram_range
+        self.max_features = max_features
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.min_samples = min_samples
+        self.vocabulary = {}
+        self.idf = np.empty(0)
+        self.labels = []
+        self.centroids = np.empty((0, 0))
+
+    def _ngrams(self, text):
+        text = re.sub(r"\s+", " ", text.lower()).strip()
+        low, high = self.ngram_range
+        return Counter(text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1))
+
+    def _vectorize(self, counts):
+        """把 n-gram 计数转换为归一化的 TF-IDF 稀疏向量（特征下标, 权重）"""
+        items = [(self.vocabulary[gram], count) for gram, count in counts.items() if gram in self.vocabulary]
+        if not items:
+            return np.empty(0, dtype=int), np.empty(0)
+        indexes = np.array([index for index, _ in items])
+        weights = (1 + np.log([count for _, count in items])) * self.idf[indexes]
+        return indexes, weights / np.linalg.norm(weights)
+
+    def fit(self, texts, labels):
+        """
+        用已分类的笔记计算词表、IDF 和各类别中心
+
+        Args:
+            texts (list): 笔记列表
+            labels (list): 对应的类别
+        """
+        counts = [self._ngrams(text) for text in texts]
+        doc_freq = Counter()
+        for note_counts in counts:
+            doc_freq.update(note_counts.keys())
+        features = [gram for gram, _ in doc_freq.most_common(self.max_features)]
+        self.vocabulary = {gram: index for index, gram in enumerate(features)}
+        self.idf = np.log((1 + len(texts)) / (1 + np.array([doc_freq[gram] for gram in features], dtype=float))) + 1
+
+        label_counts = Counter(labels)
+        self.labels = [label for label, count in label_counts.items() if count >= self.min_samples]
+        label_index = {label: index for index, label in enumerate(self.labels)}
+        self.centroids = np.zeros((len(self.labels), len(features)))
+        for note_counts, label in zip(counts, labels):
+            if label in label_index:
+                indexes, weights = self._vectorize(note_counts)
+                self.centroids[label_index[label], indexes] += weights
+        norms = np.linalg.norm(self.centroids, axis=1, keepdims=True)
+        self.centroids /= np.where(norms == 0, 1, norms)
+        return self
+
+    def predict(self, text):
+        """
+        Returns:
+            (最相近的类别, 相似度, 与第二名的相似度差距)，没有可用类别或特征时类别为 None
+        """
+        indexes, weights = self._vectorize(self._ngrams(text))
+        if not self.labels or indexes.size == 0:
+            return None, 0.0, 0.0
+        scores = self.centroids[:, indexes] @ weights
+        order = np.argsort(scores)[::-1]
+        best = scores[order[0]]
+        second = scores[order[1]] if len(order) > 1 else 0.0
+        return self.labels[order[0]], float(best), float(best - second)
+
+    def decide(self, text):
+        """置信度足够时返回类别，否则返回 None"""
+        label, score, margin = self.predict(text)
+        if label is not None and score >= self.min_score and margin >= self.min_margin:
+            return label
+        return None
+
+def load_labeled_notes(labeled_files):
+    """
+    从JSONL分类结果文件中读取由模型分类的笔记，作为本地预分类器的训练数据
+
+    Returns:
+        (笔记列表, 类别列表)，同一笔记出现多次时保留最后一次的类别
+    """
+    labeled = {}
+    for labeled_file in labeled_files:
+        for record in load_results(Path(labeled_file)).values():
+            if record.get("source", "llm") == "llm" and record.get("note") and record.get("category"):
+                labeled[record["note"]] = record["category"]
+    return list(labeled), list(labeled.values())
+
+def evaluate_pre_classifier(texts, labels, holdout=0.2, seed=0, **kwargs):
+    """
+    在留出样本上评估本地预分类器：用其余笔记训练，统计留出笔记中本地判定的比例及与已有类别的一致率
+
+    Args:
+        texts (list): 已分类的笔记
+        labels (list): 对应的类别
+        holdout (float): 留出样本比例
+        seed (int): 随机划分的种子
+        kwargs: 传给 LocalPreClassifier 的参数
+
+    Returns:
+        dict: {'holdout', 'local', 'coverage', 'agreement'}
+    """
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    cut = len(order) - max(1, int(len(order) * holdout))
+    train, test = order[:cut], order[cut:]
+    classifier = LocalPreClassifier(**kwargs).fit([texts[i] for i in train], [labels[i] for i in train])
+
+    local = agreed = 0
+    for i in test:
+        label = classifier.decide(texts[i])
+        if label is not None:
+            local += 1
+            agreed += label == labels[i]
+    return {
+        "holdout": len(test),
+        "local": local,
+        "coverage": local / len(test) if test else 0.0,
+        "agreement": agreed / local if local else 0.0,
+    }
+
+def load_results(results_file, notes=None):
+    """
+    读取JSONL分类结果文件
+
+    Args:
+        results_file (Path): 结果文件路径，每行为 {"index": 序号, "category": 类别, "note": 笔记, "source": "llm" 或 "local"}
+        notes (list): 可选，给定时忽略序号越界或与当前笔记内容不一致的记录
+
+    Returns:
+        dict: 笔记序号 -> 记录
+    """
+    results = {}
+    if not results_file.exists():
+        return results
+    with open(results_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中断时可能留下不完整的最后一行
+            index = record.get("index")
+            if notes is not None and not (isinstance(index, int) and 0 <= index < len(notes)
+                                          and notes[index] == record.get("note")):
+                continue
+            results[index] = record
+    return results
+
+def classify_notes_concurrently(notes, system_message, results_file, max_in_flight=8, batch_size=1, categories=None,
+                                max_batch_chars=2500, pre_classifier=None):
+    """
+    并发判断笔记类别，每完成一个请求就把结果追加写入JSONL文件
+
+    逐条模式下每个请求判断一条笔记，批量模式下每个请求判断一批笔记（见 classify_notes_in_batches）；
+    同时最多提交 max_in_flight 个请求，完成一个再提交下一个。结果文件中已有的笔记会被跳过；
+    给定 pre_classifier 时，先在本地判定置信度高的笔记，其余的才调用模型。
+
+    Args:
+        notes (list): 笔记列表
+        system_message (str): 分类规则系统提示词
+        results_file (Path): JSONL结果文件路径
+        max_in_flight (int): 同时进行的请求数
+        batch_size (int): 每个请求包含的笔记数，1 表示逐条分类
+        categories (list): 批量模式下允许的类别，默认从分类规则中解析
+        max_batch_chars (int): 批量模式下每个请求中笔记的总字符数上限
+        pre_classifier (LocalPreClassifier): 可选，已训练的本地预分类器
+
+    Returns:
+        dict: 统计信息 {'completed', 'skipped', 'failed', 'local'}，completed 包含本地判定的笔记
+    """
+    results_file = Path(results_file)
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    done = load_results(results_file, notes)
+    pending = [index for index in range(len(notes)) if index not in done]
+    if done:
+        print(f"结果文件中已有 {len(done)} 条笔记的分类，继续处理剩余 {len(pending)} 条")
+
+    summary = {"completed": 0, "skipped": len(done), "failed": 0, "local": 0}
+    if pre_classifier is not None:
+        remaining = []
+        with open(results_file, "a", encoding="utf-8") as f:
+            for index in pending:
+                category = pre_classifier.decide(notes[index])
+                if category is None:
+                    remaining.append(index)
+                    continue
+                f.write(json.dumps({"index": index, "category": category, "note": notes[index], "source": "local"},
+                                   ensure_ascii=False) + "\n")
+                summary["local"] += 1
+        summary["completed"] = summary["local"]
+        pending = remaining
+        print(f"本地判定 {summary['local']} 条笔记，{len(pending)} 条交给模型")
+
+    if batch_size > 1:
+        categories = categories or extract_categories(system_message)
+        units = iter(list(make_batches(pending, notes, batch_size, max_batch_chars)))
+    else:
+        units = iter([index] for index in pending)
+
+    def classify(unit):
+        if batch_size > 1:
+            return classify_notes_in_batches([notes[i] for i in unit], system_message, categories,
+                                             batch_size=len(unit), max_batch_chars=max_batch_chars, verbose=False)
+        return [decide_category(system_message, notes[unit[0]]).strip()]
+
+    with open(results_file, "a", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        in_flight = {}
+
+        def submit_next():
+            unit = next(units, None)
+            if unit is not None:
+                in_flight[executor.submit(classify, unit)] = unit
+
+        for _ in range(max(1, max_in_flight)):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                unit = in_flight.pop(future)
+                try:
+                    unit_categories = future.result()
+                except Exception as e:
+                    summary["failed"] += len(unit)
+                    print(f"第 {unit[0] + 1} 条起的 {len(unit)} 条笔记分类失败: {e}")
+                else:
+                    for index, category in zip(unit, unit_categories):
+                        if category is None:
+                            # 批量模式下逐条判断也失败的笔记不写入结果，重新运行时再处理
+                            summary["failed"] += 1
+                            continue
+                        f.write(json.dumps({"index": index, "category": category, "note": notes[index],
+                                            "source": "llm"}, ensure_ascii=False) + "\n")
+                        summary["completed"] += 1
+                        if batch_size == 1:
+                            print(f"{category}：\n{notes[index]}\n")
+                    f.flush()
+                    if batch_size > 1:
+                        print(f"已完成 {summary['completed'] + summary['skipped']}/{len(notes)} 条笔记的分类")
+                submit_next()
+
+    if summary["failed"]:
+        print(f"有 {summary['failed']} 条笔记分类失败，使用同一个结果文件重新运行即可继续处理")
+    return summary
+
+def write_report(results_file, report_file, notes=None):
+    """
+    从JSONL分类结果生成 Markdown 报告
+
+    Args:
+        results_file (Path): JSONL结果文件路径
+        report_file (Path): Markdown报告路径
+        notes (list): 可选，给定时只使用与当前笔记一致的记录
+
+    Returns:
+        dict: 类别 -> 按原始顺序排列的笔记列表
+    """
+    records = sorted(load_results(Path(results_file), notes).values(), key=lambda record: record["index"])
+    organized_notes = {}
+    for record in records:
+        organized_notes.setdefault(record["category"], []).append(record["note"])
+
+    total = len(records)
+    parts = ["# 笔记分类整理\n\n"]
+    # 添加统计信息到文件
+    parts.append("## 统计信息\n")
+    parts.append(f"- 总笔记数量：{total}\n")
+    for category, notes_list in organized_notes.items():
+        count = len(notes_list)
+        percentage = (count / total) * 100
+        parts.append(f"- {category}: {count} 条 ({percentage:.1f}%)\n")
+    parts.append("\n")
+
+    # 原有的分类内容
+    for k, v in organized_notes.items():
+        parts.append(f"## {k}\n")
+        parts.extend(f"{note}\n\n---\n\n" for note in v)
+        parts.append("\n")
+
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+    return organized_notes
+
+def save_organized_notes(txt_file, notes, system_message, batch_size=1, max_in_flight=1, results_file=None,
+                         labeled_files=None, min_labeled=50):
     """
     将分类后的笔记保存为 Markdown 文件，并打印统计信息
 
@@ -99,43 +559,168 @@ def save_organized_notes(txt_file, notes, system_message):
         txt_file (Path): 原始笔记文件路径
         notes (list): 笔记列表
         system_message (str): 分类规则系统提示词
+        batch_size (int): 每个请求包含的笔记数，大于1时使用批量模式
+        max_in_flight (int): 同时进行的请求数，1 表示逐个请求串行处理
+        results_file (Path): JSONL结果文件路径，默认在 output 目录下按时间生成；指定已有文件时跳过其中已分类的笔记
+        labeled_files (list): 可选，以往的JSONL分类结果文件，其中由模型分类的笔记用于训练本地预分类器
+        min_labeled (int): 启用本地预分类所需的最少已分类笔记数
     """
-    organized_notes = {}
-    for note in notes:
-        category = decide_category(system_message, note)
-        print(f"{category}：\n{note}\n")
-        organized_notes.setdefault(category, []).append(note)
+    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    output_dir = txt_file.parent / "output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_file = Path(results_file) if results_file else output_dir / f"organized_notes_{now}.jsonl"
+
+    pre_classifier = None
+    if labeled_files:
+        texts, labels = load_labeled_notes(labeled_files)
+        if len(texts) < min_labeled:
+            print(f"已分类笔记只有 {len(texts)} 条（少于 {min_labeled} 条），不启用本地预分类")
+        else:
+            evaluation = evaluate_pre_classifier(texts, labels)
+            print(f"本地预分类器：已分类笔记 {len(texts)} 条；留出样本 {evaluation['holdout']} 条中本地判定 "
+                  f"{evaluation['local']} 条（{evaluation['coverage']:.1%}），与模型分类一致率 {evaluation['agreement']:.1%}")
+            pre_classifier = LocalPreClassifier().fit(texts, labels)
+
+    summary = classify_notes_concurrently(notes, system_message, results_file, max_in_flight, batch_size,
+                                          pre_classifier=pre_classifier)
+    organized_notes_file = output_dir / f"organized_notes_{now}.md"
+    organized_notes = write_report(results_file, organized_notes_file, notes)
 
     # 添加统计信息
+    total = sum(len(notes_list) for notes_list in organized_notes.values())
     print("\n=== 分类统计信息 ===")
-    print(f"总笔记数量：{len(notes)}")
+    print(f"总笔记数量：{total}")
     for category, notes_list in organized_notes.items():
         count = len(notes_list)
-        percentage = (count / len(notes)) * 100
+        percentage = (count / total) * 100
         print(f"{category}: {count} 条 ({percentage:.1f}%)")
+    if pre_classifier is not None:
+        print(f"本地判定：{summary['local']} 条，模型判定：{summary['completed'] - summary['local']} 条")
+    if usage_stats["requests"] and total:
+        print(f"请求次数：{usage_stats['requests']}（每条笔记 {usage_stats['requests'] / total:.2f} 次），"
+              f"token用量：{usage_stats['prompt_tokens'] + usage_stats['completion_tokens']}"
+              f"（每条笔记 {(usage_stats['prompt_tokens'] + usage_stats['completion_tokens']) / total:.0f}）")
     print("================\n")
+    print(f"分类结果：{results_file}\n分类报告：{organized_notes_file}")
 
-    content = "# 笔记分类整理\n\n"
-    # 添加统计信息到文件
-    content += "## 统计信息\n"
-    content += f"- 总笔记数量：{len(notes)}\n"
-    for category, notes_list in organized_notes.items():
-        count = len(notes_list)
-        percentage = (count / len(notes)) * 100
-        content += f"- {category}: {count} 条 ({percentage:.1f}%)\n"
-    content += "\n"
+_mock_rng = random.Random(0)
 
-    # 原有的分类内容
-    for k, v in organized_notes.items():
-        content += f"## {k}\n"
-        for note in v:
-            content += f"{note}\n\n---\n\n"
-        content += "\n"
+def _mock_classifier(body):
+    """模拟分类模型：按关键词判断类别；批量请求逐行输出“编号. 类别”，随机漏掉约5%的行以触发重发"""
+    def classify(text):
+        if "github.com" in text:
+            return "Github项目"
+        if "《" in text:
+            return "书籍推荐"
+        return "其他"
 
-    now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    organized_notes_file = txt_file.parent / f"output / organized_notes_{now}.md"
-    with open(organized_notes_file, "w", encoding="utf-8") as f:
-        f.write(content)
+    content = body["messages"][-1]["content"]
+    items = re.findall(r'<note id="(\d+)">(.*?)</note>', content, re.S)
+    if not items:
+        return classify(content)
+    return "\n".join(f"{i}. {classify(text)}" for i, text in items if _mock_rng.random() > 0.05)
+
+@contextmanager
+def _mock_ark_service(latency):
+    """启动模拟分类服务，期间把模块的 api_host 指向它并补上 ARK_API_KEY，退出时关闭服务并恢复原值"""
+    global api_host
+    saved_host, saved_key = api_host, os.environ.get("ARK_API_KEY")
+    server, api_host = run_mock_ark_server(latency=latency, responder=_mock_classifier)
+    os.environ.setdefault("ARK_API_KEY", "mock-key")
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        api_host = saved_host
+        if saved_key is None:
+            os.environ.pop("ARK_API_KEY", None)
+
+def benchmark_batch_classification(note_count=300, batch_size=30, latency=0.02):
+    """在本地模拟服务上对比逐条与批量分类的请求次数、token用量和耗时，并检查两种方式结果是否一致"""
+    system_message = "可能的类别包括：Github项目、书籍推荐、其他；请只输出类别，不要输出其他内容。\n" + "分类规则说明。" * 100
+    samples = ["https://github.com/user/repo{} 一个开源项目", "推荐阅读《书名{}》", "随手记录的想法{}"]
+    notes = [samples[i % 3].format(i) for i in range(note_count)]
+
+    with _mock_ark_service(latency):
+        results = {}
+        for name, size in (("逐条", 1), ("批量", batch_size)):
+            usage_stats.update(requests=0, prompt_tokens=0, completion_tokens=0)
+            start = time.perf_counter()
+            if size > 1:
+                categories = classify_notes_in_batches(notes, system_message, batch_size=size)
+            else:
+                categories = [decide_category(system_message, note).strip() for note in notes]
+            elapsed = time.perf_counter() - start
+            tokens = usage_stats["prompt_tokens"] + usage_stats["completion_tokens"]
+            results[name] = categories
+            print(f"{name}: 请求 {usage_stats['requests']} 次（每条 {usage_stats['requests'] / note_count:.3f}），"
+                  f"token {tokens}（每条 {tokens / note_count:.0f}），耗时 {elapsed:.2f} 秒")
+        print(f"结果一致: {results['逐条'] == results['批量']}")
+
+def benchmark_concurrent_classification(note_count=100, max_in_flight=8, latency=0.1, output_dir="benchmark_classification"):
+    """在本地模拟服务上对比逐条串行与并发分类的耗时，并检查两种方式生成的报告是否一致"""
+    system_message = "可能的类别包括：Github项目、书籍推荐、其他；请只输出类别，不要输出其他内容。"
+    samples = ["https://github.com/user/repo{} 一个开源项目", "推荐阅读《书名{}》", "随手记录的想法{}"]
+    notes = [samples[i % 3].format(i) for i in range(note_count)]
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    with _mock_ark_service(latency):
+        reports = []
+        for concurrency in (1, max_in_flight):
+            results_file = output_path / f"results_{concurrency}.jsonl"
+            report_file = output_path / f"report_{concurrency}.md"
+            results_file.unlink(missing_ok=True)
+            start = time.perf_counter()
+            classify_notes_concurrently(notes, system_message, results_file, max_in_flight=concurrency)
+            write_report(results_file, report_file, notes)
+            elapsed = time.perf_counter() - start
+            reports.append(report_file.read_text(encoding="utf-8"))
+            print(f"并发数 {concurrency}: {note_count} 条笔记耗时 {elapsed:.2f} 秒")
+        print(f"报告一致: {reports[0] == reports[1]}")
+
+def _mock_notes(count, seed=0):
+    """生成用于基准测试的模拟笔记：GitHub链接、书籍、随手记录，以及少量同时包含链接和书名的混合笔记"""
+    rng = random.Random(seed)
+    words = ["模型", "推理", "效率", "工具", "周末", "咖啡", "想法", "阅读", "城市", "散步", "会议", "总结", "数据", "旅行"]
+    templates = [
+        lambda: f"https://github.com/{rng.choice(words)}{rng.randint(1, 999)}/repo 开源{rng.choice(words)}{rng.choice(words)}项目",
+        lambda: f"推荐阅读《{rng.choice(words)}{rng.choice(words)}》，{rng.choice(words)}相关的好书",
+        lambda: "".join(rng.choice(words) for _ in range(rng.randint(4, 10))),
+        lambda: f"读《{rng.choice(words)}》时找到 github.com/{rng.choice(words)} {rng.choice(words)}",
+    ]
+    return [rng.choices(templates, weights=[30, 30, 35, 5])[0]() for _ in range(count)]
+
+def benchmark_pre_classification(labeled_count=1000, note_count=2000, output_dir="benchmark_classification"):
+    """
+    在本地模拟服务上测试本地预分类：先用模型分类 labeled_count 条笔记作为训练数据，
+    再分类 note_count 条新笔记，统计本地/模型判定的比例，以及本地判定结果与模型结果的一致率
+    """
+    system_message = "可能的类别包括：Github项目、书籍推荐、其他；请只输出类别，不要输出其他内容。"
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    labeled_file = output_path / "labeled.jsonl"
+    results_file = output_path / "results.jsonl"
+    labeled_file.unlink(missing_ok=True)
+    results_file.unlink(missing_ok=True)
+
+    with _mock_ark_service(latency=0):
+        classify_notes_concurrently(_mock_notes(labeled_count, seed=1), system_message, labeled_file, batch_size=30)
+        texts, labels = load_labeled_notes([labeled_file])
+        evaluation = evaluate_pre_classifier(texts, labels)
+        print(f"留出样本 {evaluation['holdout']} 条：本地判定 {evaluation['coverage']:.1%}，一致率 {evaluation['agreement']:.1%}")
+
+        notes = _mock_notes(note_count, seed=2)
+        start = time.perf_counter()
+        pre_classifier = LocalPreClassifier().fit(texts, labels)
+        summary = classify_notes_concurrently(notes, system_message, results_file, batch_size=30,
+                                              pre_classifier=pre_classifier)
+        elapsed = time.perf_counter() - start
+        local = [record for record in load_results(results_file, notes).values() if record["source"] == "local"]
+        agreed = sum(record["category"] == _mock_classifier({"messages": [{"content": record["note"]}]})
+                     for record in local)
+        print(f"新笔记 {note_count} 条：本地判定 {summary['local']} 条，模型判定 {summary['completed'] - summary['local']} 条，"
+              f"本地判定与模型一致率 {agreed / max(1, len(local)):.1%}，耗时 {elapsed:.2f} 秒")
 
 if __name__ == "__main__":
     system_message = """
@@ -149,4 +734,8 @@ if __name__ == "__main__":
 
     txt_file = Path(r".\input\original_notes.txt")
     notes = split_notes(txt_file, "%%%")
-    save_organized_notes(txt_file, notes, system_message)
+    batch_size = 30     # 每个请求包含的笔记数，1 表示逐条分类
+    max_in_flight = 4   # 同时进行的请求数
+    results_file = txt_file.parent / "output" / "classification_results.jsonl"     # 中断后重新运行会跳过已分类的笔记
+    labeled_files = None        # 以往另存的分类结果（如 [txt_file.parent / "output" / "labeled_history.jsonl"]），用于训练本地预分类器；不要与 results_file 相同
+    save_organized_notes(txt_file, notes, system_message, batch_size, max_in_flight, results_file, labeled_files)
@@ -5,15 +5,23 @@
 1. 将指定的markdown文件按2级标题拆分；
 2. 对每个拆分后的文本，调用Doubao模型进行语法修正和优化；
 3. 将修正后的文本合并保存为新的markdown文件，文件名后缀为"_modified"。
+
+长文本按句号分段后并发提交（max_concurrency 控制同时进行的请求数），按原顺序合并；
+失败的段落在其余段落完成后逐个单独重试。ark_client.run_mock_ark_server 提供本地模拟的 chat completions 接口，
+api_host 传入 "http://127.0.0.1:端口" 即可离线测试。
 """
 
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 import datetime
 import requests
 import pyperclip
-from volcenginesdkarkruntime import Ark
+
+from ark_client import get_ark_client, run_mock_ark_server
 
 def get_completion_from_messages(messages, endpoint_id, api_host, temperature=0.8, max_tokens=2048):
     """
@@ -28,12 +36,7 @@ def get_completion_from_messages(messages, endpoint_id, api_host, temperature=0.
     Returns:
         str: 模型生成的响应文本
     """
-    client = Ark(
-    api_key=os.environ.get("ARK_API_KEY"),
-    base_url=f"https://{api_host}/api/v3",
-    # timeout=120,
-    # max_retries=3,
-    )
+    client = get_ark_client(api_host)
 
     completion = client.chat.completions.create(
         model=endpoint_id,
@@ -44,6 +47,87 @@ def get_completion_from_messages(messages, endpoint_id, api_host, temperature=0.
 
     return completion.choices[0].message.content
 
+def correct_text(text, system_message, endpoint_id, api_host):
+    """
+    调用模型修正一段文本，去掉返回结果外层的<note>标签
+
+    Args:
+        text (str): 待修正的文本
+        system_message (str): 系统消息
+        endpoint_id (str): 模型端点ID
+        api_host (str): 火山引擎API主机
+
+    Returns:
+        str: 修正后的文本
+    """
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": f"待优化文本包含在xml标签中：<note>{text}</note>"}
+    ]
+    corrected = get_completion_from_messages(messages, endpoint_id, api_host)
+    # 如果返回结果包含<note>和</note>标签，则去掉标签
+    if corrected.startswith("<note>") and corrected.endswith("</note>"):
+        corrected = corrected[6:-7]
+    return corrected
+
+def correct_segments(segments, system_message, endpoint_id, api_host, max_concurrency=4, max_retries=2, retry_delay=1.0):
+    """
+    并发修正多个文本段落，结果与输入顺序一致
+
+    先以不超过 max_concurrency 个并发请求处理全部段落；失败的段落在其余段落完成后逐个单独重试，
+    每次重试前等待 retry_delay × 重试次数 秒。
+
+    Args:
+        segments (list): 待修正的文本段落
+        system_message (str): 系统消息
+        endpoint_id (str): 模型端点ID
+        api_host (str): 火山引擎API主机
+        max_concurrency (int): 同时进行的请求数，1 表示逐段串行处理
+        max_retries (int): 失败段落单独重试的次数
+        retry_delay (float): 重试的基础等待时间（秒）
+
+    Returns:
+        list: 修正后的文本段落
+
+    Raises:
+        RuntimeError: 重试后仍有段落失败
+    """
+    total = len(segments)
+    results = [None] * total
+    failed = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, total))) as executor:
+        futures = {
+            executor.submit(correct_text, segment, system_message, endpoint_id, api_host): index
+            for index, segment in enumerate(segments)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+                print(f"第 {index + 1}/{total} 段处理完成（已完成 {done}/{total}）")
+            except Exception as e:
+                failed[index] = e
+                print(f"第 {index + 1}/{total} 段处理失败: {e}")
+
+    # 失败的段落逐个单独重试
+    for index in sorted(failed):
+        for attempt in range(1, max_retries + 1):
+            time.sleep(retry_delay * attempt)
+            print(f"重试第 {index + 1}/{total} 段（第 {attempt}/{max_retries} 次）...")
+            try:
+                results[index] = correct_text(segments[index], system_message, endpoint_id, api_host)
+                del failed[index]
+                break
+            except Exception as e:
+                failed[index] = e
+                print(f"第 {index + 1}/{total} 段重试失败: {e}")
+
+    if failed:
+        indexes = ", ".join(str(index + 1) for index in sorted(failed))
+        raise RuntimeError(f"第 {indexes} 段在重试 {max_retries} 次后仍然失败") from next(iter(failed.values()))
+    return results
+
 def split_notes(file_path, delimiter="## "):
     """
     按指定的分隔符拆分Markdown文件
@@ -80,10 +164,7 @@ def save_modified_notes(original_file, notes, system_message, endpoint_id, api_h
     total_notes = len(notes)
     for index, note in enumerate(notes, start=1):
         # print(f"待处理原文 {index}/{total_notes}: {note}\n")
-        messages = [{"role": "system", "content": system_message}, {"role": "user", "content": f"待优化文本包含在xml标签中：<note>{note}</note>"}]
-        corrected_note = get_completion_from_messages(messages, endpoint_id, api_host)
-        if corrected_note.startswith("<note>") and corrected_note.endswith("</note>"):
-            corrected_note = corrected_note[6:-7]  # 去掉<note>和</note>标签
+        corrected_note = correct_text(note, system_message, endpoint_id, api_host)
         print(f"处理后结果 {index}/{total_notes}: {corrected_note}\n")
         modified_notes.append(corrected_note)
 
@@ -124,41 +205,51 @@ def split_long_text(text, max_length=2000):
     return segments
 
 
-def main(system_message, endpoint_id, api_host, note, max_length=2000):
+def main(system_message, endpoint_id, api_host, note, max_length=2000, max_concurrency=4):
     """
     如果文本内容超过最大处理长度，则分批处理再合并结果；截断位置为长度范围内最近一个句号（“。”）
+
+    max_length 既是是否分段的阈值，也是每段的最大长度（此前分段总是按默认的2000字符，不随 max_length 变化）；
+    各段最多 max_concurrency 个同时提交，按原顺序合并，总耗时接近最慢的一段
     """
     if len(note) > max_length:
         # 分段处理长文本
-
-        segments = split_long_text(note)
-        corrected_segments = []
-
-        for i, segment in enumerate(segments, 1):
-            print(f"正在处理第 {i}/{len(segments)} 段...")
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": f"待优化文本包含在xml标签中：<note>{segment}</note>"}
-            ]
-            corrected_segment = get_completion_from_messages(messages, endpoint_id, api_host)
-            # 如果返回结果包含<note>和</note>标签，则去掉标签
-            if corrected_segment.startswith("<note>") and corrected_segment.endswith("</note>"):
-                corrected_segment = corrected_segment[6:-7]
-            corrected_segments.append(corrected_segment)
-
+        segments = split_long_text(note, max_length)
+        print(f"文本共分为 {len(segments)} 段，并发数 {max_concurrency}")
+        corrected_segments = correct_segments(segments, system_message, endpoint_id, api_host, max_concurrency)
         corrected_note = "\n".join(corrected_segments)
     else:
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": f"待优化文本包含在xml标签中：<note>{note}</note>"}
-        ]
-        corrected_note = get_completion_from_messages(messages, endpoint_id, api_host)
-        # 如果返回结果包含<note>和</note>标签，则去掉标签
-        if corrected_note.startswith("<note>") and corrected_note.endswith("</note>"):
-            corrected_note = corrected_note[6:-7]
+        corrected_note = correct_text(note, system_message, endpoint_id, api_host)
     return corrected_note
 
 
+@contextmanager
+def _mock_ark_service(latency):
+    """启动本地模拟服务并补上 ARK_API_KEY，返回 api_host；退出时关闭服务并恢复环境变量"""
+    saved_key = os.environ.get("ARK_API_KEY")
+    server, api_host = run_mock_ark_server(latency=latency)
+    os.environ.setdefault("ARK_API_KEY", "mock-key")
+    try:
+        yield api_host
+    finally:
+        server.shutdown()
+        if saved_key is None:
+            os.environ.pop("ARK_API_KEY", None)
+
+
+def benchmark_segment_correction(segment_count=30, latency=1.0, max_concurrency=8):
+    """对比本地模拟服务上逐段串行与并发修正长文本的耗时，并检查合并结果的顺序"""
+    segment = "这是用于测试的句子。" * 100
+    note = "".join(f"第{i}段。{segment}" for i in range(segment_count))
+    with _mock_ark_service(latency) as api_host:
+        for concurrency in (1, max_concurrency):
+            start = time.perf_counter()
+            result = main("mock", "mock-endpoint", api_host, note, max_length=len(segment) + 10, max_concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            in_order = result.replace("\n", "") == note
+            print(f"并发数 {concurrency}: 耗时 {elapsed:.2f} 秒，顺序{'正确' if in_order else '错误'}")
+
+
 if __name__ == "__main__":
     # 火山引擎模型配置
     # endpoint_id = "ep-20250207200354-zc5jl"         # doubao-lite-4k
@@ -167,12 +258,13 @@ if __name__ == "__main__":
     api_host = "ark.cn-beijing.volces.com"          # 华北 2 (北京) 服务器
 
     max_length = 1500
+    max_concurrency = 4     # 长文本分段后同时提交的请求数
     system_message = """
     你是一名精通中文的语言专家，请对文本进行做语法修正，适当修改词句，按照文章含义合理拆分段落，让整体文章内容更流畅，词句更偏向书面写作风格，但所有修改要求贴合原意，不要做大的改动。
     """
 
     note = pyperclip.paste()
-    corrected_note = main(system_message, endpoint_id, api_host, note, max_length)
+    corrected_note = main(system_message, endpoint_id, api_host, note, max_length, max_concurrency)
     pyperclip.copy(corrected_note)
     print(f"处理后结果已经复制到剪贴板: {corrected_note}\n")
 